@@ -0,0 +1,80 @@
+"""Рендер подписей: шаблоны kartoshka.captions против прежнего Meme.get_caption.
+
+    python benchmarks/captions.py [--memes 10000] [--repeat 3]
+
+Подписи 10k мемов (автор и аноним, текст с HTML-символами): первый рендер
+и повторные (urgent-повтор, ретраи публикации того же мема) — отдельно.
+Прежний вариант экранирует поля на каждом вызове. Шаблоны на первом
+рендере ещё и проверяют лимит длины Telegram, зато экранированные поля и
+подпись с автором остаются на снимке, и повторный рендер почти бесплатен.
+"""
+import argparse
+import html
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+for _name, _value in {
+    "BOT_TOKEN": "0:benchmark", "EDITOR_IDS": "1", "PUBLISH_CHAT_ID": "-1", "BOT_NAME": "bench",
+    "POST_FREQUENCY_MINUTES": "60", "CRYPTOSELECTARCHY": "true", "VOTES_TO_APPROVE": "3", "VOTES_TO_REJECT": "3",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from kartoshka.constants import METALS_AND_TOXINS  # noqa: E402
+from kartoshka.message_snapshot import MessageSnapshot  # noqa: E402
+from kartoshka.models import Meme  # noqa: E402
+
+
+def legacy_caption(meme: Meme) -> str:
+    """Meme.get_caption до шаблонов."""
+    user_text = html.escape(meme.content.text or meme.content.caption or "")
+    if meme.publish_choice == "user":
+        username = meme.content.from_user_username
+        first_name = meme.content.from_user_first_name
+        if username:
+            prefix = f"Мем от пользователя @{html.escape(username)}"
+        elif first_name:
+            prefix = f"Мем от пользователя {html.escape(first_name)}"
+        else:
+            prefix = "Мем от пользователя [ДАННЫЕ УДАЛЕНЫ]"
+    else:
+        prefix = f"<tg-spoiler>Мем от Анонимной {random.choice(METALS_AND_TOXINS)} Картошки</tg-spoiler>"
+    return f"{prefix}\n\n{user_text}" if user_text else f"{prefix}"
+
+
+def _memes(count: int) -> list:
+    return [
+        Meme(meme_id, 100 + meme_id, "user" if meme_id % 3 else "potato", MessageSnapshot(
+            content_type="photo", photo_file_id=f"file{meme_id}",
+            caption=f"когда <b>тимлид</b> сказал «это на 5 минут» & ушёл #{meme_id}",
+            from_user_id=100 + meme_id, from_user_username=f"user_{meme_id}",
+        ))
+        for meme_id in range(count)
+    ]
+
+
+def _run(render, memes: list) -> float:
+    start = time.perf_counter()
+    for meme in memes:
+        render(meme)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--memes", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{args.memes} мемов; мкс на подпись: первый рендер / повторный (×{args.repeat})")
+    for label, render in (("прежний get_caption", legacy_caption), ("шаблоны", Meme.get_caption)):
+        memes = _memes(args.memes)
+        first = _run(render, memes)
+        again = sum(_run(render, memes) for _ in range(args.repeat))
+        print(f"  {label:20} {first * 1e6 / args.memes:6.2f} / {again * 1e6 / (args.memes * args.repeat):6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Память на мем в очереди модерации: Meme на __slots__ против прежнего Meme с __dict__.
+
+    python benchmarks/meme_memory.py [--memes 10000] [--votes 5] [--editors 5]
+
+Каждый мем — как после рестарта и fan-out'а модераторам: снимок фото с
+подписью, голоса из JSON, по сообщению каждому редактору и сообщение-статус
+автору. Считается tracemalloc'ом всё, что выделено на мемы; снимок контента
+одинаков в обоих вариантах и из результата вычитается.
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+for _name, _value in {
+    "BOT_TOKEN": "0:benchmark", "EDITOR_IDS": "1", "PUBLISH_CHAT_ID": "-1", "BOT_NAME": "bench",
+    "POST_FREQUENCY_MINUTES": "60", "CRYPTOSELECTARCHY": "true", "VOTES_TO_APPROVE": "3", "VOTES_TO_REJECT": "3",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from kartoshka.message_snapshot import MessageSnapshot  # noqa: E402
+from kartoshka.models import VOTE_NAMES, Meme  # noqa: E402
+
+
+class LegacyMeme:
+    """Раскладка полей Meme до __slots__: __dict__, голоса строками, списки кортежей."""
+
+    def __init__(self, meme_id, user_id, publish_choice, content):
+        self.meme_id = meme_id
+        self.user_id = user_id
+        self.publish_choice = publish_choice
+        self.content = content
+        self.votes = {}
+        self.mod_messages = []
+        self.user_messages = []
+        self.finalized = False
+        self.created_time = datetime.now(timezone.utc)
+        self.user_status_text = None
+        self.published_message_id = None
+
+
+def _content(meme_id: int) -> MessageSnapshot:
+    return MessageSnapshot(
+        content_type="photo", photo_file_id=f"AgACAgIAAxkBAAI{meme_id:012d}", caption=f"мем {meme_id}",
+        from_user_id=100_000_000 + meme_id, from_user_username=f"user{meme_id}",
+    )
+
+
+def _build(cls, memes: int, votes: int, editors: int) -> list:
+    if cls is None:
+        return [_content(meme_id) for meme_id in range(memes)]
+    votes_json = json.dumps({str(5_000_000_000 + v): VOTE_NAMES[v % 3] for v in range(votes)})
+    built = []
+    for meme_id in range(memes):
+        meme = cls(meme_id, 100_000_000 + meme_id, "user", _content(meme_id))
+        meme.votes = json.loads(votes_json)
+        for editor in range(editors):
+            meme.mod_messages.append((5_000_000_000 + editor, 1_000_000 + meme_id))
+        meme.user_messages.append((100_000_000 + meme_id, 2_000_000 + meme_id))
+        built.append(meme)
+    return built
+
+
+def _measure(cls, memes: int, votes: int, editors: int) -> float:
+    """Байт на мем; cls=None — только снимки контента."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = _build(cls, memes, votes, editors)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del built
+    return used / memes
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--memes", type=int, default=10_000)
+    ap.add_argument("--votes", type=int, default=5)
+    ap.add_argument("--editors", type=int, default=5)
+    args = ap.parse_args()
+
+    content = _measure(None, args.memes, args.votes, args.editors)
+    legacy = _measure(LegacyMeme, args.memes, args.votes, args.editors) - content
+    compact = _measure(Meme, args.memes, args.votes, args.editors) - content
+    print(f"{args.memes} мемов, {args.votes} голосов, {args.editors} редакторов; снимок контента: {content:.0f} Б/мем")
+    print(f"  прежний Meme:       {legacy:7.0f} Б/мем")
+    print(f"  Meme на __slots__:  {compact:7.0f} Б/мем  (−{legacy - compact:.0f} Б, −{1 - compact / legacy:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,8 @@ from aiogram import Bot
 from aiogram.client.bot import DefaultBotProperties
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from kartoshka import config
+from kartoshka import config, ratelimit
+from kartoshka.fanout import fan_out
 from kartoshka.handlers.recruit import JOIN_CALLBACK
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
@@ -105,17 +106,24 @@ async def main():
         sys.exit(1)
 
     bot = Bot(token=token, default=DefaultBotProperties(parse_mode="HTML"))
+    # Темп задаёт RateLimiter (глобальные ~30/с, retry_after), а не sleep между письмами.
+    ratelimit.install(bot)
     ok = fail = 0
     try:
-        for i, uid in enumerate(targets, 1):
-            res = await send_to(bot, uid)
-            if res == "ok":
+        with ratelimit.bulk():
+            results = await fan_out(
+                targets,
+                lambda uid: send_to(bot, uid),
+                concurrency=int(ratelimit.GLOBAL_RATE),
+                timeout=None,  # ожидание в очереди лимитов — не зависание
+            )
+        for i, r in enumerate(results, 1):
+            if r.value == "ok":
                 ok += 1
-                log.info(f"[{i}/{len(targets)}] {uid}: ✅")
+                log.info(f"[{i}/{len(targets)}] {r.target}: ✅")
             else:
                 fail += 1
-                log.info(f"[{i}/{len(targets)}] {uid}: ❌ {res}")
-            await asyncio.sleep(0.4)  # бережём rate limit
+                log.info(f"[{i}/{len(targets)}] {r.target}: ❌ {r.value}")
     finally:
         await bot.session.close()
     log.info(f"ИТОГО: доставлено {ok}, ошибок {fail}")
@@ -0,0 +1,210 @@
+"""Подписи к мемам: публичная (в канал), модераторская и статус автора.
+
+Шаблоны разбираются один раз при импорте (Template): при рендере только
+склеиваются готовые куски. Пользовательские поля (текст мема, имена)
+экранируются для parse_mode=HTML; экранированные значения и готовая подпись
+с автором кэшируются на MessageSnapshot (html_text, html_mention,
+html_first_name, author_caption), так что повторная публикация
+(urgent-повтор, ретраи) не рендерит и не экранирует заново.
+
+Длина гарантированно влезает в лимит Telegram: 1024 символа у подписи к
+медиа, 4096 у текстового сообщения. Считается видимый текст (без тегов,
+сущность &lt; — один символ) в UTF-16, как считает Telegram. Если не
+влезает, урезается только текст мема — по границе слова, с «…»; разметка
+и экранирование при этом не рвутся.
+
+Синтаксис шаблона — str.format: {поле}; {поле?} — необязательное поле:
+если оно пустое, выпадает вместе с пробелами и переводами строк перед ним.
+"""
+import html
+import re
+import string
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from kartoshka import names
+
+CAPTION_LIMIT = 1024
+TEXT_LIMIT = 4096
+ELLIPSIS = "…"
+# Насколько далеко назад искать пробел, чтобы не резать слово посередине.
+WORD_BOUNDARY_LOOKBACK = 40
+
+_TAG = re.compile(r"<[^>]+>")
+
+
+class Escaped(NamedTuple):
+    """Пользовательская строка и её HTML-экранированная версия."""
+
+    raw: str
+    html: str
+
+    @classmethod
+    def of(cls, raw: Optional[str]) -> "Escaped":
+        if not raw:
+            return _EMPTY
+        raw = str(raw)
+        return cls(raw, html.escape(raw, quote=False))
+
+
+_EMPTY = Escaped("", "")
+
+
+def visible_len(text: str) -> int:
+    """Длина, как её считает Telegram: в UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate(text: str, budget: int) -> str:
+    """Урезает text до budget видимых символов, по границе слова, с «…» в конце."""
+    if visible_len(text) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    cut = text[:budget - 1]
+    while cut and visible_len(cut) > budget - 1:
+        cut = cut[:-1]
+    if not text[len(cut)].isspace():
+        space = cut.rfind(" ", max(0, len(cut) - WORD_BOUNDARY_LOOKBACK))
+        if space > 0:
+            cut = cut[:space]
+    return cut.rstrip() + ELLIPSIS
+
+
+class Template:
+    """Скомпилированный шаблон подписи.
+
+    markup=True — литералы шаблона уже HTML, поля экранируются;
+    markup=False — простой текст (кнопки), ничего не экранируется.
+    Урезается при нехватке места поле truncate (по умолчанию text).
+
+    При компиляции на каждый набор пустых необязательных полей готовится
+    своя строка для str.format, так что обычный рендер — один format().
+    """
+
+    def __init__(self, source: str, markup: bool = True, truncate: str = "text"):
+        self.source = source
+        self.markup = markup
+        self.truncate = truncate
+        # (литерал, его видимая длина, поле или None, поле необязательное)
+        self._parts: List[Tuple[str, int, Optional[str], bool]] = []
+        for literal, field, _, _ in string.Formatter().parse(source):
+            optional = field is not None and field.endswith("?")
+            name = field[:-1] if optional else field
+            if optional:
+                # Разделитель перед необязательным полем — отдельный кусок, выпадает с полем.
+                head = literal.rstrip()
+                self._add(head, None, False)
+                self._add(literal[len(head):], name, True)
+            else:
+                self._add(literal, name, False)
+        self._fields = tuple((name, optional) for _, _, name, optional in self._parts if name is not None)
+        # Видимая длина всех литералов — верхняя оценка для любого набора полей.
+        self._fixed = sum(visible for _, visible, _, _ in self._parts)
+        optional = [name for name, opt in self._fields if opt]
+        self._formats: Dict[Tuple[str, ...], Callable[..., str]] = {}
+        for mask in range(2 ** len(optional)):
+            missing = tuple(name for i, name in enumerate(optional) if mask >> i & 1)
+            self._formats[missing] = self._compile(missing)
+
+    def _add(self, literal: str, name: Optional[str], optional: bool) -> None:
+        visible = html.unescape(_TAG.sub("", literal)) if self.markup else literal
+        self._parts.append((literal, visible_len(visible), name, optional))
+
+    def _compile(self, missing: Tuple[str, ...]) -> Callable[..., str]:
+        out = []
+        for literal, _, name, _ in self._parts:
+            if name in missing:
+                continue
+            out.append(literal.replace("{", "{{").replace("}", "}}"))
+            if name is not None:
+                out.append("{" + name + "}")
+        return "".join(out).format
+
+    def render(self, limit: Optional[int] = None, **fields) -> str:
+        """Поля — str (будут экранированы) или Escaped (уже экранированы)."""
+        values = {}
+        missing: Tuple[str, ...] = ()
+        # Верхняя оценка видимой длины: символ вне BMP — два UTF-16 code unit'а.
+        bound = self._fixed
+        for name, optional in self._fields:
+            value = fields[name]
+            if type(value) is not Escaped:
+                value = fields[name] = self._value(value)
+            if optional and not value.raw:
+                missing += (name,)
+                continue
+            values[name] = value.html
+            bound += 2 * len(value.raw)
+        if limit is not None and bound > limit and self.truncate in fields:
+            self._fit(limit, fields, missing)
+            values[self.truncate] = fields[self.truncate].html
+        return self._formats[missing](**values)
+
+    def _fit(self, limit: int, fields: Dict[str, Escaped], missing: Tuple[str, ...]) -> None:
+        """Точный подсчёт длины; урезает поле truncate, если не влезает."""
+        fixed = 0
+        for _, visible, name, _ in self._parts:
+            if name in missing:
+                continue
+            fixed += visible
+            if name is not None and name != self.truncate:
+                fixed += visible_len(fields[name].raw)
+        text = fields[self.truncate]
+        if fixed + visible_len(text.raw) > limit:
+            fields[self.truncate] = self._value(truncate(text.raw, limit - fixed))
+
+    def _value(self, value) -> Escaped:
+        if isinstance(value, Escaped):
+            return value
+        value = "" if value is None else str(value)
+        return Escaped.of(value) if self.markup else Escaped(value, value)
+
+
+PUBLIC_AUTHOR = Template("Мем от пользователя {author}\n\n{text?}")
+PUBLIC_REDACTED = Template("Мем от пользователя [ДАННЫЕ УДАЛЕНЫ]\n\n{text?}")
+PUBLIC_ANONYMOUS = Template("<tg-spoiler>Мем от Анонимной {name} Картошки</tg-spoiler>\n\n{text?}")
+MODERATOR = Template("Мем ID: {meme_id}\n\n{text}\n\nОт: {author}\nПубликация как: {mode}")
+STATUS_VOTING = Template("Голосование: {summary}", markup=False)
+STATUS_FINAL = Template("{resolution} {summary}", markup=False)
+
+NO_TEXT = "[Без текста]"
+ANONYMOUS_AUTHOR = "Картошка"
+
+
+def limit_for(content) -> int:
+    """Лимит Telegram для подписи к этому контенту."""
+    return TEXT_LIMIT if content.content_type == "text" else CAPTION_LIMIT
+
+
+def public_caption(content, publish_choice: str, meme_id: int) -> str:
+    """Подпись поста в канале (parse_mode=HTML)."""
+    if publish_choice == "user":
+        # Снимок неизменяем: подпись с автором готовится один раз (MessageSnapshot.author_caption).
+        return content.author_caption
+    limit = limit_for(content)
+    name = names.potato_name(meme_id)
+    # Имена — из нашего словаря, экранировать нечего.
+    return PUBLIC_ANONYMOUS.render(limit, name=Escaped(name, name), text=content.html_text)
+
+
+def author_caption(content) -> str:
+    """Подпись поста с автором; вызывать через MessageSnapshot.author_caption."""
+    limit = limit_for(content)
+    if content.from_user_username:
+        return PUBLIC_AUTHOR.render(limit, author=content.html_mention, text=content.html_text)
+    if content.from_user_first_name:
+        return PUBLIC_AUTHOR.render(limit, author=content.html_first_name, text=content.html_text)
+    return PUBLIC_REDACTED.render(limit, text=content.html_text)
+
+
+def moderator_caption(content, meme_id: int, publish_choice: str, author) -> str:
+    """Подпись для редакторов: номер мема, текст, автор и способ публикации."""
+    text = content.html_text if content.html_text.raw else NO_TEXT
+    return MODERATOR.render(limit_for(content), meme_id=meme_id, text=text, author=author, mode=publish_choice)
+
+
+def status_text(summary: str, final_resolution: Optional[str] = None) -> str:
+    """Текст кнопки-статуса под сообщением автора."""
+    if final_resolution:
+        return STATUS_FINAL.render(resolution=final_resolution, summary=summary)
+    return STATUS_VOTING.render(summary=summary)
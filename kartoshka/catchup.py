@@ -0,0 +1,150 @@
+"""Догон очереди публикации после простоя.
+
+Пока бот лежал, слоты записей очереди ушли в прошлое. При старте (и при
+смене лидера в общем режиме) просроченные записи заново раскладываются
+по расписанию согласно политике (CATCHUP_POLICY):
+
+    keep        — прежний шаг post_frequency_minutes между постами;
+    compress    — шаг min_interval: хвост догоняется быстрее;
+    media_group — подряд идущие фото и видео собираются в альбомы (до 10
+                  штук, sendMediaGroup), альбом занимает один слот с обычным
+                  шагом; остальные мемы идут по одному.
+
+Независимо от политики drop_older_than отбрасывает записи, чей слот
+просрочен сильнее (они уходят в dead-letter с last_error="expired" и
+возвращаются оттуда /dlq_replay). Будущие записи, на которые наезжает
+догоняющий хвост, сдвигаются за него с обычным шагом.
+
+План мутирует записи (scheduled_time, album) на месте; перестановку в
+куче и запись на диск делает Scheduler.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+KEEP = "keep"
+COMPRESS = "compress"
+MEDIA_GROUP = "media_group"
+MODES = (KEEP, COMPRESS, MEDIA_GROUP)
+
+# Telegram принимает в sendMediaGroup от 2 до 10 элементов.
+ALBUM_MAX_ITEMS = 10
+ALBUM_CONTENT_TYPES = ("photo", "video")
+
+EXPIRED_ERROR = "expired"
+
+
+@dataclass(frozen=True)
+class CatchUpPolicy:
+    mode: str = KEEP
+    # Шаг между постами в режиме compress.
+    min_interval: timedelta = timedelta(minutes=5)
+    # Просроченные сильнее — в dead-letter; None — не выбрасывать ничего.
+    drop_older_than: Optional[timedelta] = None
+
+    def __post_init__(self):
+        if self.mode not in MODES:
+            raise ValueError(f"mode должен быть одним из {MODES}, получено: {self.mode!r}")
+
+
+@dataclass
+class CatchUpPlan:
+    overdue: int = 0
+    # Сколько постов (альбом — один пост) понадобится на просроченные записи.
+    posts: int = 0
+    albums: int = 0
+    # Когда выйдет последняя просроченная запись; None — догонять нечего.
+    drain_at: Optional[datetime] = None
+    dropped: List[dict] = field(default_factory=list)
+    # Записи, у которых поменялись scheduled_time или album.
+    changed: List[dict] = field(default_factory=list)
+
+
+def _slot(entry: dict) -> datetime:
+    return datetime.fromisoformat(entry["scheduled_time"])
+
+
+def _albumable(entry: dict) -> bool:
+    # Записи с историей неудач публикуем по одной: у них свой таймер повтора.
+    if entry.get("attempts"):
+        return False
+    content = entry.get("meme", {}).get("content", {})
+    return content.get("content_type") in ALBUM_CONTENT_TYPES
+
+
+def _posts(entries: List[dict], albums: bool) -> List[List[dict]]:
+    """Режет просроченные записи на посты: альбомы из подряд идущих фото/видео."""
+    posts: List[List[dict]] = []
+    run: List[dict] = []
+
+    def flush():
+        for i in range(0, len(run), ALBUM_MAX_ITEMS):
+            posts.append(run[i:i + ALBUM_MAX_ITEMS])
+        run.clear()
+
+    for entry in entries:
+        if albums and _albumable(entry):
+            run.append(entry)
+            continue
+        flush()
+        posts.append([entry])
+    flush()
+    return posts
+
+
+def plan_catch_up(
+    entries: List[dict],
+    now: datetime,
+    last_published: Optional[datetime],
+    post_frequency: timedelta,
+    policy: CatchUpPolicy,
+    allowed: Callable[[datetime], datetime] = lambda dt: dt,
+    albums: bool = True,
+) -> CatchUpPlan:
+    """Раскладывает просроченные записи по новому расписанию.
+
+    entries — записи очереди (с читаемым scheduled_time), last_published —
+    время последнего поста (None — неизвестно, первый слот сразу), allowed — сдвиг
+    слота из ночной паузы, albums=False — альбомы отправить некому
+    (media_group тогда ведёт себя как keep).
+    """
+    plan = CatchUpPlan()
+    entries = sorted(entries, key=_slot)
+    overdue = [e for e in entries if _slot(e) < now]
+    future = entries[len(overdue):]
+    if policy.drop_older_than is not None:
+        cutoff = now - policy.drop_older_than
+        plan.dropped = [e for e in overdue if _slot(e) < cutoff]
+        overdue = [e for e in overdue if _slot(e) >= cutoff]
+    plan.overdue = len(overdue)
+
+    step = policy.min_interval if policy.mode == COMPRESS else post_frequency
+    posts = _posts(overdue, albums=albums and policy.mode == MEDIA_GROUP)
+    slot = allowed(now if last_published is None else max(now, last_published + step))
+    prev: Optional[datetime] = None
+    for post in posts:
+        if prev is not None:
+            slot = allowed(prev + step)
+        album = [e["meme"].get("meme_id") for e in post] if len(post) > 1 else None
+        for entry in post:
+            entry.pop("album", None)
+            if album is not None:
+                entry["album"] = album
+            entry["scheduled_time"] = slot.isoformat()
+            plan.changed.append(entry)
+        plan.albums += album is not None
+        prev = slot
+    plan.posts = len(posts)
+    plan.drain_at = prev
+
+    # Будущие записи не должны выйти вперемешку с догоняющим хвостом.
+    for entry in future:
+        if prev is None:
+            break
+        earliest = allowed(prev + post_frequency)
+        if _slot(entry) >= earliest:
+            break
+        entry["scheduled_time"] = earliest.isoformat()
+        plan.changed.append(entry)
+        prev = earliest
+    return plan
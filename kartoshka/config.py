@@ -1,43 +1,232 @@
+"""Настройки бота из env (и .env рядом с ботом).
+
+Читаются лениво, при первом обращении, и кэшируются в Settings:
+`import kartoshka.*` env не требует, поэтому скриптам и тестам не нужны
+ни обязательные переменные, ни python-dotenv на этапе импорта.
+
+Обращаться можно как раньше — config.EDITOR_IDS (модульный __getattr__
+отдаёт поле get_settings()), — или через get_settings().editor_ids.
+Значения не импортировать по имени (from kartoshka.config import ...) в
+коде бота: так перечитанные по SIGHUP значения не будут видны.
+
+reload_settings() (SIGHUP) перечитывает env без рестарта; на лету меняются
+только RELOADABLE — состав редакции, пороги голосов и частота публикаций.
+"""
+import logging
 import os
+from typing import Dict, FrozenSet, Iterable, Mapping, NamedTuple, Optional
+
+# Поля, которые reload_settings() применяет на лету; остальные — только с рестартом.
+RELOADABLE = ("editor_ids", "votes_to_approve", "votes_to_reject", "post_frequency_minutes")
+
+# Имя переменной окружения — имя поля в верхнем регистре, кроме:
+_ENV_NAMES = {"api_token": "BOT_TOKEN"}
+
+_REQUIRED = (
+    "BOT_TOKEN", "EDITOR_IDS", "PUBLISH_CHAT_ID", "BOT_NAME",
+    "POST_FREQUENCY_MINUTES", "CRYPTOSELECTARCHY", "VOTES_TO_APPROVE", "VOTES_TO_REJECT",
+)
+
+
+class EditorIds(tuple):
+    """EDITOR_IDS в порядке из конфига, без повторов.
+
+    Рассылка модераторам идёт в этом порядке (он же — порядок mod_messages),
+    а проверка «from_user.id in EDITOR_IDS» на каждый апдейт — по frozenset.
+    """
+
+    _members: FrozenSet[int]
+
+    def __new__(cls, ids: Iterable[int]) -> "EditorIds":
+        self = super().__new__(cls, dict.fromkeys(ids))
+        self._members = frozenset(self)
+        return self
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._members
+
+
+# NamedTuple, а не dataclass: dataclasses тянет inspect и удваивает время импорта config.
+class Settings(NamedTuple):
+    api_token: str
+    editor_ids: EditorIds
+    publish_chat_id: int
+    bot_name: str
+    post_frequency_minutes: int
+    cryptoselectarchy: bool
+    votes_to_approve: int
+    votes_to_reject: int
+
+    # Где хранить состояние. json — файлы рядом с ботом (как раньше),
+    # sqlite — одна база SQLITE_PATH (перенос: python -m kartoshka.sqlite_storage import).
+    storage_backend: str = "json"
+    sqlite_path: str = "kartoshka.db"
+
+    # Порядок публикации, когда мем не удалось опубликовать.
+    # best_effort — он ждёт свой повтор, остальные мемы выходят по расписанию;
+    # fifo — строго по очереди: пока он ждёт повтора, ждут и все следующие.
+    publish_ordering: str = "best_effort"
+
+    # Как догонять очередь после простоя (kartoshka.catchup).
+    # keep — прежний шаг POST_FREQUENCY_MINUTES, compress — шаг
+    # CATCHUP_MIN_INTERVAL_MINUTES, media_group — фото и видео альбомами.
+    # CATCHUP_DROP_OLDER_THAN_HOURS > 0 — просроченные сильнее уходят в dead-letter.
+    catchup_policy: str = "keep"
+    catchup_min_interval_minutes: int = 5
+    catchup_drop_older_than_hours: int = 0
+
+    # Ключ, от которого зависят имена анонимных картошек (kartoshka.names).
+    # По умолчанию выводится из BOT_TOKEN.
+    potato_name_key: Optional[str] = None
+
+    # Окно group commit'а — сколько мс копить изменения перед записью на диск.
+    persist_window_ms: int = 50
+
+    # Режим webhook (python kartoshka_bot.py --mode webhook).
+    # WEBHOOK_URL — публичный https-адрес бота, WEBHOOK_SECRET — токен, которым
+    # Telegram подписывает каждый запрос (заголовок X-Telegram-Bot-Api-Secret-Token).
+    webhook_url: Optional[str] = None
+    webhook_secret: Optional[str] = None
+    webhook_path: str = "/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+
+    # Пул обработки апдейтов — сколько хендлеров параллельно и
+    # сколько апдейтов держим принятыми, прежде чем притормозить приём.
+    update_workers: int = 8
+    update_queue_size: int = 1000
+
+    # Несколько процессов бота на одной SQLite-базе (только с
+    # STORAGE_BACKEND=sqlite и --mode webhook). Публикует один — держатель аренды.
+    multi_instance: bool = False
+
+
+# .env на момент первого чтения: по нему видно, какие значения env процесса
+# пришли из того же файла (load_dotenv, systemd EnvironmentFile).
+_startup_dotenv: Optional[Dict[str, str]] = None
+
+
+def _environ() -> Mapping[str, str]:
+    """env процесса поверх .env, как у load_dotenv(); .env перечитывается на каждый вызов.
+
+    Значение из env процесса, совпадающее с первоначальным .env, уступает
+    свежему .env — иначе правка .env под systemd не дошла бы до SIGHUP.
+    """
+    global _startup_dotenv
+    from dotenv import dotenv_values
+
+    dotenv = {k: v for k, v in dotenv_values().items() if v is not None}
+    if _startup_dotenv is None:
+        _startup_dotenv = dotenv
+    merged = dict(dotenv)
+    for key, value in os.environ.items():
+        if key in dotenv and _startup_dotenv.get(key) == value:
+            continue
+        merged[key] = value
+    return merged
+
+
+def _parse_editor_ids(raw: str) -> EditorIds:
+    try:
+        editor_ids = EditorIds(int(x.strip()) for x in raw.split(",") if x.strip())
+    except ValueError as e:
+        raise ValueError(
+            f"EDITOR_IDS должен быть списком целочисленных Telegram-ID через запятую, "
+            f"получено: {raw!r}"
+        ) from e
+    if not editor_ids:
+        raise ValueError("EDITOR_IDS не содержит ни одного ID")
+    return editor_ids
+
+
+def load_settings(env: Optional[Mapping[str, str]] = None) -> Settings:
+    """Собирает и проверяет Settings; ValueError — если env негоден."""
+    env = _environ() if env is None else env
+    missing = [k for k in _REQUIRED if not env.get(k)]
+    if missing:
+        raise ValueError(f"Отсутствуют обязательные переменные окружения: {missing}")
+
+    storage_backend = env.get("STORAGE_BACKEND", "json").lower()
+    if storage_backend not in ("json", "sqlite"):
+        raise ValueError(f"STORAGE_BACKEND должен быть json или sqlite, получено: {storage_backend!r}")
+    publish_ordering = env.get("PUBLISH_ORDERING", "best_effort").lower()
+    if publish_ordering not in ("best_effort", "fifo"):
+        raise ValueError(f"PUBLISH_ORDERING должен быть best_effort или fifo, получено: {publish_ordering!r}")
+    catchup_policy = env.get("CATCHUP_POLICY", "keep").lower()
+    if catchup_policy not in ("keep", "compress", "media_group"):
+        raise ValueError(f"CATCHUP_POLICY должен быть keep, compress или media_group, получено: {catchup_policy!r}")
+    multi_instance = env.get("MULTI_INSTANCE", "false").lower() == "true"
+    if multi_instance and storage_backend != "sqlite":
+        raise ValueError("MULTI_INSTANCE=true требует STORAGE_BACKEND=sqlite")
+
+    return Settings(
+        api_token=env["BOT_TOKEN"],
+        editor_ids=_parse_editor_ids(env["EDITOR_IDS"]),
+        publish_chat_id=int(env["PUBLISH_CHAT_ID"]),
+        bot_name=env["BOT_NAME"],
+        post_frequency_minutes=int(env["POST_FREQUENCY_MINUTES"]),
+        cryptoselectarchy=env["CRYPTOSELECTARCHY"].lower() == "true",
+        votes_to_approve=int(env["VOTES_TO_APPROVE"]),
+        votes_to_reject=int(env["VOTES_TO_REJECT"]),
+        storage_backend=storage_backend,
+        sqlite_path=env.get("SQLITE_PATH", "kartoshka.db"),
+        publish_ordering=publish_ordering,
+        catchup_policy=catchup_policy,
+        catchup_min_interval_minutes=int(env.get("CATCHUP_MIN_INTERVAL_MINUTES", "5")),
+        catchup_drop_older_than_hours=int(env.get("CATCHUP_DROP_OLDER_THAN_HOURS", "0")),
+        potato_name_key=env.get("POTATO_NAME_KEY"),
+        persist_window_ms=int(env.get("PERSIST_WINDOW_MS", "50")),
+        webhook_url=env.get("WEBHOOK_URL"),
+        webhook_secret=env.get("WEBHOOK_SECRET"),
+        webhook_path=env.get("WEBHOOK_PATH", "/webhook"),
+        webhook_host=env.get("WEBHOOK_HOST", "0.0.0.0"),
+        webhook_port=int(env.get("WEBHOOK_PORT", "8080")),
+        update_workers=int(env.get("UPDATE_WORKERS", "8")),
+        update_queue_size=int(env.get("UPDATE_QUEUE_SIZE", "1000")),
+        multi_instance=multi_instance,
+    )
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """Текущие настройки; при первом вызове читаются из env."""
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def reload_settings(env: Optional[Mapping[str, str]] = None) -> Settings:
+    """Перечитывает env и применяет RELOADABLE-поля (обработчик SIGHUP).
+
+    Негодный env — ValueError, текущие настройки остаются как были.
+    Изменения остальных полей не применяются: о них пишем в лог.
+    """
+    global _settings
+    fresh = load_settings(env)
+    current = get_settings()
+    changes = {
+        name: value
+        for name, value in fresh._asdict().items()
+        if value != getattr(current, name)
+    }
+    ignored = sorted(_ENV_NAMES.get(name, name.upper()) for name in changes if name not in RELOADABLE)
+    if ignored:
+        logging.error(f"Без рестарта не применяются: {ignored}")
+    applied = {name: value for name, value in changes.items() if name in RELOADABLE}
+    _settings = current._replace(**applied)
+    if applied:
+        logging.info(f"Настройки перечитаны: {sorted(_ENV_NAMES.get(name, name.upper()) for name in applied)}")
+    return _settings
+
+
+_FIELDS = frozenset(Settings._fields)
+
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-API_TOKEN = os.getenv("BOT_TOKEN")
-EDITOR_IDS_STR = os.getenv("EDITOR_IDS")
-PUBLISH_CHAT_ID = os.getenv("PUBLISH_CHAT_ID")
-BOT_NAME = os.getenv("BOT_NAME")
-POST_FREQUENCY_MINUTES_STR = os.getenv("POST_FREQUENCY_MINUTES")
-CRYPTOSELECTARCHY_STR = os.getenv("CRYPTOSELECTARCHY")
-VOTES_TO_APPROVE_STR = os.getenv("VOTES_TO_APPROVE")
-VOTES_TO_REJECT_STR = os.getenv("VOTES_TO_REJECT")
-
-_required_env_vars = {
-    "BOT_TOKEN": API_TOKEN,
-    "EDITOR_IDS": EDITOR_IDS_STR,
-    "PUBLISH_CHAT_ID": PUBLISH_CHAT_ID,
-    "BOT_NAME": BOT_NAME,
-    "POST_FREQUENCY_MINUTES": POST_FREQUENCY_MINUTES_STR,
-    "CRYPTOSELECTARCHY": CRYPTOSELECTARCHY_STR,
-    "VOTES_TO_APPROVE": VOTES_TO_APPROVE_STR,
-    "VOTES_TO_REJECT": VOTES_TO_REJECT_STR,
-}
-_missing_vars = [k for k, v in _required_env_vars.items() if not v]
-if _missing_vars:
-    raise ValueError(f"Отсутствуют обязательные переменные окружения: {_missing_vars}")
-
-PUBLISH_CHAT_ID = int(PUBLISH_CHAT_ID)
-POST_FREQUENCY_MINUTES = int(POST_FREQUENCY_MINUTES_STR)
-CRYPTOSELECTARCHY = CRYPTOSELECTARCHY_STR.lower() == "true"
-VOTES_TO_APPROVE = int(VOTES_TO_APPROVE_STR)
-VOTES_TO_REJECT = int(VOTES_TO_REJECT_STR)
-try:
-    EDITOR_IDS = [int(x.strip()) for x in EDITOR_IDS_STR.split(",") if x.strip()]
-except ValueError as e:
-    raise ValueError(
-        f"EDITOR_IDS должен быть списком целочисленных Telegram-ID через запятую, "
-        f"получено: {EDITOR_IDS_STR!r}"
-    ) from e
-if not EDITOR_IDS:
-    raise ValueError("EDITOR_IDS не содержит ни одного ID")
+def __getattr__(name: str):
+    # config.API_TOKEN, config.EDITOR_IDS, ... — поля текущих Settings.
+    if name.isupper() and name.lower() in _FIELDS:
+        return getattr(get_settings(), name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
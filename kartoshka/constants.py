@@ -1,9 +1,14 @@
 COUNTER_FILE = "meme_counter.json"
 USER_DATA_FILE = "user_data.json"
+USER_DATA_LOG_FILE = "user_data.wal"
 MODERATION_FILE = "moderation_queue.json"
+MODERATION_LOG_FILE = "moderation_queue.wal"
 PUBLICATION_FILE = "publication_queue.json"
 CANDIDATES_FILE = "candidates.json"
-FAILED_PUBLICATIONS_FILE = "failed_publications.json"
+FAILED_PUBLICATIONS_FILE = "failed_publications.json"  # старый формат, переносится в DEAD_LETTER_FILE
+DEAD_LETTER_FILE = "failed_publications.jsonl"
+PUBLISH_LEDGER_FILE = "publish_ledger.jsonl"
+VOTE_HISTORY_FILE = "vote_history.bin"
 
 METALS_AND_TOXINS = [
     "Алюминиевой", "Железной", "Медной", "Свинцовой", "Цинковой", "Титановой", "Никелевой",
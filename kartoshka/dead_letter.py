@@ -0,0 +1,195 @@
+"""Dead-letter публикаций: append-only JSONL с ротацией по размеру.
+
+Запись, исчерпавшая попытки публикации, дописывается одной строкой (O(1),
+а не перезапись всего файла). Разросшийся файл ротируется, как
+logging.handlers.RotatingFileHandler: failed_publications.jsonl →
+.jsonl.1 → … → .jsonl.N, самый старый выбрасывается.
+
+Каждая строка — запись очереди публикации плюс:
+    dead_at    — когда запись ушла в dead-letter (ISO, UTC);
+    last_error — тип последней ошибки (имя исключения, "publish_failed",
+                 "interrupted" и т.п.).
+
+Повтор — обратно в очередь публикации одной пачкой (Scheduler.replay_dead_letters):
+админ-командой /dlq_replay в работающем боте или из консоли. Консольный повтор —
+только при остановленном боте, если база не общая (MULTI_INSTANCE): иначе бот
+перезапишет очередь своей копией из памяти.
+
+    python -m kartoshka.dead_letter list [--meme-id N ...] [--error TYPE] [--since DATE] [--until DATE]
+    python -m kartoshka.dead_letter replay [те же фильтры]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, FrozenSet, Iterator, List, Optional
+
+from kartoshka.wal import AppendLog
+
+DEAD_LETTER_MAX_BYTES = 5 * 1024 * 1024
+DEAD_LETTER_BACKUPS = 5
+
+
+@dataclass(frozen=True)
+class DeadLetterFilter:
+    """Какие записи повторять: пустой фильтр совпадает со всеми."""
+
+    meme_ids: FrozenSet[int] = field(default_factory=frozenset)
+    error: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def matches(self, entry: dict) -> bool:
+        if self.meme_ids and entry.get("meme", {}).get("meme_id") not in self.meme_ids:
+            return False
+        if self.error is not None and entry.get("last_error") != self.error:
+            return False
+        if self.since is not None or self.until is not None:
+            try:
+                dead_at = datetime.fromisoformat(entry["dead_at"])
+            except (KeyError, TypeError, ValueError):
+                return False  # запись без даты под фильтр по дате не попадает
+            if self.since is not None and dead_at < self.since:
+                return False
+            if self.until is not None and dead_at >= self.until:
+                return False
+        return True
+
+    @classmethod
+    def parse(cls, tokens: List[str]) -> "DeadLetterFilter":
+        """Разбирает аргументы админ-команды: «12 15 error=TimeoutError since=2025-01-31».
+
+        Бросает ValueError на непонятном аргументе.
+        """
+        meme_ids, options = set(), {}
+        for token in tokens:
+            key, sep, value = token.partition("=")
+            if not sep:
+                meme_ids.add(int(token))
+            elif key in ("error", "since", "until"):
+                options[key] = value
+            else:
+                raise ValueError(f"неизвестный фильтр {key!r}")
+        return cls(
+            meme_ids=frozenset(meme_ids),
+            error=options.get("error"),
+            since=_parse_date(options["since"]) if "since" in options else None,
+            until=_parse_date(options["until"]) if "until" in options else None,
+        )
+
+
+def _parse_date(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+class DeadLetterQueue:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEAD_LETTER_MAX_BYTES,
+        backups: int = DEAD_LETTER_BACKUPS,
+        legacy_path: Optional[str] = None,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._log = AppendLog(path)
+        if legacy_path is not None:
+            self._migrate_legacy(legacy_path)
+
+    def _migrate_legacy(self, legacy_path: str) -> None:
+        """Переносит старый failed_publications.json (JSON-список) в лог.
+
+        Старый файл переименовывается в *.migrated, а не удаляется.
+        """
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.error(f"Dead-letter {legacy_path} не читается, оставляю как есть: {e}")
+            return
+        if isinstance(entries, list):
+            self._log.append_many([e for e in entries if isinstance(e, dict)])
+        os.replace(legacy_path, legacy_path + ".migrated")
+        logging.info(f"Dead-letter {legacy_path} перенесён в {self.path}")
+
+    def _files(self) -> List[str]:
+        """Файлы от самого старого к текущему."""
+        rotated = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [p for p in rotated if os.path.exists(p)] + [self.path]
+
+    def append(self, entry: dict) -> None:
+        self._log.append(entry)
+        if self._log.size() > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        with self._log.lock:
+            for i in range(self.backups, 0, -1):
+                src = f"{self.path}.{i - 1}" if i > 1 else self.path
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i}")
+
+    def entries(self, predicate: Optional[Callable[[dict], bool]] = None) -> Iterator[dict]:
+        for path in self._files():
+            for entry in AppendLog(path).replay():
+                if predicate is None or predicate(entry):
+                    yield entry
+
+    def discard(self, predicate: Callable[[dict], bool]) -> int:
+        """Вычёркивает записи, подходящие под predicate; возвращает их число.
+
+        Переписываются только файлы, в которых что-то нашлось.
+        """
+        removed = 0
+        with self._log.lock:
+            for path in self._files():
+                log = AppendLog(path)
+                kept, hits = [], 0
+                for entry in log.replay():
+                    if predicate(entry):
+                        hits += 1
+                    else:
+                        kept.append(entry)
+                if hits:
+                    log.rewrite(kept)
+                    removed += hits
+        return removed
+
+
+def _main() -> None:
+    from kartoshka.config import MULTI_INSTANCE, POST_FREQUENCY_MINUTES
+    from kartoshka.main import build_storage
+    from kartoshka.scheduler import Scheduler
+    from kartoshka.storage import JsonStorage
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser(description="Dead-letter публикаций kartoshka_bot")
+    ap.add_argument("command", choices=["list", "replay"])
+    ap.add_argument("--meme-id", type=int, action="append", default=[])
+    ap.add_argument("--error")
+    ap.add_argument("--since", type=_parse_date)
+    ap.add_argument("--until", type=_parse_date)
+    args = ap.parse_args()
+    flt = DeadLetterFilter(frozenset(args.meme_id), args.error, args.since, args.until)
+
+    storage = build_storage()
+    queue_storage = None if isinstance(storage, JsonStorage) else storage
+    scheduler = Scheduler(POST_FREQUENCY_MINUTES, storage=queue_storage, shared=MULTI_INSTANCE)
+    if args.command == "list":
+        for entry in scheduler.dead_letter_entries(flt):
+            meme_id = entry.get("meme", {}).get("meme_id")
+            print(f"{meme_id}\t{entry.get('dead_at', '-')}\t{entry.get('last_error', '-')}")
+        return
+    replayed = asyncio.run(scheduler.replay_dead_letters(flt))
+    logging.info(f"Вернул в очередь публикации мемы: {replayed}")
+
+
+if __name__ == "__main__":
+    _main()
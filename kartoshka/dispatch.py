@@ -0,0 +1,128 @@
+"""Обработка апдейтов пулом воркеров с порядком по ключу.
+
+aiogram запускает хендлеры по мере прихода апдейтов, все сразу. Для голосов
+это значит гонки: два callback'а по одному мему одновременно решают, пора
+ли финализировать. KeyedDispatcher выстраивает апдейты в очереди по ключу:
+callback голосования — по meme_id, остальное — по пользователю. Апдейты с
+одним ключом выполняются строго по одному и в порядке прихода, с разными —
+параллельно, но не больше workers одновременно.
+
+Backpressure: принятых, но не доработанных апдейтов не больше queue_size;
+следующий ждёт места. В polling это тормозит getUpdates (tasks_concurrency_limit),
+в webhook — заполняет очередь приёма, и Telegram получает 503.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 1000
+
+# Callback'и, которые меняют судьбу мема: их сериализуем по мему, а не по модератору.
+VOTE_PREFIXES = ("approve_", "urgent_", "reject_")
+
+Job = Callable[[], Awaitable[Any]]
+
+
+def update_key(update: Update) -> Hashable:
+    """Ключ сериализации: ("meme", id) для голосов, ("user", id) для остального."""
+    callback = update.callback_query
+    if callback is not None:
+        data = callback.data or ""
+        if data.startswith(VOTE_PREFIXES):
+            _, _, meme_id = data.partition("_")
+            if meme_id.isdigit():
+                return ("meme", int(meme_id))
+        return ("user", callback.from_user.id)
+    message = update.message
+    if message is not None:
+        return ("user", message.from_user.id if message.from_user else message.chat.id)
+    # Прочие типы апдейтов друг с другом не конфликтуют.
+    return ("update", update.update_id)
+
+
+class KeyedDispatcher:
+    """N воркеров; задачи с одним ключом — последовательно, с разными — параллельно."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = asyncio.Semaphore(queue_size)
+        # Ключ здесь ⇔ он либо ждёт в _ready, либо его задачу сейчас выполняет воркер.
+        self._by_key: Dict[Hashable, Deque[Tuple[Job, asyncio.Future]]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for q in self._by_key.values())
+
+    async def run(self, key: Hashable, job: Job) -> Any:
+        """Ставит job в очередь ключа и возвращает его результат."""
+        await self._slots.acquire()
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        queue = self._by_key.get(key)
+        if queue is None:
+            self._by_key[key] = deque([(job, future)])
+            self._ready.put_nowait(key)
+        else:
+            queue.append((job, future))
+        return await future
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _ensure_workers(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"update-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._by_key[key]
+            job, future = queue.popleft()
+            try:
+                # Вызывающий мог уйти (отмена) — тогда job не запускаем.
+                if not future.done():
+                    try:
+                        result = await job()
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+            finally:
+                self._slots.release()
+                # Ключ с хвостом — в конец очереди готовых: другие ключи не голодают.
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._by_key[key]
+
+
+class KeyedUpdateMiddleware(BaseMiddleware):
+    """Outer-middleware dp.update: каждый апдейт проходит через KeyedDispatcher."""
+
+    def __init__(self, dispatcher: KeyedDispatcher):
+        self.dispatcher = dispatcher
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        return await self.dispatcher.run(update_key(event), lambda: handler(event, data))
@@ -0,0 +1,52 @@
+"""Параллельная рассылка одного действия по списку адресатов.
+
+fan_out(targets, call) запускает call(target) для всех адресатов сразу, но не
+больше concurrency одновременно, и ограничивает каждый вызов таймаутом:
+один зависший чат не держит остальных и ответ пользователю. Результаты
+возвращаются в порядке targets — независимо от того, кто ответил первым.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Сколько запросов к Telegram держим в полёте из одной рассылки.
+DEFAULT_CONCURRENCY = 8
+# Потолок одного вызова: дольше — считаем чат зависшим.
+DEFAULT_TIMEOUT_SEC = 15.0
+
+
+@dataclass
+class FanoutResult(Generic[T]):
+    target: T
+    value: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def fan_out(
+    targets: Iterable[T],
+    call: Callable[[T], Awaitable[Any]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    timeout: Optional[float] = DEFAULT_TIMEOUT_SEC,
+) -> List[FanoutResult[T]]:
+    """Вызывает call для каждого адресата; исключения и таймауты — в result.error.
+
+    Таймаут отменяет ожидание, но не гарантирует, что Telegram не выполнил
+    запрос: сообщение могло уйти, просто ответ не дождались.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(target: T) -> FanoutResult[T]:
+        async with semaphore:
+            try:
+                value = await asyncio.wait_for(call(target), timeout)
+            except Exception as e:  # asyncio.TimeoutError тоже Exception
+                return FanoutResult(target, error=e)
+            return FanoutResult(target, value=value)
+
+    return list(await asyncio.gather(*(one(t) for t in targets)))
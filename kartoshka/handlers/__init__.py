@@ -1,6 +1,6 @@
 from aiogram import Dispatcher
 
-from kartoshka.handlers import moderation, recruit, start, submit
+from kartoshka.handlers import admin, moderation, recruit, start, submit
 from kartoshka.state import AppState
 
 
@@ -9,3 +9,4 @@ def register_handlers(dp: Dispatcher, state: AppState) -> None:
     submit.register(dp, state)
     moderation.register(dp, state)
     recruit.register(dp, state)
+    admin.register(dp, state)
@@ -0,0 +1,77 @@
+"""Админ-команды криптоселектархов: разбор dead-letter публикаций и аудит голосов.
+
+    /dlq [фильтры]         — что лежит в dead-letter (не больше LIST_LIMIT строк)
+    /dlq_replay [фильтры]  — вернуть подходящие записи в очередь публикации
+    /votes [фильтры]       — история голосов (последние LIST_LIMIT событий)
+
+Фильтры dead-letter: номера мемов, error=ТИП, since=ДАТА, until=ДАТА (ISO),
+например «/dlq_replay error=TelegramNetworkError since=2025-01-31». Фильтры
+истории: номер мема, by=ID модератора, since=, until= («/votes 12»).
+Без фильтров — все записи.
+"""
+from aiogram import Dispatcher
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from kartoshka import config
+from kartoshka.dead_letter import DeadLetterFilter
+from kartoshka.state import AppState
+from kartoshka.vote_history import EventFilter
+
+DLQ_COMMAND = "dlq"
+DLQ_REPLAY_COMMAND = "dlq_replay"
+VOTES_COMMAND = "votes"
+COMMANDS = (DLQ_COMMAND, DLQ_REPLAY_COMMAND, VOTES_COMMAND)
+LIST_LIMIT = 20
+
+
+def register(dp: Dispatcher, state: AppState) -> None:
+    @dp.message(Command(DLQ_COMMAND, DLQ_REPLAY_COMMAND))
+    async def dead_letters(message: Message, command: CommandObject):
+        if message.from_user.id not in config.EDITOR_IDS:
+            return
+        try:
+            flt = DeadLetterFilter.parse((command.args or "").split())
+        except ValueError as e:
+            await message.answer(f"Не понял фильтр: {e}")
+            return
+
+        if command.command == DLQ_REPLAY_COMMAND:
+            replayed = await state.scheduler.replay_dead_letters(flt)
+            if replayed:
+                await message.answer(f"Вернул в очередь публикации: {', '.join(map(str, replayed))}")
+            else:
+                await message.answer("В dead-letter нет подходящих записей.")
+            return
+
+        entries = state.scheduler.dead_letter_entries(flt)
+        if not entries:
+            await message.answer("В dead-letter нет подходящих записей.")
+            return
+        lines = [
+            f"#{e.get('meme', {}).get('meme_id')} · {e.get('dead_at', '—')[:16]} · {e.get('last_error', '—')}"
+            for e in entries[-LIST_LIMIT:]
+        ]
+        header = f"В dead-letter {len(entries)} записей" + (f", последние {LIST_LIMIT}:" if len(entries) > LIST_LIMIT else ":")
+        await message.answer("\n".join([header, *lines]))
+
+    @dp.message(Command(VOTES_COMMAND))
+    async def vote_history(message: Message, command: CommandObject):
+        if message.from_user.id not in config.EDITOR_IDS:
+            return
+        try:
+            flt = EventFilter.parse((command.args or "").split())
+        except ValueError as e:
+            await message.answer(f"Не понял фильтр: {e}")
+            return
+
+        events = state.scheduler.vote_events(flt)
+        if not events:
+            await message.answer("Подходящих голосов в истории нет.")
+            return
+        lines = [
+            f"{e.at.strftime('%Y-%m-%d %H:%M:%S')} · #{e.meme_id} · {e.editor_id}: {e.vote}"
+            for e in events[-LIST_LIMIT:]
+        ]
+        header = f"В истории {len(events)} голосов" + (f", последние {LIST_LIMIT}:" if len(events) > LIST_LIMIT else ":")
+        await message.answer("\n".join([header, *lines]))
@@ -6,10 +6,9 @@ from aiogram import Dispatcher, F
 from aiogram.types import CallbackQuery
 
 from kartoshka import config, notifications
-from kartoshka.config import PUBLISH_CHAT_ID
 from kartoshka.models import Meme
+from kartoshka.persistence import PersistenceError
 from kartoshka.state import AppState
-from kartoshka.storage import save_user_data
 from kartoshka.telegram_io import build_mod_keyboard
 
 
@@ -20,23 +19,35 @@ def _default_user_data():
 def _reset_rejections(user_id, state: AppState) -> None:
     if not user_id:
         return
-    ud = state.user_data.setdefault(str(user_id), _default_user_data())
+    key = str(user_id)
+    ud = state.user_data.setdefault(key, _default_user_data())
     ud["rejections"] = 0
     ud["ban_until"] = None
-    save_user_data(state.user_data)
+    state.user_data.mark_dirty(key)
+    state.mark_dirty("users")
 
 
 async def _increment_rejections_and_maybe_ban(user_id, state: AppState) -> None:
     if not user_id:
         return
-    ud = state.user_data.setdefault(str(user_id), _default_user_data())
+    state.refresh_user(user_id)
+    key = str(user_id)
+    ud = state.user_data.setdefault(key, _default_user_data())
     ud["rejections"] += 1
 
     if ud["rejections"] >= 3:
         ud["ban_until"] = datetime.now(timezone.utc) + timedelta(days=14)
+    state.user_data.mark_dirty(key)
+    state.mark_dirty("users")
 
     # Сначала коммитим изменения на диск — важнее чем уведомление.
-    await asyncio.to_thread(save_user_data, state.user_data)
+    try:
+        await state.flush()
+    except PersistenceError as e:
+        # Отказ остался в памяти и запишется повтором commit'а; о бане,
+        # которого ещё нет на диске, не сообщаем.
+        logging.error(f"Отказ автору {user_id} пока не записан: {e}")
+        return
 
     # Уведомление пользователя о бане может не пройти (юзер заблокировал бота) — не фейлимся.
     if ud["rejections"] >= 3:
@@ -53,10 +64,12 @@ async def _finalize_meme(meme: Meme, action: str, state: AppState) -> None:
     Если публикация проваливается — сбрасываем finalized и оставляем мем в очереди для повтора.
     """
     if action == "urgent":
-        published = await notifications.publish_meme(state.bot, meme, PUBLISH_CHAT_ID)
+        published = await notifications.publish_meme(state.bot, meme, config.PUBLISH_CHAT_ID)
         if not published:
             # Отменяем claim — пусть модераторы попробуют ещё раз.
             meme.finalized = False
+            if state.shared:
+                await state.scheduler.unclaim(meme)
             await notifications.update_mod_messages_with_resolution(
                 state.bot, meme, "❗ Ошибка публикации — попробуйте ещё раз"
             )
@@ -71,9 +84,12 @@ async def _finalize_meme(meme: Meme, action: str, state: AppState) -> None:
         resolution = "❌ Отк."
         await _increment_rejections_and_maybe_ban(meme.user_id, state)
 
-    await notifications.update_user_messages_with_status(state.bot, meme, resolution)
+    # Автору и редакторам — одновременно: финализация стоит один round trip.
     resolution_with_summary = f"{resolution} {meme.get_vote_summary()}"
-    await notifications.update_mod_messages_with_resolution(state.bot, meme, resolution_with_summary)
+    await asyncio.gather(
+        state.status_edits.finalize(state.bot, meme, resolution),
+        notifications.update_mod_messages_with_resolution(state.bot, meme, resolution_with_summary),
+    )
     state.scheduler.resolve(meme.meme_id)
 
 
@@ -93,17 +109,37 @@ def register(dp: Dispatcher, state: AppState) -> None:
         except ValueError:
             await callback.answer("Некорректный запрос.")
             return
+        if state.shared:
+            # Мем мог прийти через другой процесс — берём версию из базы.
+            state.scheduler.refresh_pending(meme_id)
         if meme_id not in state.scheduler.pending_memes:
             await callback.answer("Заявка не найдена или уже обработана.")
             return
 
         meme = state.scheduler.pending_memes[meme_id]
         crypto_id = callback.from_user.id
-        meme.add_vote(crypto_id, action)
-        await asyncio.to_thread(state.scheduler.save_moderation)
-
-        # Атомарно: решаем финализировать и ставим claim ДО любого await.
-        # Это защищает от гонки, когда два callback-а одновременно приходят к финализации.
+        prev_vote = meme.add_vote(crypto_id, action)
+        # Одна строка в лог модерации (и событие в историю голосов); на диск —
+        # ближайшим group commit'ом (в общем режиме ждём его, чтобы голос увидели
+        # другие процессы). Повторное нажатие той же кнопки ничего не меняет.
+        if prev_vote != action:
+            state.scheduler.record_vote(meme_id, crypto_id, action)
+        if state.shared:
+            try:
+                await state.flush()
+            except PersistenceError as e:
+                # Голос остался в буфере и запишется повтором commit'а.
+                logging.error(f"Голос {crypto_id} по мему {meme_id} пока не записан: {e}")
+                await callback.answer("Не удалось сохранить голос, попробуйте ещё раз.")
+                return
+            # Перечитываем уже после своей записи: из двух процессов, голосующих
+            # одновременно, хотя бы второй увидит оба голоса.
+            meme = state.scheduler.refresh_pending(meme_id) or meme
+
+        # Голоса по одному мему KeyedDispatcher (kartoshka.dispatch) и так выполняет
+        # строго по очереди. Claim ДО любого await — вторая линия защиты от двойной
+        # финализации, если хендлер вызван мимо пула (тесты, другой вход); в общем
+        # режиме claim — строка в базе, её снимает ровно один из конкурентов.
         final_action = None
         if not meme.finalized:
             if not config.CRYPTOSELECTARCHY:
@@ -112,6 +148,9 @@ def register(dp: Dispatcher, state: AppState) -> None:
                 final_action = "urgent" if meme.is_urgent() else "approve"
             elif meme.is_rejected():
                 final_action = "reject"
+            # В общем режиме claim ставит база: финализирует ровно один процесс.
+            if final_action is not None and state.shared and not await state.scheduler.claim(meme_id):
+                final_action = None
             if final_action is not None:
                 meme.finalized = True  # ← атомарный claim, до первого await
 
@@ -123,8 +162,12 @@ def register(dp: Dispatcher, state: AppState) -> None:
         except Exception as e:
             logging.error(f"Не удалось ответить на callback по мему {meme.meme_id}: {e}")
 
+        # Статус автора — через debounce: серия голосов даёт один edit.
+        # У финализированного мема статус выставит _finalize_meme.
+        if not meme.finalized:
+            state.status_edits.schedule(state.bot, meme)
+
         try:
-            await notifications.update_user_messages_with_status(state.bot, meme)
             new_kb = build_mod_keyboard(meme, crypto_id)
             await state.bot.edit_message_reply_markup(
                 chat_id=callback.message.chat.id,
@@ -13,7 +13,6 @@ from aiogram.types import CallbackQuery
 
 from kartoshka import config
 from kartoshka.state import AppState
-from kartoshka.storage import add_candidate
 
 JOIN_CALLBACK = "crypto_join"
 
@@ -39,7 +38,7 @@ def register(dp: Dispatcher, state: AppState) -> None:
         # add_candidate идемпотентен и сам сообщает, новая ли запись —
         # отдельное чтение списка перед записью не нужно (и было гонкой).
         is_new = await asyncio.to_thread(
-            add_candidate,
+            state.storage.add_candidate,
             user.id,
             user.username,
             user.first_name,
@@ -3,7 +3,6 @@ from aiogram.filters import Command
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
 from kartoshka import config
-from kartoshka.config import BOT_NAME
 from kartoshka.state import AppState
 
 
@@ -16,14 +15,14 @@ def register(dp: Dispatcher, state: AppState) -> None:
         ])
         if config.CRYPTOSELECTARCHY:
             intro_text = (
-                f"Привет! Я {BOT_NAME}.\n\n"
+                f"Привет! Я {config.BOT_NAME}.\n\n"
                 "Да здравствует Криптоселектархическая олигархия!\n"
                 "Решения принимаются коллективно.\n\n"
                 "Как вы хотите опубликовать мем?"
             )
         else:
             intro_text = (
-                f"Привет! Я {BOT_NAME}.\n\n"
+                f"Привет! Я {config.BOT_NAME}.\n\n"
                 "Единоличный Узурпатор у власти.\n"
                 "Как вы хотите опубликовать мем?"
             )
@@ -1,16 +1,20 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import List, Optional
 
 from aiogram import Dispatcher, F
+from aiogram.filters import Command
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 
-from kartoshka.config import EDITOR_IDS
+from kartoshka import captions, config
+from kartoshka.fanout import fan_out
+from kartoshka.handlers.admin import COMMANDS as ADMIN_COMMANDS
+from kartoshka.media_groups import MEDIA_GROUP_WINDOW_SEC, MediaGroupCollector
 from kartoshka.message_snapshot import MessageSnapshot
 from kartoshka.models import Meme
+from kartoshka.persistence import PersistenceError
+from kartoshka.notifications import user_status_text
 from kartoshka.state import AppState
-from kartoshka.storage import save_meme_counter, save_user_data
 from kartoshka.telegram_io import send_media_message
 
 
@@ -34,8 +38,9 @@ def check_user_limits(user_id: int, now: datetime, state: AppState) -> Optional[
 
 
 def register(dp: Dispatcher, state: AppState) -> None:
-    @dp.message(F.content_type.in_(["text", "photo", "video", "animation", "voice", "video_note"]))
-    async def handle_meme_suggestion(message: Message):
+    async def submit_meme(messages: List[Message]) -> None:
+        """Один мем из одного сообщения или из всех сообщений альбома."""
+        message = messages[0]
         user_id = message.from_user.id
         chosen_mode = state.get_publish_choice(user_id)
         if chosen_mode is None:
@@ -43,28 +48,45 @@ def register(dp: Dispatcher, state: AppState) -> None:
             return
 
         now = datetime.now(timezone.utc)
+        state.refresh_user(user_id)
         rejection = check_user_limits(user_id, now, state)
         if rejection:
             await message.answer(rejection)
             return
 
-        state.user_data[str(user_id)]["last_submission"] = now
-        await asyncio.to_thread(save_user_data, state.user_data)
+        user_key = str(user_id)
+        previous_submission = state.user_data[user_key]["last_submission"]
+        state.user_data[user_key]["last_submission"] = now
+        state.user_data.mark_dirty(user_key)
+        state.mark_dirty("users")
 
-        state.meme_counter += 1
+        meme_id = await state.next_meme_id()
         real_user_id: Optional[int] = user_id
 
         # Выжимаем нужные поля из aiogram.Message в лёгкий snapshot — иначе Meme
         # будет держать 109-полевой pydantic-граф в памяти до 3 дней.
-        snapshot = MessageSnapshot.from_message(message)
+        snapshot = MessageSnapshot.from_messages(messages)
         meme = Meme(
-            meme_id=state.meme_counter,
+            meme_id=meme_id,
             user_id=real_user_id,
             publish_choice=chosen_mode,
             content=snapshot,
         )
-        await asyncio.to_thread(state.scheduler.add_pending, meme)
-        await asyncio.to_thread(save_meme_counter, state.meme_counter)
+        state.scheduler.add_pending(meme)
+        # Автор, новый мем и счётчик уходят одним group commit'ом (в SQLite —
+        # одной транзакцией). Мем должен лечь на диск до того, как модераторы
+        # увидят кнопки: голос за мем, потерянный рестартом, некуда применить.
+        try:
+            await state.flush()
+        except PersistenceError as e:
+            logging.error(f"Мем {meme_id} не записан, в модерацию не отправлен: {e}")
+            # Откатываем мем и кулдаун: автор сможет прислать его снова.
+            state.scheduler.resolve(meme_id)
+            state.user_data[user_key]["last_submission"] = previous_submission
+            state.user_data.mark_dirty(user_key)
+            state.mark_dirty("users")
+            await message.answer("Не удалось сохранить мем, попробуйте отправить его чуть позже.")
+            return
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [
@@ -75,37 +97,52 @@ def register(dp: Dispatcher, state: AppState) -> None:
         ])
 
         if chosen_mode == "user":
-            if message.from_user.username:
-                from_text = f"@{message.from_user.username}"
+            if snapshot.from_user_username:
+                author = snapshot.html_mention
             else:
-                from_text = f"{message.from_user.id}"
+                author = str(snapshot.from_user_id)
         else:
-            from_text = "Картошка"
-
-        user_text = message.caption if message.caption else message.text
-        display_text = user_text if user_text else "[Без текста]"
-        info_text = (
-            f"Мем ID: {meme.meme_id}\n\n{display_text}\n\nОт: {from_text}\n"
-            f"Публикация как: {chosen_mode}"
+            author = captions.ANONYMOUS_AUTHOR
+        info_text = captions.moderator_caption(snapshot, meme.meme_id, chosen_mode, author)
+
+        # Всем редакторам параллельно: задержка — самый медленный чат, а не сумма.
+        results = await fan_out(
+            config.EDITOR_IDS,
+            lambda crypto_id: send_media_message(
+                telegram_bot=state.bot,
+                chat_id=crypto_id,
+                content=snapshot,
+                caption=info_text,
+                reply_markup=keyboard,
+            ),
         )
+        for result in results:
+            if result.ok:
+                meme.mod_messages.append((result.target, result.value.message_id))
+            else:
+                logging.error(f"Не удалось отправить сообщение редактору {result.target}: {result.error!r}")
 
-        for crypto_id in EDITOR_IDS:
-            try:
-                sent_msg = await send_media_message(
-                    telegram_bot=state.bot,
-                    chat_id=crypto_id,
-                    content=message,
-                    caption=info_text,
-                    reply_markup=keyboard,
-                )
-                meme.mod_messages.append((crypto_id, sent_msg.message_id))
-            except Exception as e:
-                logging.error(f"Не удалось отправить сообщение редактору {crypto_id}: {e}")
-
+        # Запоминаем показанный статус: debounce не станет слать тот же текст.
+        meme.user_status_text = user_status_text(meme)
         user_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=f"Голосование: {meme.get_vote_summary()}", callback_data="noop")]
+            [InlineKeyboardButton(text=meme.user_status_text, callback_data="noop")]
         ])
         user_msg = await message.answer("Ваш мем отправлен на модерацию.", reply_markup=user_keyboard)
 
         if meme.user_id is not None:
             meme.user_messages.append((meme.user_id, user_msg.message_id))
+
+    # Элементы альбома копятся по media_group_id и приходят в submit_meme пачкой.
+    # main() закрывает его при остановке (state.albums.close()).
+    albums = state.albums = MediaGroupCollector(submit_meme, window=MEDIA_GROUP_WINDOW_SEC)
+
+    # Админ-команды регистрируются позже — пропускаем их мимо приёма мемов.
+    @dp.message(
+        F.content_type.in_(["text", "photo", "video", "animation", "voice", "video_note"]),
+        ~Command(*ADMIN_COMMANDS),
+    )
+    async def handle_meme_suggestion(message: Message):
+        if message.media_group_id is not None:
+            albums.add(message)
+            return
+        await submit_meme([message])
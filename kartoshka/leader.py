@@ -0,0 +1,94 @@
+"""Лидер среди нескольких процессов бота: публикует только он.
+
+Процессы делят SQLite-базу (MULTI_INSTANCE). Цикл Scheduler.run — публикация
+и истечение модерации — должен идти ровно в одном из них, иначе каждый мем
+вышел бы в канал столько раз, сколько процессов. LeaderLease держит аренду
+в таблице leases: лидер продлевает её каждые ttl/3, остальные раз в ttl/3
+пробуют перехватить. Лидер упал или завис — аренда истекает через ttl, и
+её забирает следующий процесс (failover).
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional
+
+from kartoshka.storage import SharedStorage
+
+SCHEDULER_LEASE = "scheduler"
+DEFAULT_LEASE_TTL_SEC = 30.0
+
+
+def default_holder() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaderLease:
+    def __init__(
+        self,
+        storage: SharedStorage,
+        name: str = SCHEDULER_LEASE,
+        holder: Optional[str] = None,
+        ttl_sec: float = DEFAULT_LEASE_TTL_SEC,
+    ):
+        self.storage = storage
+        self.name = name
+        self.holder = holder or default_holder()
+        self.ttl_sec = ttl_sec
+        # Монотонный момент, до которого аренда точно наша (с запасом на продление).
+        self._valid_until = 0.0
+
+    @property
+    def held(self) -> bool:
+        """Аренда подтверждена и не истекла — можно делать то, что может только лидер."""
+        return time.monotonic() < self._valid_until
+
+    def try_acquire(self) -> bool:
+        started = time.monotonic()
+        try:
+            acquired = self.storage.acquire_lease(self.name, self.holder, self.ttl_sec)
+        except Exception as e:
+            logging.error(f"Не удалось обновить аренду {self.name}: {e}")
+            acquired = False
+        # Отсчёт от момента запроса (ответ базы мог задержаться) и с запасом
+        # в один интервал продления: перестаём считать себя лидером раньше,
+        # чем аренду сможет перехватить другой процесс.
+        self._valid_until = started + self.ttl_sec * 2 / 3 if acquired else 0.0
+        return acquired
+
+    def release(self) -> None:
+        self._valid_until = 0.0
+        try:
+            self.storage.release_lease(self.name, self.holder)
+        except Exception as e:
+            logging.error(f"Не удалось отпустить аренду {self.name}: {e}")
+
+    async def run(self, body: Callable[[], Awaitable[None]]) -> None:
+        """Выполняет body, пока держим аренду; потеряли — отменяем и ждём снова."""
+        interval = self.ttl_sec / 3
+        task: Optional[asyncio.Task] = None
+        try:
+            while True:
+                leader = self.try_acquire()
+                if leader and task is None:
+                    logging.info(f"{self.holder}: стал лидером ({self.name})")
+                    task = asyncio.create_task(body(), name=f"leader-{self.name}")
+                elif not leader and task is not None:
+                    logging.warning(f"{self.holder}: аренда {self.name} потеряна, останавливаю")
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
+                    task = None
+                if task is not None and task.done():
+                    # body завершился сам (или упал) — пусть решает супервизор.
+                    return task.result()
+                await asyncio.sleep(interval)
+        finally:
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+            if self.held:
+                self.release()
@@ -1,44 +1,77 @@
 import asyncio
 import logging
+import signal
+from datetime import timedelta
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.bot import DefaultBotProperties
 
-from kartoshka.config import (
-    API_TOKEN,
-    CRYPTOSELECTARCHY,
-    POST_FREQUENCY_MINUTES,
-    PUBLISH_CHAT_ID,
-)
+from kartoshka import config, ratelimit
+from kartoshka.catchup import CatchUpPolicy
+from kartoshka.dispatch import KeyedDispatcher, KeyedUpdateMiddleware
 from kartoshka.handlers import register_handlers
-from kartoshka.notifications import publish_meme
+from kartoshka.notifications import publish_album, publish_meme
+from kartoshka.persistence import PersistenceError
 from kartoshka.scheduler import Scheduler
 from kartoshka.state import AppState
-from kartoshka.storage import load_meme_counter, load_user_data
+from kartoshka.storage import JsonStorage, Storage
 
 logging.basicConfig(level=logging.INFO)
 
-if CRYPTOSELECTARCHY:
-    print("Криптоселектархическая олигархия включена! (многоголосие)")
-else:
-    print("Единоличный Узурпатор у власти! (решение принимает один голос)")
+
+def print_mode() -> None:
+    if config.CRYPTOSELECTARCHY:
+        print("Криптоселектархическая олигархия включена! (многоголосие)")
+    else:
+        print("Единоличный Узурпатор у власти! (решение принимает один голос)")
+
+
+def build_storage() -> Storage:
+    """Backend хранилища по STORAGE_BACKEND (json по умолчанию)."""
+    if config.STORAGE_BACKEND == "sqlite":
+        from kartoshka.sqlite_storage import SQLiteStorage
+
+        return SQLiteStorage(config.SQLITE_PATH)
+    return JsonStorage()
 
 
 def build_app_state() -> AppState:
-    bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    storage = build_storage()
+    bot = Bot(token=config.API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    # Все исходящие запросы — через лимиты Telegram и с приоритетами.
+    ratelimit.install(bot)
 
     async def on_publish(meme):
-        # Возвращаем результат: scheduler ретраит мем, если публикация
-        # не удалась (publish_meme при ошибке Telegram возвращает False).
-        return await publish_meme(bot, meme, PUBLISH_CHAT_ID)
+        # Ошибка Telegram пробрасывается: по её классу scheduler решает,
+        # повторить публикацию (и когда) или сразу отдать мем в dead-letter.
+        return await publish_meme(bot, meme, config.PUBLISH_CHAT_ID, raise_errors=True)
+
+    async def on_publish_album(memes):
+        return await publish_album(bot, memes, config.PUBLISH_CHAT_ID, raise_errors=True)
+
+    drop_hours = config.CATCHUP_DROP_OLDER_THAN_HOURS
+    catch_up = CatchUpPolicy(
+        mode=config.CATCHUP_POLICY,
+        min_interval=timedelta(minutes=config.CATCHUP_MIN_INTERVAL_MINUTES),
+        drop_older_than=timedelta(hours=drop_hours) if drop_hours > 0 else None,
+    )
 
-    scheduler = Scheduler(POST_FREQUENCY_MINUTES, bot=bot, on_publish=on_publish)
+    # JsonStorage очередями не занимается — Scheduler пишет свои файлы сам.
+    queue_storage = None if isinstance(storage, JsonStorage) else storage
+    scheduler = Scheduler(
+        config.POST_FREQUENCY_MINUTES, bot=bot, on_publish=on_publish, storage=queue_storage,
+        shared=config.MULTI_INSTANCE, ordering=config.PUBLISH_ORDERING, catch_up=catch_up,
+        on_publish_album=on_publish_album,
+    )
 
     state = AppState(
         bot=bot,
         scheduler=scheduler,
-        meme_counter=max(load_meme_counter(), scheduler.get_max_meme_id()),
-        user_data=load_user_data(),
+        meme_counter=max(storage.load_meme_counter(), scheduler.get_max_meme_id()),
+        user_data=storage.load_user_data(),
+        storage=storage,
+        persist_window_sec=config.PERSIST_WINDOW_MS / 1000,
+        shared=config.MULTI_INSTANCE,
     )
     return state
 
@@ -55,6 +88,32 @@ async def _expire_publish_choices_loop(state: AppState, interval_sec: float = 60
             logging.error(f"Ошибка в cleanup-loop: {e}")
 
 
+async def _compact_moderation_loop(state: AppState, interval_sec: float = 60) -> None:
+    """Периодически сворачивает лог модерации в снапшот, если он разросся,
+    и выбрасывает из журнала публикаций устаревшие записи."""
+    while True:
+        await asyncio.sleep(interval_sec)
+        if state.scheduler.needs_compaction:
+            await state.scheduler.compact_moderation()
+        ledger = state.scheduler.ledger
+        if ledger.needs_compaction:
+            try:
+                removed = ledger.compact()
+                if removed:
+                    logging.info(f"Журнал публикаций: выброшено {removed} устаревших записей")
+            except Exception as e:
+                logging.error(f"Ошибка при компакции журнала публикаций: {e}")
+
+
+async def _log_persistence_stats_loop(state: AppState, interval_sec: float = 600) -> None:
+    """Периодически пишет в лог метрики group commit'а (размер пачки, время записи)."""
+    while True:
+        await asyncio.sleep(interval_sec)
+        stats = state.persistence.stats.as_dict()
+        if stats["batches"]:
+            logging.info(f"persistence: {stats}")
+
+
 async def _supervise(name: str, factory) -> None:
     """Держит фоновый цикл живым: упал — логируем traceback и перезапускаем.
 
@@ -71,24 +130,102 @@ async def _supervise(name: str, factory) -> None:
             await asyncio.sleep(5)
 
 
-async def main() -> None:
+async def _serve_webhook(dp: Dispatcher, state: AppState) -> None:
+    """Webhook-режим: aiohttp-сервер до SIGTERM/SIGINT, затем drain хендлеров."""
+    from kartoshka.webhook import run_webhook
+
+    if not config.WEBHOOK_URL or not config.WEBHOOK_SECRET:
+        raise ValueError("Для --mode webhook нужны WEBHOOK_URL и WEBHOOK_SECRET")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await run_webhook(
+        dp, state.bot, config.WEBHOOK_URL, config.WEBHOOK_SECRET, stop,
+        path=config.WEBHOOK_PATH, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT,
+        # Несколько процессов слушают один порт, ядро раздаёт им соединения.
+        reuse_port=config.MULTI_INSTANCE,
+    )
+
+
+def reload_config(state: AppState) -> None:
+    """SIGHUP: перечитать env без рестарта (состав редакции, пороги голосов, частоту)."""
+    try:
+        settings = config.reload_settings()
+    except ValueError as e:
+        logging.error(f"SIGHUP: настройки не перечитаны, действуют прежние: {e}")
+        return
+    # Остальные читают config на каждый апдейт, а частоту Scheduler держит у себя.
+    state.scheduler.post_frequency_minutes = settings.post_frequency_minutes
+
+
+def _scheduler_factory(state: AppState):
+    """Цикл публикаций: в общем режиме — только у держателя аренды."""
+    if not state.shared:
+        return state.scheduler.run
+    from kartoshka.leader import LeaderLease
+
+    lease = LeaderLease(state.storage)
+    state.scheduler.lease = lease
+    return lambda: lease.run(state.scheduler.run)
+
+
+async def main(mode: str = "polling") -> None:
+    if config.MULTI_INSTANCE and mode != "webhook":
+        # Два getUpdates на один токен Telegram не допускает (409 Conflict).
+        raise ValueError("MULTI_INSTANCE=true работает только с --mode webhook")
+    print_mode()
     state = build_app_state()
+    if not state.shared:
+        # Просроченное за время простоя — по CATCHUP_POLICY (в общем режиме это делает лидер).
+        state.scheduler.catch_up_on_start()
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_config, state)
     dp = Dispatcher()
+    # Апдейты одного мема (голоса) и одного пользователя — строго по очереди,
+    # разные — параллельно в пределах UPDATE_WORKERS.
+    updates = KeyedDispatcher(config.UPDATE_WORKERS, config.UPDATE_QUEUE_SIZE)
+    dp.update.outer_middleware(KeyedUpdateMiddleware(updates))
     register_handlers(dp, state)
 
     # Ссылки на таски обязаны жить: asyncio держит таски weakref'ами,
     # и таск без ссылки может быть отменён сборщиком мусора.
     background = [
-        asyncio.create_task(_supervise("scheduler", state.scheduler.run), name="scheduler"),
+        asyncio.create_task(_supervise("scheduler", _scheduler_factory(state)), name="scheduler"),
         asyncio.create_task(
             _supervise("choice-cleanup", lambda: _expire_publish_choices_loop(state)),
             name="choice-cleanup",
         ),
+        asyncio.create_task(
+            _supervise("wal-compaction", lambda: _compact_moderation_loop(state)),
+            name="wal-compaction",
+        ),
+        asyncio.create_task(
+            _supervise("persistence-stats", lambda: _log_persistence_stats_loop(state)),
+            name="persistence-stats",
+        ),
     ]
     try:
-        # resolve_used_update_types: просим у Telegram только те апдейты,
-        # на которые есть хендлеры (message, callback_query).
-        await dp.start_polling(state.bot, allowed_updates=dp.resolve_used_update_types())
+        if mode == "webhook":
+            await _serve_webhook(dp, state)
+        else:
+            # resolve_used_update_types: просим у Telegram только те апдейты,
+            # на которые есть хендлеры (message, callback_query).
+            # tasks_concurrency_limit: при полной очереди не тянем новые апдейты.
+            await dp.start_polling(
+                state.bot,
+                allowed_updates=dp.resolve_used_update_types(),
+                tasks_concurrency_limit=config.UPDATE_QUEUE_SIZE,
+            )
     finally:
         for task in background:
             task.cancel()
+        await updates.close()
+        # Недобранные альбомы — в модерацию, пока их мемы ещё можно записать.
+        if state.albums is not None:
+            await state.albums.close()
+        # Дописываем то, что ещё ждёт group commit'а.
+        try:
+            await state.flush()
+        except PersistenceError as e:
+            logging.error(f"При остановке не всё записано на диск: {e}")
@@ -0,0 +1,75 @@
+"""Сборка альбомов: сообщения одного media_group_id → один мем.
+
+Telegram присылает альбом отдельными апдейтами, по сообщению на элемент,
+почти одновременно. MediaGroupCollector копит их по (chat_id, media_group_id)
+и отдаёт пачкой, когда новых элементов нет window секунд (или набралось 10).
+
+Хендлер не ждёт окна сам: апдейты одного пользователя KeyedDispatcher
+выполняет строго по одному, и ждущий хендлер задержал бы остальные элементы
+того же альбома. Поэтому add() возвращается сразу, а пачку обрабатывает
+отдельная задача. При остановке бота close() отдаёт недобранные пачки
+сразу и дожидается их обработки.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Set
+
+from kartoshka.message_snapshot import MEDIA_GROUP_MAX_ITEMS
+
+MEDIA_GROUP_WINDOW_SEC = 1.0
+
+
+class MediaGroupCollector:
+    def __init__(
+        self,
+        on_complete: Callable[[List], Awaitable[None]],
+        window: float = MEDIA_GROUP_WINDOW_SEC,
+    ):
+        self.on_complete = on_complete
+        self.window = window
+        self._groups: Dict[Hashable, List] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        # Ссылки на задачи обработки, чтобы их не собрал GC посреди работы.
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._groups)
+
+    def add(self, message) -> None:
+        """Кладёт элемент альбома в пачку и переводит её таймер (debounce)."""
+        key = (message.chat.id, message.media_group_id)
+        group = self._groups.setdefault(key, [])
+        group.append(message)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if len(group) >= MEDIA_GROUP_MAX_ITEMS:
+            self._flush(key)
+            return
+        self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+
+    async def close(self) -> None:
+        """Отдаёт все недобранные пачки, не дожидаясь окна, и ждёт их обработки."""
+        for key in list(self._groups):
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            self._flush(key)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, key: Hashable) -> None:
+        self._timers.pop(key, None)
+        messages = self._groups.pop(key, None)
+        if not messages:
+            return
+        messages.sort(key=lambda m: m.message_id)
+        task = asyncio.create_task(self._complete(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _complete(self, messages: List) -> None:
+        try:
+            await self.on_complete(messages)
+        except Exception:
+            logging.exception(f"Ошибка при обработке альбома из {len(messages)} сообщений")
@@ -8,9 +8,47 @@
   {"content_type": "photo", "photo": [{"file_id": "..."}], "caption": "...",
    "from_user": {"id": 1, "username": "x", "first_name": "X"}}
 чтобы существующие moderation_queue.json на проде читались без миграции.
+
+Альбом (несколько сообщений с общим media_group_id) — один снимок с
+content_type="media_group" и элементами items:
+  {"content_type": "media_group", "items": [{"type": "photo", "file_id": "..."}, ...],
+   "caption": "...", "from_user": {...}}
 """
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Sequence, Tuple
+
+from kartoshka import captions
+from kartoshka.captions import Escaped
+
+MEDIA_GROUP = "media_group"
+# Что Telegram собирает в один альбом вместе (документы и аудио — только между собой).
+MEDIA_GROUP_ITEM_TYPES = ("photo", "video")
+# sendMediaGroup принимает от 2 до 10 элементов.
+MEDIA_GROUP_MAX_ITEMS = 10
+
+
+class _memoized:
+    """Вычисляемое поле с кэшем в __dict__ экземпляра (запись мимо frozen-__setattr__).
+
+    Как functools.cached_property, но без общей на класс блокировки
+    (в 3.11 она делает первое обращение заметно дороже).
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.name] = self.func(obj)
+        return value
+
+
+@dataclass(frozen=True)
+class MediaItem:
+    content_type: str  # photo | video
+    file_id: str
 
 
 @dataclass(frozen=True)
@@ -26,6 +64,57 @@ class MessageSnapshot:
     from_user_id: Optional[int] = None
     from_user_username: Optional[str] = None
     from_user_first_name: Optional[str] = None
+    # Элементы альбома (только для content_type == "media_group").
+    items: Tuple[MediaItem, ...] = ()
+
+    @property
+    def is_media_group(self) -> bool:
+        return self.content_type == MEDIA_GROUP
+
+    # Экранированные для HTML поля считаются один раз на снимок (kartoshka.captions).
+    # В to_dict, сравнение и repr кэш не попадает.
+    @_memoized
+    def html_text(self) -> Escaped:
+        return Escaped.of(self.caption or self.text)
+
+    @_memoized
+    def html_mention(self) -> Escaped:
+        """@username; пусто, если username нет."""
+        return Escaped.of("@" + self.from_user_username) if self.from_user_username else Escaped.of(None)
+
+    @_memoized
+    def html_first_name(self) -> Escaped:
+        return Escaped.of(self.from_user_first_name)
+
+    @_memoized
+    def author_caption(self) -> str:
+        """Публичная подпись для publish_choice == "user"."""
+        return captions.author_caption(self)
+
+    @classmethod
+    def from_messages(cls, messages: Sequence) -> "MessageSnapshot":
+        """Снимок альбома из сообщений одного media_group_id (в порядке прихода).
+
+        Подпись альбома — первая непустая подпись среди сообщений; автор — у первого.
+        Одно сообщение (или ни одного годного фото/видео) — обычный снимок.
+        """
+        singles = [cls.from_message(m) for m in messages]
+        items = []
+        for snap in singles:
+            file_id = snap.photo_file_id if snap.content_type == "photo" else snap.video_file_id
+            if snap.content_type in MEDIA_GROUP_ITEM_TYPES and file_id:
+                items.append(MediaItem(snap.content_type, file_id))
+        if len(items) < 2:
+            return singles[0]
+        first = singles[0]
+        return cls(
+            content_type=MEDIA_GROUP,
+            caption=next((s.caption for s in singles if s.caption), None),
+            from_user_id=first.from_user_id,
+            from_user_username=first.from_user_username,
+            from_user_first_name=first.from_user_first_name,
+            items=tuple(items[:MEDIA_GROUP_MAX_ITEMS]),
+        )
 
     @classmethod
     def from_message(cls, message) -> "MessageSnapshot":
@@ -92,6 +181,9 @@ class MessageSnapshot:
             d["caption"] = self.caption
         elif self.content_type == "video_note":
             d["video_note"] = {"file_id": self.video_note_file_id or ""}
+        elif self.content_type == MEDIA_GROUP:
+            d["items"] = [{"type": i.content_type, "file_id": i.file_id} for i in self.items]
+            d["caption"] = self.caption
         else:
             d["text"] = self.text or ""
 
@@ -128,6 +220,9 @@ class MessageSnapshot:
             kwargs["caption"] = d.get("caption")
         elif ct == "video_note":
             kwargs["video_note_file_id"] = (d.get("video_note") or {}).get("file_id")
+        elif ct == MEDIA_GROUP:
+            kwargs["items"] = tuple(MediaItem(i["type"], i["file_id"]) for i in d.get("items") or [])
+            kwargs["caption"] = d.get("caption")
         else:
             kwargs["text"] = d.get("text")
 
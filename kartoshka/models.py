@@ -1,15 +1,76 @@
-import html
+import logging
 import math
-import random
+from array import array
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 
-from kartoshka import config
-from kartoshka.constants import METALS_AND_TOXINS
+from kartoshka import captions, config
 from kartoshka.message_snapshot import MessageSnapshot
 
 
+# Голоса хранятся малыми int-кодами: такие int'ы у CPython общие на весь
+# процесс, строка "approve" в каждом голосе не держится.
+APPROVE, URGENT, REJECT = 0, 1, 2
+VOTE_NAMES = ("approve", "urgent", "reject")
+VOTE_CODES = {name: code for code, name in enumerate(VOTE_NAMES)}
+
+
+def _voter_key(crypto_id) -> Union[int, str]:
+    # ID модератора — int (в JSON и WAL он строкой); нечисловой ключ оставляем как есть.
+    try:
+        return int(crypto_id)
+    except (TypeError, ValueError):
+        return str(crypto_id)
+
+
+class MessageRefs:
+    """Список (chat_id, message_id) в плоском array('q'), без tuple и int-объекта на ссылку.
+
+    Снаружи ведёт себя как прежний list кортежей: append, итерация, len,
+    индекс и сравнение со списком.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, refs: Iterable[Tuple[int, int]] = ()):
+        self._data = array("q")
+        for chat_id, message_id in refs:
+            self._data.extend((chat_id, message_id))
+
+    def append(self, ref: Tuple[int, int]) -> None:
+        chat_id, message_id = ref
+        self._data.extend((chat_id, message_id))
+
+    def __len__(self) -> int:
+        return len(self._data) // 2
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        data = self._data
+        return ((data[i], data[i + 1]) for i in range(0, len(data), 2))
+
+    def __getitem__(self, index: int) -> Tuple[int, int]:
+        return list(self)[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, MessageRefs):
+            return self._data == other._data
+        if isinstance(other, (list, tuple)):
+            return list(self) == [tuple(ref) for ref in other]
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"MessageRefs({list(self)!r})"
+
+
 class Meme:
+    # Мемов на модерации — тысячи на дни: без __dict__ каждый заметно легче
+    # (см. benchmarks/meme_memory.py).
+    __slots__ = (
+        "meme_id", "user_id", "publish_choice", "content", "finalized", "created_time",
+        "user_status_text", "published_message_id",
+        "_votes", "_tally", "_mod_messages", "_user_messages",
+    )
+
     def __init__(
         self,
         meme_id: int,
@@ -24,59 +85,87 @@ class Meme:
         # Production-код передаёт уже готовый MessageSnapshot; auto-convert
         # сохраняет обратную совместимость со старыми тестами / внешними caller'ами.
         self.content = content if isinstance(content, MessageSnapshot) else MessageSnapshot.from_message(content)
-        self.votes = {}
-        self.mod_messages = []
-        self.user_messages = []
+        # ID модератора → код голоса; _tally — сколько голосов каждого кода,
+        # ведётся в add_vote, чтобы подсчёт не пересматривал все голоса.
+        self._votes: Dict[Union[int, str], int] = {}
+        self._tally = [0, 0, 0]
+        self._mod_messages = MessageRefs()
+        self._user_messages = MessageRefs()
         self.finalized = False
         self.created_time = datetime.now(timezone.utc)
+        # Текст статуса, который сейчас виден автору (на диск не пишется).
+        self.user_status_text: Optional[str] = None
+        # message_id поста в канале после успешной publish_meme (на диск не пишется).
+        self.published_message_id: Optional[int] = None
+
+    @property
+    def votes(self) -> Dict[str, str]:
+        """Голоса в прежнем виде {"<id модератора>": "approve"} — новая dict-копия."""
+        return {str(key): VOTE_NAMES[code] for key, code in self._votes.items()}
+
+    @votes.setter
+    def votes(self, votes: Dict[str, str]) -> None:
+        self._votes = {}
+        self._tally = [0, 0, 0]
+        for crypto_id, vote in votes.items():
+            if vote not in VOTE_CODES:
+                logging.error(f"Мем {self.meme_id}: пропущен неизвестный голос {vote!r} от {crypto_id}")
+                continue
+            self.add_vote(crypto_id, vote)
+
+    @property
+    def mod_messages(self) -> MessageRefs:
+        return self._mod_messages
+
+    @mod_messages.setter
+    def mod_messages(self, refs: Iterable[Tuple[int, int]]) -> None:
+        self._mod_messages = refs if isinstance(refs, MessageRefs) else MessageRefs(refs)
+
+    @property
+    def user_messages(self) -> MessageRefs:
+        return self._user_messages
+
+    @user_messages.setter
+    def user_messages(self, refs: Iterable[Tuple[int, int]]) -> None:
+        self._user_messages = refs if isinstance(refs, MessageRefs) else MessageRefs(refs)
+
+    def get_vote(self, crypto_id) -> Optional[str]:
+        code = self._votes.get(_voter_key(crypto_id))
+        return VOTE_NAMES[code] if code is not None else None
 
     def add_vote(self, crypto_id: int, vote: str) -> Optional[str]:
-        key = str(crypto_id)
-        prev_vote = self.votes.get(key)
-        self.votes[key] = vote
-        return prev_vote
+        code = VOTE_CODES[vote]
+        key = _voter_key(crypto_id)
+        prev = self._votes.get(key)
+        self._votes[key] = code
+        if prev is not None:
+            self._tally[prev] -= 1
+        self._tally[code] += 1
+        return VOTE_NAMES[prev] if prev is not None else None
 
     def count_votes(self, vote_type: str) -> int:
         if vote_type == "approve":
-            return sum(1 for v in self.votes.values() if v in ("approve", "urgent"))
-        return sum(1 for v in self.votes.values() if v == vote_type)
+            return self._tally[APPROVE] + self._tally[URGENT]
+        code = VOTE_CODES.get(vote_type)
+        return self._tally[code] if code is not None else 0
 
     def is_approved(self) -> bool:
         return self.count_votes("approve") >= config.VOTES_TO_APPROVE
 
     def is_urgent(self) -> bool:
-        urgent_count = sum(1 for v in self.votes.values() if v == "urgent")
         urgent_threshold = max(1, math.ceil(config.VOTES_TO_APPROVE * 0.51))
-        return urgent_count >= urgent_threshold
+        return self._tally[URGENT] >= urgent_threshold
 
     def is_rejected(self) -> bool:
-        return self.count_votes("reject") >= config.VOTES_TO_REJECT
+        return self._tally[REJECT] >= config.VOTES_TO_REJECT
 
     def get_vote_summary(self) -> str:
-        approve_count = sum(1 for v in self.votes.values() if v == "approve")
-        urgent_count = sum(1 for v in self.votes.values() if v == "urgent")
-        reject_count = sum(1 for v in self.votes.values() if v == "reject")
+        approve_count, urgent_count, reject_count = self._tally
         return f"(✅ {approve_count} | ⚡ {urgent_count} | ❌ {reject_count})"
 
     def get_caption(self) -> str:
-        # parse_mode=HTML ⇒ экранируем всё пользовательское.
-        raw_text = self.content.text or self.content.caption or ""
-        user_text = html.escape(raw_text)
-        if self.publish_choice == "user":
-            username = self.content.from_user_username
-            first_name = self.content.from_user_first_name
-            if username:
-                prefix = f"Мем от пользователя @{html.escape(username)}"
-            elif first_name:
-                prefix = f"Мем от пользователя {html.escape(first_name)}"
-            else:
-                prefix = "Мем от пользователя [ДАННЫЕ УДАЛЕНЫ]"
-        else:
-            random_metal = random.choice(METALS_AND_TOXINS)
-            plain_prefix = f"Мем от Анонимной {random_metal} Картошки"
-            prefix = f"<tg-spoiler>{plain_prefix}</tg-spoiler>"
-
-        return f"{prefix}\n\n{user_text}" if user_text else f"{prefix}"
+        # parse_mode=HTML ⇒ пользовательское экранируется (kartoshka.captions).
+        return captions.public_caption(self.content, self.publish_choice, self.meme_id)
 
     def to_dict(self) -> dict:
         content = self.content.to_dict()
@@ -0,0 +1,103 @@
+"""Имена анонимных картошек: «Мем от Анонимной <имя> Картошки».
+
+Словарь — METALS_AND_TOXINS и adjectives.txt, читается один раз в кортеж
+интернированных строк (~710 имён).
+
+Имя — функция meme_id и ключа, без состояния: ретрай, повторный рендер и
+рестарт дают то же имя. meme_id раскладываются по циклам длиной в словарь;
+в цикле порядок имён — перестановка, перемешанная генератором с зерном
+HMAC(ключ, номер цикла). Внутри цикла имена не повторяются, а начало цикла
+(первые window позиций) не повторяет конец предыдущего — так у любых
+window подряд идущих мемов имена разные. Без ключа порядок не угадать по
+номерам мемов.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import random
+import sys
+from array import array
+from functools import lru_cache
+from typing import Dict, Sequence, Tuple
+
+from kartoshka.constants import METALS_AND_TOXINS
+
+ADJECTIVES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "adjectives.txt")
+# Сколько мем подряд имя не повторяется.
+NAME_WINDOW = 100
+# Сколько перестановок циклов держим в памяти (по 2 байта на имя).
+CACHED_CYCLES = 4
+
+
+def load_names(path: str = ADJECTIVES_PATH) -> Tuple[str, ...]:
+    """METALS_AND_TOXINS + прилагательные из файла, без пустых строк и повторов."""
+    names = list(METALS_AND_TOXINS)
+    try:
+        with open(path, encoding="utf-8") as f:
+            names.extend(line.strip() for line in f)
+    except OSError as e:
+        logging.error(f"Не удалось прочитать {path}: {e!r}; имена картошек — только металлы и токсины")
+    return tuple(sys.intern(name) for name in dict.fromkeys(names) if name)
+
+
+class PotatoNamer:
+    def __init__(self, names: Sequence[str], key: bytes, window: int = NAME_WINDOW):
+        if not names:
+            raise ValueError("Словарь имён пуст")
+        self.names = tuple(names)
+        self.key = key
+        # Перестановке нужно место: окно в начале, окно в конце и замены из середины.
+        self.window = min(window, len(self.names) // 4)
+        self._orders: Dict[int, array] = {}
+
+    def name(self, meme_id: int) -> str:
+        cycle, position = divmod(meme_id, len(self.names))
+        return self.names[self._order(cycle)[position]]
+
+    def _shuffled(self, cycle: int) -> list:
+        seed = hmac.new(self.key, f"cycle:{cycle}".encode(), hashlib.sha256).digest()
+        order = list(range(len(self.names)))
+        random.Random(int.from_bytes(seed, "big")).shuffle(order)
+        return order
+
+    def _order(self, cycle: int) -> array:
+        order = self._orders.get(cycle)
+        if order is not None:
+            return order
+        shuffled = self._shuffled(cycle)
+        if cycle > 0 and self.window:
+            # Конец предыдущего цикла — его чистая перестановка: замены ниже
+            # трогают только начало и середину, так что цепочки по циклам нет.
+            tail = set(self._shuffled(cycle - 1)[-self.window:])
+            spare = [
+                i for i in range(self.window, len(shuffled) - self.window) if shuffled[i] not in tail
+            ]
+            for i in range(self.window):
+                if shuffled[i] in tail:
+                    j = spare.pop()
+                    shuffled[i], shuffled[j] = shuffled[j], shuffled[i]
+        if len(self._orders) >= CACHED_CYCLES:
+            self._orders.pop(next(iter(self._orders)))
+        order = self._orders[cycle] = array("H", shuffled)
+        return order
+
+
+def _key() -> bytes:
+    # config читается только здесь: снимкам и шаблонам подписей env не нужен.
+    from kartoshka import config
+
+    if config.POTATO_NAME_KEY:
+        return config.POTATO_NAME_KEY.encode()
+    # По умолчанию — производный от токена бота: стабилен, пока жив бот.
+    return hashlib.sha256(b"potato-names:" + config.API_TOKEN.encode()).digest()
+
+
+@lru_cache(maxsize=None)
+def default_namer() -> PotatoNamer:
+    return PotatoNamer(load_names(), _key())
+
+
+def potato_name(meme_id: int) -> str:
+    """Имя анонимной картошки для мема; одно и то же при каждом вызове."""
+    return default_namer().name(meme_id)
@@ -1,24 +1,57 @@
 """Функции-отправители Telegram-сообщений, связанных с жизненным циклом мема."""
 import logging
+from typing import List, Sequence, Tuple
 
 from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from kartoshka import captions, ratelimit
+from kartoshka.fanout import FanoutResult, fan_out
 from kartoshka.models import Meme
-from kartoshka.telegram_io import send_media_message
+from kartoshka.telegram_io import album_items, send_media_group, send_media_message
+
+# Сколько edit'ов одной пачки держим в полёте — в пределах глобального
+# лимита Telegram (~30 запросов/с на бота).
+EDIT_CONCURRENCY = 30
+
+
+async def edit_reply_markups(
+    bot: Bot, targets: List[Tuple[int, int]], keyboard: InlineKeyboardMarkup, audience: str
+) -> List[FanoutResult]:
+    """Перерисовывает клавиатуру у всех (chat_id, message_id) параллельно.
+
+    Время — один round trip, а не len(targets). Сбои собираются в одну
+    строку лога; возвращаются неудавшиеся адресаты. Перерисовка — массовый
+    трафик: в очереди RateLimiter'а она уступает ответам и публикациям.
+    """
+    with ratelimit.bulk():
+        results = await fan_out(
+            targets,
+            lambda target: bot.edit_message_reply_markup(
+                chat_id=target[0], message_id=target[1], reply_markup=keyboard
+            ),
+            concurrency=EDIT_CONCURRENCY,
+        )
+    failed = [r for r in results if not r.ok]
+    if failed:
+        details = "; ".join(f"{r.target[0]}: {r.error}" for r in failed)
+        logging.error(
+            f"Ошибка при обновлении сообщения для {audience} "
+            f"({len(failed)} из {len(results)}): {details}"
+        )
+    return failed
 
 
 async def update_mod_messages_with_resolution(bot: Bot, meme: Meme, resolution: str) -> None:
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=resolution, callback_data="noop")]
     ])
-    for chat_id, message_id in meme.mod_messages:
-        try:
-            await bot.edit_message_reply_markup(
-                chat_id=chat_id, message_id=message_id, reply_markup=keyboard
-            )
-        except Exception as e:
-            logging.error(f"Ошибка при обновлении сообщения для редактора {chat_id}: {e}")
+    await edit_reply_markups(bot, meme.mod_messages, keyboard, "редактора")
+
+
+def user_status_text(meme: Meme, final_resolution: str = None) -> str:
+    """Текст кнопки-статуса под сообщением автора."""
+    return captions.status_text(meme.get_vote_summary(), final_resolution)
 
 
 async def update_user_messages_with_status(
@@ -27,36 +60,64 @@ async def update_user_messages_with_status(
     if meme.user_id is None or not meme.user_messages:
         return
 
-    vote_summary = meme.get_vote_summary()
-    if final_resolution:
-        status_text = f"{final_resolution} {vote_summary}"
-    else:
-        status_text = f"Голосование: {vote_summary}"
-
+    status_text = user_status_text(meme, final_resolution)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=status_text, callback_data="noop")]
     ])
 
-    for chat_id, message_id in meme.user_messages:
-        try:
-            await bot.edit_message_reply_markup(
-                chat_id=chat_id, message_id=message_id, reply_markup=keyboard
-            )
-        except Exception as e:
-            logging.error(f"Ошибка при обновлении сообщения для пользователя {chat_id}: {e}")
+    failed = await edit_reply_markups(bot, meme.user_messages, keyboard, "пользователя")
+    # Показанным текст считается, только если дошёл до всех сообщений автора:
+    # иначе следующая перерисовка с тем же текстом не была бы отправлена.
+    if not failed:
+        meme.user_status_text = status_text
 
 
-async def publish_meme(bot: Bot, meme: Meme, chat_id: int) -> bool:
-    """Публикует мем в канал. Возвращает True при успехе, False при ошибке Telegram API."""
+async def publish_meme(bot: Bot, meme: Meme, chat_id: int, raise_errors: bool = False) -> bool:
+    """Публикует мем в канал. Возвращает True при успехе, False при ошибке Telegram API.
+
+    raise_errors=True — ошибка не глотается, а пробрасывается вызывающему
+    (Scheduler выбирает по её классу политику повтора).
+    """
     try:
         caption = meme.get_caption()
-        await send_media_message(
-            telegram_bot=bot,
-            chat_id=chat_id,
-            content=meme.content,
-            caption=caption,
-        )
+        with ratelimit.interactive():
+            sent = await send_media_message(
+                telegram_bot=bot,
+                chat_id=chat_id,
+                content=meme.content,
+                caption=caption,
+            )
+        # Scheduler записывает message_id в журнал публикаций.
+        message_id = getattr(sent, "message_id", None)
+        meme.published_message_id = message_id if isinstance(message_id, int) else None
         return True
     except Exception as e:
         logging.error(f"Ошибка при публикации: {e}")
+        if raise_errors:
+            raise
+        return False
+
+
+async def publish_album(bot: Bot, memes: Sequence[Meme], chat_id: int, raise_errors: bool = False) -> bool:
+    """Публикует несколько фото/видео-мемов одним альбомом, у каждого своя подпись.
+
+    Ошибки — как у publish_meme. На каждом меме запоминается message_id
+    первого сообщения его части альбома (для журнала публикаций).
+    """
+    try:
+        items, offsets = [], []
+        for meme in memes:
+            offsets.append(len(items))
+            for i, item in enumerate(album_items(meme.content)):
+                items.append((item, meme.get_caption() if i == 0 else None))
+        with ratelimit.interactive():
+            sent = list(await send_media_group(bot, chat_id, items) or [])
+        for meme, offset in zip(memes, offsets):
+            message_id = getattr(sent[offset], "message_id", None) if offset < len(sent) else None
+            meme.published_message_id = message_id if isinstance(message_id, int) else None
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка при публикации альбома: {e}")
+        if raise_errors:
+            raise
         return False
@@ -0,0 +1,84 @@
+"""Мемы на модерации с индексом по сроку истечения.
+
+PendingMemes — обычный dict meme_id -> Meme (код и тесты пишут в него
+напрямую), который на каждую вставку кладёт в кучу (дедлайн, meme_id, мем).
+Цикл планировщика снимает с вершины только истёкшее — без обхода всех мемов.
+
+Записи кучи проверяются лениво: резолвнутый или заменённый мем просто
+отбрасывается, когда всплывает; если у мема сменился created_time (загрузка
+старого снапшота поверх, ручная правка), он перекладывается с новым ключом.
+"""
+import heapq
+import itertools
+from datetime import timedelta
+from typing import List, Optional
+
+from kartoshka.models import Meme
+
+
+class PendingMemes(dict):
+    def __init__(self, *args, ttl: timedelta, **kwargs):
+        super().__init__()
+        self.ttl = ttl
+        self._heap: List[tuple] = []  # (deadline epoch, seq, meme_id, meme)
+        self._seq = itertools.count()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, meme_id: int, meme: Meme) -> None:
+        super().__setitem__(meme_id, meme)
+        self._push(meme_id, meme)
+        # Удаления не трогают кучу: чистим её, когда устаревших записей
+        # становится больше, чем живых.
+        if len(self._heap) > 2 * len(self) + 64:
+            self._rebuild()
+
+    def setdefault(self, meme_id: int, meme: Optional[Meme] = None) -> Meme:
+        if meme_id not in self:
+            self[meme_id] = meme
+        return self[meme_id]
+
+    def update(self, *args, **kwargs) -> None:
+        for meme_id, meme in dict(*args, **kwargs).items():
+            self[meme_id] = meme
+
+    def deadline(self, meme: Meme) -> float:
+        return (meme.created_time + self.ttl).timestamp()
+
+    def next_deadline(self) -> Optional[float]:
+        """Ближайший дедлайн истечения (epoch) или None, если ждать нечего."""
+        while self._heap:
+            epoch, _, meme_id, meme = self._heap[0]
+            if self._settle_top(epoch, meme_id, meme):
+                return epoch
+        return None
+
+    def pop_expired(self, now_epoch: float) -> List[Meme]:
+        """Снимает с модерации всё, чей дедлайн строго раньше now_epoch."""
+        expired = []
+        while self._heap and self._heap[0][0] < now_epoch:
+            epoch, _, meme_id, meme = self._heap[0]
+            if self._settle_top(epoch, meme_id, meme):
+                heapq.heappop(self._heap)
+                super().__delitem__(meme_id)
+                expired.append(meme)
+        return expired
+
+    def _push(self, meme_id: int, meme: Meme) -> None:
+        heapq.heappush(self._heap, (self.deadline(meme), next(self._seq), meme_id, meme))
+
+    def _settle_top(self, epoch: float, meme_id: int, meme: Meme) -> bool:
+        """True, если вершина кучи актуальна; иначе снимает/перекладывает её."""
+        if self.get(meme_id) is not meme:
+            heapq.heappop(self._heap)
+            return False
+        actual = self.deadline(meme)
+        if actual != epoch:
+            heapq.heappop(self._heap)
+            self._push(meme_id, meme)
+            return False
+        return True
+
+    def _rebuild(self) -> None:
+        self._heap = []
+        for meme_id, meme in self.items():
+            self._push(meme_id, meme)
@@ -0,0 +1,147 @@
+"""Group commit: одна фоновая запись на диск вместо fsync на каждую мутацию.
+
+Хендлеры помечают, что изменилось (mark_dirty("users"), "counter",
+"moderation", "publication"), и идут дальше. Первая пометка открывает окно
+(window_sec, по умолчанию 50 мс); по его закрытию всё накопленное пишется
+одним commit'ом. Пути, которым нужна durability до ответа пользователю,
+ждут барьер await flush() — он возвращается, когда commit, включивший все
+пометки на момент вызова, лёг на диск, и бросает PersistenceError, если
+commit не удался. Параллельные хендлеры в одном окне делят один commit.
+Неудавшийся commit повторяется с backoff'ом, пока пометки не запишутся.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+
+CommitCallback = Callable[[Set[str]], Awaitable[None]]
+
+# Пауза перед повтором неудавшегося commit'а: удваивается с каждым сбоем подряд.
+RETRY_BASE_SEC = 0.5
+RETRY_MAX_SEC = 30.0
+
+
+class PersistenceError(RuntimeError):
+    """Commit, которого ждал flush(), не лёг на диск (причина — в __cause__)."""
+
+
+class PersistenceStats:
+    """Метрики group commit'а: размер пачки (сколько пометок слито) и время записи."""
+
+    def __init__(self):
+        self.batches = 0
+        self.marks = 0
+        self.max_batch_size = 0
+        self.last_batch_size = 0
+        self.total_commit_sec = 0.0
+        self.max_commit_sec = 0.0
+        self.last_commit_sec = 0.0
+
+    def record(self, batch_size: int, commit_sec: float) -> None:
+        self.batches += 1
+        self.marks += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.last_commit_sec = commit_sec
+        self.total_commit_sec += commit_sec
+        self.max_commit_sec = max(self.max_commit_sec, commit_sec)
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "avg_batch_size": self.marks / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "avg_commit_ms": 1000 * self.total_commit_sec / self.batches if self.batches else 0.0,
+            "max_commit_ms": 1000 * self.max_commit_sec,
+            "last_commit_ms": 1000 * self.last_commit_sec,
+        }
+
+
+class Persistence:
+    """Копит пометки и сливает их в commit раз в окно.
+
+    commit(kinds) — корутина владельца (AppState): собирает payload в event
+    loop'е и пишет его в worker-треде. Ошибка commit'а логируется и уходит
+    ждущим flush(); пометки остаются грязными, commit повторяется с backoff'ом.
+    """
+
+    def __init__(self, commit: CommitCallback, window_sec: float = 0.05):
+        self._commit = commit
+        self.window_sec = window_sec
+        self.stats = PersistenceStats()
+        self._dirty: Set[str] = set()
+        self._marks = 0
+        self._waiters: List[asyncio.Future] = []
+        self._task: Optional[asyncio.Task] = None
+        # Сбоев commit'а подряд: задаёт паузу перед повтором.
+        self._failures = 0
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._dirty)
+
+    def mark_dirty(self, kind: str) -> None:
+        self._dirty.add(kind)
+        self._marks += 1
+        self._ensure_task()
+
+    async def flush(self) -> None:
+        """Барьер: ждёт commit, включающий все пометки на момент вызова.
+
+        PersistenceError — commit не удался; пометки остаются, их запишет повтор.
+        """
+        if not self._dirty and self._task is None:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._ensure_task()
+        await fut
+
+    def _delay(self) -> float:
+        if not self._failures:
+            return self.window_sec
+        return min(RETRY_BASE_SEC * 2 ** (self._failures - 1), RETRY_MAX_SEC)
+
+    def _ensure_task(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="persistence")
+
+    async def _run(self) -> None:
+        try:
+            # Пока кто-то успевает пометить новое во время commit'а — крутимся:
+            # пометки, пришедшие посреди записи, уходят следующей пачкой.
+            while self._dirty or self._waiters:
+                await asyncio.sleep(self._delay())
+                kinds, self._dirty = self._dirty, set()
+                marks, self._marks = self._marks, 0
+                waiters, self._waiters = self._waiters, []
+                error = None
+                if kinds:
+                    started = time.perf_counter()
+                    try:
+                        await self._commit(kinds)
+                    except Exception as e:
+                        self._failures += 1
+                        logging.error(
+                            f"Ошибка group commit {sorted(kinds)} (сбой {self._failures} подряд, "
+                            f"повтор через {self._delay():.1f} с): {e}"
+                        )
+                        # Пометки остаются: следующий круг цикла повторит commit.
+                        self._dirty |= kinds
+                        self._marks += marks
+                        error = e
+                    else:
+                        self._failures = 0
+                        self.stats.record(marks, time.perf_counter() - started)
+                # Барьер не держим до починки диска: ждущие узнают о сбое сразу.
+                for fut in waiters:
+                    if fut.done():
+                        continue
+                    if error is None:
+                        fut.set_result(None)
+                    else:
+                        failure = PersistenceError(f"group commit {sorted(kinds)} не записан: {error}")
+                        failure.__cause__ = error
+                        fut.set_exception(failure)
+        finally:
+            self._task = None
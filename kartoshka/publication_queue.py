@@ -0,0 +1,183 @@
+"""Очередь публикации на куче: O(log n) вставка и peek без пересортировки.
+
+Записи очереди — те же dict'ы, что лежат в publication_queue.json
+({"scheduled_time": ISO, "meme": {...}, "attempts": n, "retry_at": ISO}):
+ISO-строки остаются форматом хранения, а ключи кучи (epoch) парсятся из них
+один раз при вставке. Если scheduled_time или retry_at записи меняется,
+владелец обязан вызвать reschedule(entry) — иначе куча не узнает о новом ключе.
+
+scheduled_time — слот записи в расписании, retry_at — собственный таймер
+повтора после неудачной публикации (бэкофф). Раньше этого момента запись
+не публикуется. Порядок задаётся явно (ordering):
+
+    best_effort — запись ждёт свой таймер повтора, а созревшие записи за
+                  ней публикуются без задержки (ключ кучи — момент готовности);
+    fifo        — строго по слотам: пока голова ждёт повтора, ждут все
+                  (ключ — scheduled_time, голова блокирует очередь осознанно).
+
+Удаление ленивое: элемент помечается мёртвым и выбрасывается, когда
+всплывает на вершину (или при перестройке, когда мёртвых больше живых).
+"""
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+BEST_EFFORT = "best_effort"
+FIFO = "fifo"
+ORDERINGS = (BEST_EFFORT, FIFO)
+
+
+class _Item:
+    __slots__ = ("epoch", "slot", "ready", "seq", "entry", "alive")
+
+    def __init__(self, epoch: float, slot: float, ready: float, seq: int, entry: dict):
+        self.epoch = epoch  # ключ кучи (зависит от ordering)
+        self.slot = slot
+        self.ready = ready
+        self.seq = seq
+        self.entry = entry
+        self.alive = True
+
+
+def entry_epoch(entry: dict) -> float:
+    """Слот записи: scheduled_time в секундах epoch (ValueError/KeyError/TypeError — битая)."""
+    return datetime.fromisoformat(entry["scheduled_time"]).timestamp()
+
+
+def ready_epoch(entry: dict) -> float:
+    """Когда запись можно публиковать: слот, а после неудачи — не раньше retry_at."""
+    slot = entry_epoch(entry)
+    retry_at = entry.get("retry_at")
+    return max(slot, datetime.fromisoformat(retry_at).timestamp()) if retry_at else slot
+
+
+class PublicationQueue:
+    """Приоритетная очередь записей публикации по scheduled_time.
+
+    Ведёт себя как упорядоченная последовательность (len, итерация по
+    времени, [0] — голова, [-1] — последняя, сравнение со списком), чтобы
+    сериализация и существующий код, читающий scheduled_posts, не менялись.
+    """
+
+    def __init__(self, entries: Iterable[dict] = (), ordering: str = BEST_EFFORT):
+        if ordering not in ORDERINGS:
+            raise ValueError(f"ordering должен быть одним из {ORDERINGS}, получено: {ordering!r}")
+        self.ordering = ordering
+        self._heap: List[tuple] = []       # (epoch, seq, item) — голова очереди
+        self._max_heap: List[tuple] = []   # (-slot, -seq, item) — последний слот
+        self._by_entry: Dict[int, _Item] = {}
+        self._by_meme_id: Dict[int, _Item] = {}
+        self._seq = itertools.count()
+        self._dead = 0
+        for entry in entries:
+            try:
+                self.append(entry)
+            except (KeyError, TypeError, ValueError):
+                logging.error(f"Пропущена запись очереди с битым scheduled_time: {entry!r}")
+
+    # ----- мутации -----
+
+    def append(self, entry: dict) -> None:
+        slot = entry_epoch(entry)
+        ready = ready_epoch(entry)
+        if id(entry) in self._by_entry:
+            self.remove(entry)
+        epoch = ready if self.ordering == BEST_EFFORT else slot
+        item = _Item(epoch, slot, ready, next(self._seq), entry)
+        heapq.heappush(self._heap, (epoch, item.seq, item))
+        heapq.heappush(self._max_heap, (-slot, -item.seq, item))
+        self._by_entry[id(entry)] = item
+        meme_id = self._meme_id(entry)
+        if meme_id is not None:
+            self._by_meme_id[meme_id] = item
+
+    def remove(self, entry: dict) -> bool:
+        item = self._by_entry.pop(id(entry), None)
+        if item is None:
+            return False
+        item.alive = False
+        self._dead += 1
+        meme_id = self._meme_id(entry)
+        if meme_id is not None and self._by_meme_id.get(meme_id) is item:
+            del self._by_meme_id[meme_id]
+        self._maybe_rebuild()
+        return True
+
+    def reschedule(self, entry: dict) -> None:
+        """Переставляет запись после смены entry["scheduled_time"] или entry["retry_at"]."""
+        self.remove(entry)
+        self.append(entry)
+
+    # ----- чтение -----
+
+    def peek(self) -> Optional[dict]:
+        item = self._top(self._heap)
+        return item.entry if item else None
+
+    def peek_epoch(self) -> Optional[float]:
+        """Когда голову можно публиковать (в fifo — и всё, что за ней)."""
+        item = self._top(self._heap)
+        return item.ready if item else None
+
+    def last(self) -> Optional[dict]:
+        """Запись с самым поздним слотом: за ней встаёт следующий мем."""
+        item = self._top(self._max_heap)
+        return item.entry if item else None
+
+    def find(self, meme_id: int) -> Optional[dict]:
+        item = self._by_meme_id.get(meme_id)
+        return item.entry if item else None
+
+    def __len__(self) -> int:
+        return len(self._by_entry)
+
+    def __bool__(self) -> bool:
+        return bool(self._by_entry)
+
+    def __iter__(self) -> Iterator[dict]:
+        """Записи в порядке публикации; O(n log n) — для сериализации, не для горячего пути."""
+        return iter([item.entry for item in sorted(self._by_entry.values(), key=lambda i: (i.epoch, i.seq))])
+
+    def __getitem__(self, index: int) -> dict:
+        if index == 0 and self:
+            return self.peek()
+        if index == -1 and self:
+            return self.last()
+        return list(self)[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PublicationQueue):
+            return list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PublicationQueue({list(self)!r})"
+
+    # ----- внутреннее -----
+
+    @staticmethod
+    def _meme_id(entry: dict) -> Optional[int]:
+        meme = entry.get("meme")
+        return meme.get("meme_id") if isinstance(meme, dict) else None
+
+    def _top(self, heap: List[tuple]) -> Optional[_Item]:
+        while heap and not heap[0][2].alive:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def _maybe_rebuild(self) -> None:
+        # Мёртвые элементы копятся в обеих кучах; когда их больше живых,
+        # перестраиваем кучи за O(n), чтобы память не росла.
+        if self._dead <= len(self._by_entry):
+            return
+        items = list(self._by_entry.values())
+        self._heap = [(i.epoch, i.seq, i) for i in items]
+        self._max_heap = [(-i.slot, -i.seq, i) for i in items]
+        heapq.heapify(self._heap)
+        heapq.heapify(self._max_heap)
+        self._dead = 0
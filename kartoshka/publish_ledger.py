@@ -0,0 +1,149 @@
+"""Журнал публикаций: защита от дубля поста после крэша.
+
+Scheduler публикует запись и только потом снимает её с очереди
+(publish-then-pop). Крэш между успешной отправкой и снятием раньше давал
+дубль поста после рестарта. Теперь вокруг каждой отправки в журнал пишется:
+
+    intent — перед отправкой в канал;
+    done   — после неё, с message_id опубликованного сообщения;
+    failed — отправка не удалась, intent снимается (следующая попытка чистая).
+
+После рестарта созревшая запись сперва сверяется с журналом (O(1) по
+meme_id): done — мем уже в канале, запись просто снимается с очереди;
+intent без done — процесс умер посреди отправки, и опубликован ли мем,
+неизвестно (Bot API историю канала не отдаёт). Такая запись не
+отправляется повторно вслепую, а уходит в dead-letter на ручную проверку.
+
+Хранение: JSONL-лог (AppendLog, fsync на запись) + dict в памяти; при
+общем storage (SQLite) — строки таблицы publish_ledger, видимые всем
+процессам. Записи старше max_age выбрасываются компакцией: к этому
+моменту мема в очереди публикации давно нет.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from kartoshka.wal import AppendLog
+
+INTENT = "intent"
+DONE = "done"
+
+LEDGER_MAX_AGE = timedelta(days=30)
+# Сколько устаревших строк (перекрытых более свежими записями) копится
+# в логе, прежде чем компакция перепишет его.
+LEDGER_COMPACT_RECORDS = 500
+# SQLite-журнал чистится DELETE'ом по индексу — достаточно раз в час.
+STORAGE_COMPACT_INTERVAL_SEC = 3600
+
+
+class PublishLedger:
+    """Журнал в JSONL-файле; последняя запись по meme_id — актуальная."""
+
+    def __init__(self, path: str, max_age: timedelta = LEDGER_MAX_AGE):
+        self.max_age = max_age
+        self._log = AppendLog(path)
+        # meme_id -> {"id", "state", "ts", "message_id"}; порядок вставки ≈ порядок ts.
+        self._entries: Dict[int, dict] = {}
+        self._records = 0
+        self._load()
+
+    def _load(self) -> None:
+        for record in self._log.replay():
+            self._records += 1
+            try:
+                self._apply(record)
+            except Exception as e:
+                logging.error(f"Пропущена запись журнала публикаций {record!r}: {e}")
+
+    def _apply(self, record: dict) -> None:
+        meme_id = int(record["id"])
+        if record["state"] in (INTENT, DONE):
+            # pop + вставка: запись переезжает в конец, порядок остаётся по ts.
+            self._entries.pop(meme_id, None)
+            self._entries[meme_id] = record
+        else:
+            self._entries.pop(meme_id, None)
+
+    def _write(self, record: dict) -> None:
+        self._log.append(record)
+        self._records += 1
+        self._apply(record)
+
+    def get(self, meme_id: int) -> Optional[dict]:
+        return self._entries.get(meme_id)
+
+    def entries(self) -> List[dict]:
+        """Актуальные записи (intent/done) по порядку ts."""
+        return list(self._entries.values())
+
+    def record_intent(self, meme_id: int) -> None:
+        self._write({"id": meme_id, "state": INTENT, "ts": time.time()})
+
+    def record_done(self, meme_id: int, message_id: Optional[int]) -> None:
+        self._write({"id": meme_id, "state": DONE, "ts": time.time(), "message_id": message_id})
+
+    def record_failed(self, meme_id: int) -> None:
+        self._write({"id": meme_id, "state": "failed", "ts": time.time()})
+
+    def forget(self, meme_id: int) -> None:
+        """Снимает отметку о меме (например, перед ручным повтором из dead-letter)."""
+        if meme_id in self._entries:
+            self.record_failed(meme_id)
+
+    def _oldest_ts(self) -> Optional[float]:
+        return next(iter(self._entries.values()), {}).get("ts")
+
+    @property
+    def needs_compaction(self) -> bool:
+        if self._records - len(self._entries) >= LEDGER_COMPACT_RECORDS:
+            return True
+        oldest = self._oldest_ts()
+        return oldest is not None and oldest < time.time() - self.max_age.total_seconds()
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Переписывает лог: по строке на живой мем, без записей старше max_age.
+
+        Возвращает число выброшенных мемов.
+        """
+        cutoff = (now if now is not None else time.time()) - self.max_age.total_seconds()
+        with self._log.lock:
+            stale = [meme_id for meme_id, r in self._entries.items() if r["ts"] < cutoff]
+            for meme_id in stale:
+                del self._entries[meme_id]
+            self._log.rewrite(list(self._entries.values()))
+            self._records = len(self._entries)
+        return len(stale)
+
+
+class StoragePublishLedger:
+    """Тот же журнал в таблице storage: его видят все процессы на общей базе."""
+
+    def __init__(self, storage, max_age: timedelta = LEDGER_MAX_AGE):
+        self.storage = storage
+        self.max_age = max_age
+        self._last_compaction = time.monotonic()
+
+    def get(self, meme_id: int) -> Optional[dict]:
+        return self.storage.get_ledger_entry(meme_id)
+
+    def record_intent(self, meme_id: int) -> None:
+        self.storage.put_ledger_entry(meme_id, INTENT, time.time())
+
+    def record_done(self, meme_id: int, message_id: Optional[int]) -> None:
+        self.storage.put_ledger_entry(meme_id, DONE, time.time(), message_id)
+
+    def record_failed(self, meme_id: int) -> None:
+        self.storage.delete_ledger_entry(meme_id)
+
+    forget = record_failed
+
+    @property
+    def needs_compaction(self) -> bool:
+        return time.monotonic() - self._last_compaction >= STORAGE_COMPACT_INTERVAL_SEC
+
+    def compact(self, now: Optional[float] = None) -> int:
+        self._last_compaction = time.monotonic()
+        cutoff = (now if now is not None else time.time()) - self.max_age.total_seconds()
+        return self.storage.compact_ledger(cutoff)
+
@@ -0,0 +1,239 @@
+"""Исходящие запросы к Telegram в пределах лимитов Bot API.
+
+RateLimiter — request-middleware сессии aiogram: каждый send/edit/answer
+сначала получает токен из глобального ведра (~30 запросов/с на бота) и из
+ведра своего чата (1 сообщение/с в личке, 20 в минуту в группе/канале).
+Ждущие запросы обслуживаются по приоритету: интерактивные (ответы на
+callback, публикация в канал) — раньше обычных, обычные — раньше массовых
+(рассылка, перерисовка статусов). Массовые при этом не тормозятся ничем,
+кроме самих лимитов.
+
+На 429 Telegram сообщает retry_after: чат (или весь бот, если чата нет)
+замораживается на это время, и запрос повторяется до MAX_RETRIES раз.
+Приоритет задаётся контекстом: `with ratelimit.bulk(): ...` — и наследуется
+тасками, созданными внутри (gather, fan_out).
+"""
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import logging
+import time
+from contextlib import suppress
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+# Лимиты Bot API: ~30 сообщений/с на бота, 1/с в один чат, 20/мин в группу.
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+GROUP_RATE = 20 / 60
+# Сколько раз повторяем запрос после 429, прежде чем отдать ошибку вызывающему.
+MAX_RETRIES = 3
+# Сверх этого числа вёдер чатов выкидываем простаивающие (полные) при создании нового.
+MAX_CHAT_BUCKETS = 10_000
+
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+# Лимитируются только запросы, которые Telegram считает «сообщениями»;
+# getUpdates, getMe, getFile и прочее идут мимо очереди.
+_LIMITED_PREFIXES = ("Send", "Copy", "Forward", "Edit", "Answer")
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("kartoshka_request_priority", default=NORMAL)
+
+ChatId = Union[int, str]
+
+
+@contextlib.contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Запросы к Telegram внутри блока идут с приоритетом level."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def interactive() -> contextlib.AbstractContextManager:
+    return priority(INTERACTIVE)
+
+
+def bulk() -> contextlib.AbstractContextManager:
+    return priority(BULK)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    """Ведро токенов: rate в секунду, не больше capacity про запас."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Через сколько секунд можно будет взять токен (0 — прямо сейчас)."""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        """Telegram попросил подождать: до until токенов нет, после — с нуля."""
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, until)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class RateLimiter(BaseRequestMiddleware):
+    """Token-bucket планировщик исходящих запросов бота (см. модуль)."""
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+        group_rate: float = GROUP_RATE,
+        max_retries: int = MAX_RETRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.per_chat_rate = per_chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._chats: Dict[ChatId, TokenBucket] = {}
+        # (приоритет, порядковый номер, chat_id, future) — номер держит FIFO внутри приоритета.
+        self._waiters: List[Tuple[int, int, Optional[ChatId], asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not type(method).__name__.startswith(_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        level = INTERACTIVE if isinstance(method, AnswerCallbackQuery) else _priority.get()
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, level)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.penalize(chat_id, e.retry_after)
+                if attempt > self.max_retries:
+                    raise
+                logging.warning(
+                    f"Telegram просит подождать {e.retry_after} с "
+                    f"({type(method).__name__}, чат {chat_id}), попытка {attempt}"
+                )
+
+    async def acquire(self, chat_id: Optional[ChatId] = None, level: int = NORMAL) -> None:
+        """Ждёт, пока лимиты позволят отправить один запрос в chat_id."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((level, next(self._seq), chat_id, future))
+        self._kick()
+        await future
+
+    def penalize(self, chat_id: Optional[ChatId], retry_after: float) -> None:
+        until = self._clock() + retry_after
+        if chat_id is None:
+            self._global.block(until)
+        else:
+            self._chat_bucket(chat_id).block(until)
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for w in self._waiters if not w[3].done())
+
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            now = self._clock()
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            # Отрицательные id и @username — группы и каналы, у них лимит строже.
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if group else self.per_chat_rate, 1, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _kick(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump(), name="ratelimit-pump")
+        else:
+            self._wakeup.set()
+
+    def _grant(self) -> float:
+        """Пропускает всех, кого пускают вёдра; возвращает, сколько ждать следующего."""
+        now = self._clock()
+        waiters = sorted(w for w in self._waiters if not w[3].done())
+        remaining = []
+        wait = float("inf")
+        for waiter in waiters:
+            _, _, chat_id, future = waiter
+            bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+            delay = max(self._global.wait_time(now), bucket.wait_time(now) if bucket else 0.0)
+            if delay > 0:
+                remaining.append(waiter)
+                wait = min(wait, delay)
+                continue
+            self._global.take(now)
+            if bucket is not None:
+                bucket.take(now)
+            future.set_result(None)
+        self._waiters = remaining
+        return wait
+
+    async def _pump(self) -> None:
+        while self._waiters:
+            self._wakeup.clear()
+            wait = self._grant()
+            if self._waiters:
+                # Новый запрос будит раньше: вдруг он в свободный чат или важнее.
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+
+
+def install(bot: Bot, **kwargs) -> RateLimiter:
+    """Ставит RateLimiter на сессию бота; все его запросы пойдут через лимиты."""
+    limiter = RateLimiter(**kwargs)
+    bot.session.middleware(limiter)
+    return limiter
@@ -0,0 +1,93 @@
+"""Политики повтора публикации по классу ошибки.
+
+Ошибка publish_meme классифицируется (RetryPolicies.classify), и класс
+решает, сколько раз и через сколько повторять:
+
+    rate_limit  — 429 (TelegramRetryAfter): ждём ровно retry_after + немного;
+    network     — сеть, 5xx, таймауты: быстрые повторы, растущие до получаса;
+    bad_request — битый file_id, слишком длинная подпись и т.п.: повтор не
+                  поможет, запись сразу уходит в dead-letter;
+    forbidden   — бота убрали из канала, неверный токен, канал не найден:
+                  тоже сразу в dead-letter (после исправления — /dlq_replay);
+    default     — всё остальное, включая falsy-результат on_publish.
+
+Бэкофф экспоненциальный (base × factor^(попытка-1), не больше max_delay) с
+«equal jitter»: половина задержки фиксирована, половина случайна — записи,
+упавшие вместе во время сбоя Telegram, не возвращаются одной волной.
+"""
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional, Sequence, Tuple, Type
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramEntityTooLarge,
+    TelegramForbiddenError,
+    TelegramMigrateToChat,
+    TelegramNetworkError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+    TelegramServerError,
+    TelegramUnauthorizedError,
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    name: str
+    # Сколько неудачных попыток переживает запись; 0 — сразу в dead-letter.
+    max_attempts: int
+    base_delay: timedelta = timedelta(minutes=5)
+    max_delay: timedelta = timedelta(hours=1)
+    factor: float = 2.0
+
+    def delay(
+        self,
+        attempt: int,
+        retry_after: Optional[float] = None,
+        rand: Callable[[], float] = random.random,
+    ) -> timedelta:
+        """Задержка перед попыткой номер attempt + 1 (attempt — сколько уже неудач)."""
+        cap = self.max_delay.total_seconds()
+        full = min(cap, self.base_delay.total_seconds() * self.factor ** (attempt - 1))
+        jittered = full / 2 + rand() * full / 2
+        if retry_after is not None:
+            # Раньше, чем велел Telegram, повторять бессмысленно.
+            return timedelta(seconds=retry_after + jittered)
+        return timedelta(seconds=jittered)
+
+
+RATE_LIMIT = RetryPolicy("rate_limit", max_attempts=8, base_delay=timedelta(seconds=1), max_delay=timedelta(seconds=30))
+NETWORK = RetryPolicy("network", max_attempts=8, base_delay=timedelta(seconds=30), max_delay=timedelta(minutes=30))
+BAD_REQUEST = RetryPolicy("bad_request", max_attempts=0)
+FORBIDDEN = RetryPolicy("forbidden", max_attempts=0)
+DEFAULT = RetryPolicy("default", max_attempts=3)
+
+DEFAULT_RULES: Sequence[Tuple[Tuple[Type[BaseException], ...], RetryPolicy]] = (
+    ((TelegramRetryAfter,), RATE_LIMIT),
+    # EntityTooLarge — подкласс NetworkError, но повтор ему не поможет: проверяем раньше.
+    ((TelegramEntityTooLarge, TelegramBadRequest), BAD_REQUEST),
+    ((TelegramForbiddenError, TelegramUnauthorizedError, TelegramNotFound, TelegramMigrateToChat), FORBIDDEN),
+    ((TelegramNetworkError, TelegramServerError, asyncio.TimeoutError, ConnectionError), NETWORK),
+)
+
+
+class RetryPolicies:
+    """Классификатор ошибок: первое правило, чьи типы подошли, задаёт политику."""
+
+    def __init__(
+        self,
+        rules: Sequence[Tuple[Tuple[Type[BaseException], ...], RetryPolicy]] = DEFAULT_RULES,
+        default: RetryPolicy = DEFAULT,
+    ):
+        self.rules = list(rules)
+        self.default = default
+
+    def classify(self, error: Optional[BaseException]) -> RetryPolicy:
+        if error is not None:
+            for types, policy in self.rules:
+                if isinstance(error, types):
+                    return policy
+        return self.default
@@ -2,47 +2,175 @@ import asyncio
 import json
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Awaitable, Callable, Dict, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 
 from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from kartoshka.constants import (
+    DEAD_LETTER_FILE,
     FAILED_PUBLICATIONS_FILE,
     MODERATION_FILE,
+    MODERATION_LOG_FILE,
     PUBLICATION_FILE,
+    PUBLISH_LEDGER_FILE,
+    VOTE_HISTORY_FILE,
 )
+from kartoshka import notifications
+from kartoshka.catchup import EXPIRED_ERROR, CatchUpPlan, CatchUpPolicy, plan_catch_up
+from kartoshka.dead_letter import DeadLetterFilter, DeadLetterQueue
 from kartoshka.models import Meme
-from kartoshka.storage import atomic_write_json
+from kartoshka.pending_memes import PendingMemes
+from kartoshka.publication_queue import BEST_EFFORT, PublicationQueue
+from kartoshka.publish_ledger import DONE, PublishLedger, StoragePublishLedger
+from kartoshka.retry_policy import BAD_REQUEST, RetryPolicies, RetryPolicy
+from kartoshka.storage import QueueStorage, atomic_write_json
+from kartoshka.vote_history import EventFilter, VoteEvent, VoteHistory, event_from_record
+from kartoshka.wal import AppendLog
 
 # on_publish сообщает об успехе булевым результатом: falsy (или исключение)
 # означает неудачу публикации, после которой scheduler ретраит мем.
 PublishCallback = Callable[[Meme], Awaitable[bool]]
+# on_publish_album публикует несколько мемов одним альбомом (sendMediaGroup)
+# и отвечает так же: успех всего альбома или неудача.
+PublishAlbumCallback = Callable[[List[Meme]], Awaitable[bool]]
 
-# Сколько раз пытаемся опубликовать мем, прежде чем отправить его в dead-letter.
-MAX_PUBLISH_ATTEMPTS = 3
+# on_dirty(kind) — хук group commit'а (AppState.mark_dirty): "moderation" или
+# "publication". Без него Scheduler пишет на диск сразу, как раньше.
+DirtyCallback = Callable[[str], None]
 
+# Сколько записей копится в логе модерации, прежде чем фоновая компакция
+# свернёт их в снапшот moderation_queue.json.
+WAL_COMPACT_RECORDS = 500
+
+# Сколько мем ждёт решения модераторов, прежде чем снимается с модерации.
+PENDING_TTL = timedelta(days=3)
+EXPIRED_RESOLUTION = "⌛ Истёк срок"
+
+# Потолок сна цикла без событий: страховка от скачков системных часов
+# (сон меряется монотонными часами, дедлайны — настенными).
+MAX_IDLE_SLEEP_SEC = 3600
+
+# В общем режиме (несколько процессов) мемы и записи очереди от других
+# процессов лидер видит, только перечитав базу: спим не дольше этого.
+SHARED_POLL_SEC = 5
+
+
+def apply_moderation_record(pending: Dict[int, Meme], record: dict) -> None:
+    """Применяет одну запись лога модерации к словарю мемов на модерации."""
+    op = record.get("op")
+    if op == "add":
+        meme = Meme.from_dict(record["meme"])
+        pending[meme.meme_id] = meme
+    elif op == "vote":
+        meme = pending.get(record["id"])
+        if meme is not None:
+            meme.add_vote(record["by"], record["v"])
+    elif op in ("resolve", "schedule"):
+        pending.pop(record["id"], None)
+    else:
+        raise ValueError(f"неизвестная операция {op!r}")
 
 class Scheduler:
     MODERATION_FILE = MODERATION_FILE
+    MODERATION_LOG_FILE = MODERATION_LOG_FILE
     PUBLICATION_FILE = PUBLICATION_FILE
     FAILED_PUBLICATIONS_FILE = FAILED_PUBLICATIONS_FILE
+    DEAD_LETTER_FILE = DEAD_LETTER_FILE
+    PUBLISH_LEDGER_FILE = PUBLISH_LEDGER_FILE
+    VOTE_HISTORY_FILE = VOTE_HISTORY_FILE
 
     def __init__(
         self,
         post_frequency_minutes: int,
         bot: Optional[Bot] = None,
         on_publish: Optional[PublishCallback] = None,
+        wal: bool = True,
+        storage: Optional[QueueStorage] = None,
+        shared: bool = False,
+        retry_policies: Optional[RetryPolicies] = None,
+        ordering: str = BEST_EFFORT,
+        catch_up: CatchUpPolicy = CatchUpPolicy(),
+        on_publish_album: Optional[PublishAlbumCallback] = None,
     ):
         self.post_frequency_minutes = post_frequency_minutes
+        # Порядок публикации (publication_queue): best_effort — неудачная запись
+        # ждёт свой таймер повтора, не задерживая остальные; fifo — строго по слотам.
+        self.ordering = ordering
         self.bot = bot
         self.on_publish = on_publish
+        self.on_publish_album = on_publish_album
+        # Как раскладывать записи, просроченные за время простоя (kartoshka.catchup).
+        self.catch_up_policy = catch_up
+        # WAL-режим: мутации модерационной очереди дописываются в лог одной
+        # строкой, снапшот перезаписывается только при компакции.
+        # wal=False — старое поведение: полная перезапись на каждую мутацию.
+        self.wal = wal
+        # storage (например, SQLiteStorage) — очереди живут в нём построчно,
+        # JSON-файлы и WAL модерации не используются.
+        self.storage = storage
+        # shared: базу делят несколько процессов — очереди в памяти лишь кэш,
+        # мутации пишутся строками, решения (claim) принимает база.
+        self.shared = shared and storage is not None
+        # queue_version базы, с которой совпадает кэш (None — перечитать).
+        self._shared_version: Optional[int] = None
+        # LeaderLease лидера (kartoshka.leader): публикуем, только пока аренда наша.
+        self.lease = None
+        # Классификатор ошибок публикации: сколько и через сколько повторять.
+        self.retry_policies = retry_policies or RetryPolicies()
+        self.on_dirty: Optional[DirtyCallback] = None
+        # Записи лога модерации, ждущие group commit'а (только при on_dirty).
+        self._log_buffer: List[dict] = []
+        self._moderation_log = AppendLog(self.MODERATION_LOG_FILE)
+        self._wal_records = 0
+        # Журнал публикаций (intent/done по meme_id): защищает от дубля поста,
+        # если процесс умер между отправкой в канал и снятием записи с очереди.
+        self.ledger = StoragePublishLedger(storage) if storage is not None else PublishLedger(self.PUBLISH_LEDGER_FILE)
+        # Dead-letter без storage — JSONL-лог (старый JSON-список переносится в него).
+        self.dead_letters = None if storage is not None else DeadLetterQueue(
+            self.DEAD_LETTER_FILE, legacy_path=self.FAILED_PUBLICATIONS_FILE,
+        )
+        # История голосов для аудита (kartoshka.vote_history); в storage — его таблица.
+        self.vote_history = None if storage is not None else VoteHistory(self.VOTE_HISTORY_FILE)
         self.last_published_time = datetime.now(timezone.utc)
-        self.pending_memes: Dict[int, Meme] = {}
-        self.scheduled_posts = []
+        # Было ли время последней публикации сохранено (или это просто момент старта):
+        # от него догон отсчитывает первый слот.
+        self._last_published_known = False
+        self._pending = PendingMemes(ttl=PENDING_TTL)
+        self._queue = self._new_queue()
+        # Будит run() раньше дедлайна, когда меняется голова очереди.
+        self._wakeup = asyncio.Event()
         self.load_moderation()
         self.load_publication()
 
+    @property
+    def pending_memes(self) -> PendingMemes:
+        return self._pending
+
+    @pending_memes.setter
+    def pending_memes(self, memes: Dict[int, Meme]) -> None:
+        # Присваивание обычного dict (загрузка, тесты) строит индекс истечения заново.
+        self._pending = memes if isinstance(memes, PendingMemes) else PendingMemes(memes, ttl=PENDING_TTL)
+        self.wake()
+
+    @property
+    def scheduled_posts(self) -> PublicationQueue:
+        return self._queue
+
+    @scheduled_posts.setter
+    def scheduled_posts(self, entries) -> None:
+        # Присваивание списка (загрузка, тесты) строит кучу заново;
+        # записи с битым scheduled_time пропускаются с логом.
+        self._queue = entries if isinstance(entries, PublicationQueue) else self._new_queue(entries)
+        self.wake()
+
+    def _new_queue(self, entries=()) -> PublicationQueue:
+        return PublicationQueue(entries, ordering=self.ordering)
+
+    def wake(self) -> None:
+        """Будит цикл run(): очередь или дедлайны изменились (только из event loop'а)."""
+        self._wakeup.set()
+
     def get_max_meme_id(self) -> int:
         max_id = 0
         for meme in self.pending_memes.values():
@@ -61,95 +189,415 @@ class Scheduler:
         return dt
 
     def save_moderation(self):
+        """Полный снапшот очереди; в WAL-режиме заодно компактирует лог."""
         # Сериализация тоже внутри try: save может выполняться в worker-треде
         # (asyncio.to_thread), исключение не должно ронять вызывающий хендлер.
         try:
-            data = {"pending_memes": [m.to_dict() for m in self.pending_memes.values()]}
-            atomic_write_json(self.MODERATION_FILE, data)
+            if self.storage is not None:
+                self.storage.replace_pending([m.to_dict() for m in self.pending_memes.values()])
+                return
+            data, offset = self._moderation_snapshot()
+            self._write_moderation_snapshot(data, offset)
         except Exception as e:
             logging.error(f"Ошибка при сохранении модерационной очереди: {e}")
 
+    def _moderation_snapshot(self):
+        """Снимает (payload, длина лога) согласованно: под локом лога."""
+        with self._moderation_log.lock:
+            offset = self._moderation_log.size() if self.wal else 0
+            data = {"pending_memes": [m.to_dict() for m in self.pending_memes.values()]}
+        return data, offset
+
+    def _write_moderation_snapshot(self, data: dict, offset: int) -> None:
+        atomic_write_json(self.MODERATION_FILE, data)
+        if self.wal:
+            # Снапшот уже на диске: учтённый префикс лога больше не нужен.
+            # Записи, дописанные после снятия offset, остаются в хвосте.
+            with self._moderation_log.lock:
+                self._moderation_log.drop_prefix(offset)
+                self._wal_records = 0
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.storage is None and self.wal and self._wal_records >= WAL_COMPACT_RECORDS
+
+    async def compact_moderation(self) -> None:
+        """Фоновая компакция лога модерации в снапшот.
+
+        Payload собирается в event loop'е (там же, где мутируется pending_memes),
+        в worker-тред уходит только запись на диск.
+        """
+        try:
+            data, offset = self._moderation_snapshot()
+            await asyncio.to_thread(self._write_moderation_snapshot, data, offset)
+        except Exception as e:
+            logging.error(f"Ошибка при компакции модерационной очереди: {e}")
+
+    def _log_moderation(self, record: dict) -> None:
+        self._log_moderation_batch([record])
+
+    def _log_moderation_batch(self, records: List[dict]) -> None:
+        # В общем режиме тоже через group commit (запись — в worker-треде):
+        # хендлер, которому голос нужен в базе сразу, ждёт state.flush().
+        if self.on_dirty is not None:
+            self._log_buffer.extend(records)
+            self.on_dirty("moderation")
+            return
+        try:
+            self._write_moderation_records(records)
+        except Exception:
+            pass  # ошибка уже в логе; хендлер из-за неё не падает
+
+    def take_moderation_records(self) -> List[dict]:
+        """Забирает буфер записей для group commit'а (вызывать в event loop'е)."""
+        records, self._log_buffer = self._log_buffer, []
+        return records
+
+    def restore_moderation_records(self, records: List[dict]) -> None:
+        """Возвращает в начало буфера записи неудавшегося commit'а: их повторит следующий."""
+        self._log_buffer[:0] = records
+
+    def _write_moderation_records(self, records: List[dict]) -> None:
+        """Пишет записи одной пачкой: строки storage, один append_many в WAL
+        или (wal=False) один полный снапшот. Ошибка логируется и пробрасывается."""
+        if not records:
+            return
+        if self.storage is not None:
+            try:
+                for record in records:
+                    self._apply_to_storage(record)
+            except Exception as e:
+                logging.error(f"Ошибка при записи модерационной очереди в хранилище: {e}")
+                raise
+            return
+        try:
+            if self.wal:
+                self._moderation_log.append_many(records)
+                self._wal_records += len(records)
+            else:
+                self._write_moderation_snapshot(*self._moderation_snapshot())
+        except Exception as e:
+            logging.error(f"Ошибка при записи в лог модерационной очереди: {e}")
+            raise
+        # История — только после записи очереди: неудавшуюся пачку commit
+        # повторит, и события не должны попасть в историю дважды.
+        self._write_vote_history(records)
+
+    def _write_vote_history(self, records: List[dict]) -> None:
+        events = [event_from_record(r) for r in records if r.get("op") == "vote"]
+        events = [e for e in events if e is not None]
+        if not events:
+            return
+        try:
+            self.vote_history.append_many(events)
+        except Exception as e:
+            logging.error(f"Ошибка при записи истории голосов: {e}")
+
+    def _apply_to_storage(self, record: dict) -> None:
+        """Та же мутация, что и запись WAL, но строкой в таблице storage."""
+        op = record["op"]
+        if op == "add":
+            self.storage.put_pending(record["meme"])
+        elif op == "vote":
+            self.storage.put_vote(record["id"], record["by"], record["v"])
+            event = event_from_record(record)
+            if event is not None:
+                self.storage.append_vote_history([event])
+        else:
+            self.storage.delete_pending(record["id"])
+
     def add_pending(self, meme: Meme) -> None:
         self.pending_memes[meme.meme_id] = meme
-        self.save_moderation()
+        self._log_moderation({"op": "add", "meme": meme.to_dict()})
+        self.wake()  # у цикла мог не быть дедлайна истечения вовсе
+
+    def record_vote(self, meme_id: int, crypto_id: int, vote: str) -> None:
+        """Фиксирует уже применённый к мему голос (meme.add_vote делает caller).
+
+        Время голоса (at) — для истории голосов; replay лога модерации его не читает.
+        """
+        self._log_moderation({
+            "op": "vote", "id": meme_id, "by": str(crypto_id), "v": vote,
+            "at": int(datetime.now(timezone.utc).timestamp()),
+        })
+
+    def vote_events(self, flt: EventFilter = EventFilter()) -> List[VoteEvent]:
+        """История голосов (старые первыми), подходящая под фильтр."""
+        if self.storage is not None:
+            return self.storage.load_vote_history(flt)
+        return list(self.vote_history.events(flt))
 
     def resolve(self, meme_id: int) -> None:
         self.pending_memes.pop(meme_id, None)
-        self.save_moderation()
+        self._log_moderation({"op": "resolve", "id": meme_id})
+
+    def refresh_pending(self, meme_id: int) -> Optional[Meme]:
+        """Общий режим: свежая версия мема (с голосами других процессов) из базы."""
+        local = self.pending_memes.get(meme_id)
+        if not self.shared:
+            return local
+        data = self.storage.get_pending(meme_id)
+        if data is None:
+            self.pending_memes.pop(meme_id, None)
+            return None
+        meme = Meme.from_dict(data)
+        if local is not None:
+            _adopt_transient(meme, local)
+        self.pending_memes[meme_id] = meme
+        return meme
+
+    async def claim(self, meme_id: int) -> bool:
+        """Право финализировать мем. В общем режиме его получает ровно один процесс."""
+        if not self.shared:
+            return True
+        # Запись в общую базу может ждать чужую транзакцию (busy_timeout) — не в event loop'е.
+        return await asyncio.to_thread(self.storage.claim_pending, meme_id)
+
+    async def unclaim(self, meme: Meme) -> None:
+        """Финализация сорвалась — возвращаем мем на модерацию (общий режим)."""
+        if self.shared:
+            await asyncio.to_thread(self.storage.put_pending, meme.to_dict())
+
+    def _reload_shared(self) -> None:
+        """Перечитывает очереди из базы, если их изменили (queue_version сменилась)."""
+        # Версию — до данных: запись, вклинившаяся между ними, даст ещё одно перечитывание.
+        version = self.storage.queue_version()
+        if version == self._shared_version:
+            return
+        data = self.storage.load_publication()
+        if data is not None:
+            if "last_published_time" in data:
+                self.last_published_time = datetime.fromisoformat(data["last_published_time"])
+                self._last_published_known = True
+            self._queue = self._new_queue(data.get("queue", []))
+        else:
+            self._queue = self._new_queue()
+        pending = {}
+        for item in self.storage.load_pending():
+            meme = Meme.from_dict(item)
+            local = self._pending.get(meme.meme_id)
+            if local is not None:
+                _adopt_transient(meme, local)
+            pending[meme.meme_id] = meme
+        self._pending = PendingMemes(pending, ttl=PENDING_TTL)
+        self._shared_version = version
 
     def load_moderation(self):
         try:
-            with open(self.MODERATION_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            pending_list = data.get("pending_memes", [])
+            if self.storage is not None:
+                pending_list = self.storage.load_pending()
+            else:
+                with open(self.MODERATION_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                pending_list = data.get("pending_memes", [])
             self.pending_memes = {m["meme_id"]: Meme.from_dict(m) for m in pending_list}
         except FileNotFoundError:
             self.pending_memes = {}
         except Exception as e:
             logging.error(f"Ошибка при загрузке модерационной очереди: {e}")
             self.pending_memes = {}
+        if self.wal and self.storage is None:
+            self._replay_moderation_log()
+
+    def _replay_moderation_log(self) -> None:
+        """Докатывает хвост лога поверх снапшота.
+
+        Записи идемпотентны (add перезаписывает мем целиком, vote ставит голос,
+        resolve/schedule удаляют), поэтому повторное применение уже попавших
+        в снапшот записей (крэш между снапшотом и обрезкой лога) безопасно.
+        """
+        for record in self._moderation_log.replay():
+            self._wal_records += 1
+            try:
+                self._apply_moderation_record(record)
+            except Exception as e:
+                logging.error(f"Пропущена запись лога модерации {record!r}: {e}")
+
+    def _apply_moderation_record(self, record: dict) -> None:
+        apply_moderation_record(self.pending_memes, record)
 
-    def save_publication(self):
+    def _publication_changed(self, op: str = "save", entry: Optional[dict] = None) -> None:
+        """Очередь публикации изменилась: op — append, update, remove или published.
+
+        В общем режиме пишется только затронутая строка — целиком очередь
+        перезаписывать нельзя, в ней могут быть записи других процессов.
+        """
+        if self.shared and entry is not None:
+            try:
+                self._write_shared_publication(op, entry)
+            except Exception as e:
+                logging.error(f"Ошибка при записи очереди публикации в хранилище: {e}")
+                # Память разошлась с базой: следующий тик перечитает очереди.
+                self._shared_version = None
+            return
+        if self.on_dirty is not None:
+            self.on_dirty("publication")
+        else:
+            self.save_publication()
+
+    def _write_shared_publication(self, op: str, entry: dict) -> None:
+        meme_id = entry.get("meme", {}).get("meme_id")
+        with self.storage.transaction():
+            if op == "append":
+                self.storage.append_publication(entry)
+            elif op == "update":
+                self.storage.update_publication(entry)
+            else:  # remove, published
+                self.storage.delete_publication(meme_id)
+            if op == "published":
+                self.storage.set_last_published_time(self.last_published_time)
+
+    def publication_snapshot(self) -> dict:
+        """Payload очереди публикации; копия — его можно писать из worker-треда."""
+        return {
+            "last_published_time": self.last_published_time.isoformat(),
+            "queue": [dict(entry) for entry in self.scheduled_posts],
+        }
+
+    def save_publication(self, data: Optional[dict] = None):
         try:
-            data = {
-                "last_published_time": self.last_published_time.isoformat(),
-                "queue": self.scheduled_posts,
-            }
-            atomic_write_json(self.PUBLICATION_FILE, data)
+            if data is None:
+                data = {
+                    "last_published_time": self.last_published_time.isoformat(),
+                    "queue": list(self._queue),
+                }
+            self._write_publication(data)
         except Exception as e:
             logging.error(f"Ошибка при сохранении очереди публикации: {e}")
 
+    def _write_publication(self, data: dict) -> None:
+        """Запись payload'а очереди публикации; ошибка пробрасывается (group commit её повторит)."""
+        if self.storage is not None:
+            self.storage.save_publication(data)
+        else:
+            atomic_write_json(self.PUBLICATION_FILE, data)
+
     def load_publication(self):
         try:
-            with open(self.PUBLICATION_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            if self.storage is not None:
+                data = self.storage.load_publication()
+                if data is None:
+                    raise FileNotFoundError
+            else:
+                with open(self.PUBLICATION_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
             self.last_published_time = datetime.fromisoformat(
                 data.get("last_published_time", datetime.now(timezone.utc).isoformat())
             )
-            # Отбрасываем записи с нечитаемым scheduled_time: одна битая запись
-            # не должна валить sort/публикацию всей очереди.
-            valid_posts = []
-            for entry in data.get("queue", []):
-                try:
-                    datetime.fromisoformat(entry["scheduled_time"])
-                    valid_posts.append(entry)
-                except (KeyError, TypeError, ValueError):
-                    logging.error(f"Пропущена запись очереди с битым scheduled_time: {entry!r}")
-            self.scheduled_posts = valid_posts
-            for i, entry in enumerate(sorted(self.scheduled_posts, key=lambda x: datetime.fromisoformat(x["scheduled_time"]))):
-                entry_time = datetime.fromisoformat(entry["scheduled_time"])
-                if entry_time < self.last_published_time:
-                    new_time = self.last_published_time + timedelta(minutes=self.post_frequency_minutes * (i + 1))
-                    entry["scheduled_time"] = new_time.isoformat()
-            self.scheduled_posts.sort(key=lambda x: datetime.fromisoformat(x["scheduled_time"]))
+            self._last_published_known = "last_published_time" in data
+            # Записи с нечитаемым scheduled_time отбрасываются при построении
+            # кучи: одна битая запись не должна валить публикацию всей очереди.
+            self._queue = self._new_queue(data.get("queue", []))
         except FileNotFoundError:
             self.last_published_time = datetime.now(timezone.utc)
-            self.scheduled_posts = []
+            self._queue = self._new_queue()
         except Exception as e:
             logging.error(f"Ошибка при загрузке очереди публикации: {e}")
-            self.scheduled_posts = []
+            self._queue = self._new_queue()
+
+    def catch_up(self, now: datetime) -> CatchUpPlan:
+        """Раскладывает просроченные за время простоя записи по политике catch_up_policy.
+
+        Меняет только очередь в памяти (и dead-letter для выброшенных записей);
+        сохранить очередь — забота вызывающего.
+        """
+        plan = plan_catch_up(
+            list(self._queue),
+            now,
+            self.last_published_time if self._last_published_known else None,
+            timedelta(minutes=self.post_frequency_minutes),
+            self.catch_up_policy,
+            allowed=self.get_next_allowed_time,
+            albums=self.on_publish_album is not None,
+        )
+        for entry in plan.changed:
+            self._queue.reschedule(entry)
+        for entry in plan.dropped:
+            entry["last_error"] = EXPIRED_ERROR
+            self._queue.remove(entry)
+            self._append_failed_publication(entry)
+        if plan.changed or plan.dropped:
+            self.wake()
+        self._report_catch_up(plan, now)
+        return plan
+
+    def _report_catch_up(self, plan: CatchUpPlan, now: datetime) -> None:
+        if plan.dropped:
+            logging.warning(
+                f"Догон очереди: {len(plan.dropped)} мемов просрочены сильнее "
+                f"{self.catch_up_policy.drop_older_than} и ушли в dead-letter: {self._dead_letter_location()}"
+            )
+        if plan.drain_at is None:
+            return
+        left = max(0, int((plan.drain_at - now).total_seconds()))
+        albums = f", из них альбомов: {plan.albums}" if plan.albums else ""
+        logging.info(
+            f"Догон очереди ({self.catch_up_policy.mode}): {plan.overdue} просроченных мемов — "
+            f"{plan.posts} постов{albums}. Последний выйдет {plan.drain_at.strftime('%Y-%m-%d %H:%M')} UTC "
+            f"(через {left // 3600} ч. {left % 3600 // 60} мин.)"
+        )
+
+    def catch_up_on_start(self) -> None:
+        """Догон после простоя в одиночном режиме; main() вызывает его один раз при старте.
+
+        Не при загрузке: просто создать Scheduler (импорт в SQLite, CLI
+        dead-letter) не должно менять очередь и dead-letter. В общем режиме
+        догоняет лидер, в начале run().
+        """
+        try:
+            plan = self.catch_up(datetime.now(timezone.utc))
+            if plan.changed or plan.dropped:
+                self._publication_changed()
+        except Exception as e:
+            logging.error(f"Ошибка при догоне очереди публикации: {e}")
+
+    def _catch_up_shared(self) -> None:
+        """Догон в общем режиме: лидер переписывает затронутые строки одной транзакцией."""
+        with self.storage.transaction():
+            self._reload_shared()
+            plan = self.catch_up(datetime.now(timezone.utc))
+            for entry in plan.changed:
+                self.storage.update_publication(entry)
+            for entry in plan.dropped:
+                self.storage.delete_publication(entry.get("meme", {}).get("meme_id"))
 
     async def schedule(self, meme: Meme):
-        now = datetime.now(timezone.utc)
-        if self.scheduled_posts:
-            last_scheduled = datetime.fromisoformat(self.scheduled_posts[-1]["scheduled_time"])
+        if self.shared:
+            # Хвост очереди мог дописать другой процесс; транзакция (BEGIN IMMEDIATE)
+            # не даст двум процессам занять один и тот же слот.
+            with self.storage.transaction():
+                self._reload_shared()
+                scheduled_time, now = self._append_to_queue(meme)
+        else:
+            scheduled_time, now = self._append_to_queue(meme)
+        await self._notify_scheduled(meme, scheduled_time, now)
+
+    def _next_slot(self, now: datetime) -> datetime:
+        """Время для записи, добавляемой в хвост очереди."""
+        last_entry = self._queue.last()
+        if last_entry is not None:
+            last_scheduled = datetime.fromisoformat(last_entry["scheduled_time"])
             base_time = last_scheduled + timedelta(minutes=self.post_frequency_minutes)
-            scheduled_time = self.get_next_allowed_time(base_time)
         else:
             base_time = max(now, self.last_published_time + timedelta(minutes=self.post_frequency_minutes))
-            scheduled_time = self.get_next_allowed_time(base_time)
+        return self.get_next_allowed_time(base_time)
 
+    def _append_to_queue(self, meme: Meme):
+        now = datetime.now(timezone.utc)
+        scheduled_time = self._next_slot(now)
         entry = {
             "scheduled_time": scheduled_time.isoformat(),
             "meme": meme.to_publication_dict(),
         }
-        self.scheduled_posts.append(entry)
-        self.scheduled_posts.sort(key=lambda x: datetime.fromisoformat(x["scheduled_time"]))
+        self._queue.append(entry)
+        self.wake()
         if meme.meme_id in self.pending_memes:
             del self.pending_memes[meme.meme_id]
-        self.save_publication()
-        self.save_moderation()
+        self._publication_changed("append", entry)
+        self._log_moderation({"op": "schedule", "id": meme.meme_id})
+        return scheduled_time, now
 
+    async def _notify_scheduled(self, meme: Meme, scheduled_time: datetime, now: datetime) -> None:
         if meme.publish_choice == "user" and meme.user_id is not None and self.bot is not None:
             time_diff = (scheduled_time - now).total_seconds()
             if time_diff < 0:
@@ -165,14 +613,7 @@ class Scheduler:
                         callback_data="noop",
                     )]
                 ])
-
-                for chat_id, message_id in meme.user_messages:
-                    try:
-                        await self.bot.edit_message_reply_markup(
-                            chat_id=chat_id, message_id=message_id, reply_markup=keyboard
-                        )
-                    except Exception as e:
-                        logging.error(f"Ошибка при обновлении сообщения для пользователя {chat_id}: {e}")
+                await notifications.edit_reply_markups(self.bot, meme.user_messages, keyboard, "пользователя")
             else:
                 try:
                     await self.bot.send_message(
@@ -187,102 +628,343 @@ class Scheduler:
     async def _publish_due_entry(self, entry: dict, now: datetime) -> None:
         """Публикует созревшую запись, не выталкивая её до подтверждения успеха.
 
+        Сперва запись сверяется с журналом публикаций: мем, уже отмеченный
+        там как опубликованный, не отправляется повторно (см. kartoshka.publish_ledger).
+
         Успех (on_publish вернул truthy) → запись удаляется из очереди,
-        last_published_time обновляется. Неудача (falsy, исключение или битая
-        запись, которую не удаётся десериализовать) → попытка фиксируется в
-        entry["attempts"]: первые MAX_PUBLISH_ATTEMPTS неудач откладывают запись
-        с линейным бэкоффом (5 мин × номер попытки), дальше она уходит в dead-letter.
+        last_published_time обновляется. Неудача (falsy или исключение) →
+        повтор по политике класса ошибки (kartoshka.retry_policy) или dead-letter.
+        Битая запись, которую не удаётся десериализовать, уходит в dead-letter
+        сразу: повтор её не починит.
         """
+        if entry.get("album"):
+            await self._publish_album(entry, now)
+            return
+        meme_id = entry.get("meme", {}).get("meme_id")
+        if self._settle_from_ledger(entry, meme_id):
+            return
+        intent_recorded = False
+        failure: Optional[BaseException] = None
+        policy: Optional[RetryPolicy] = None
         try:
-            meme = Meme.from_dict(entry["meme"])
+            try:
+                meme = Meme.from_dict(entry["meme"])
+            except Exception:
+                policy = BAD_REQUEST
+                raise
             if self.on_publish is None:
                 success = True  # некому публиковать — просто снимаем запись с очереди
             else:
+                # Не удалось записать intent — не публикуем: без него крэш
+                # посреди отправки снова дал бы дубль.
+                self.ledger.record_intent(meme.meme_id)
+                intent_recorded = True
                 success = bool(await self.on_publish(meme))
         except Exception as e:
             # Сюда попадают и сбои on_publish, и битые записи (Meme.from_dict).
-            # Битую запись тоже считаем неудачной попыткой — иначе цикл вечно
-            # жевал бы её, не двигаясь дальше по очереди.
-            meme_id = entry.get("meme", {}).get("meme_id", "?")
-            logging.error(f"Ошибка в on_publish для мема {meme_id}: {e}")
+            logging.error(f"Ошибка в on_publish для мема {meme_id if meme_id is not None else '?'}: {e}")
             success = False
+            failure = e
+
+        if intent_recorded:
+            try:
+                if success:
+                    self.ledger.record_done(meme.meme_id, meme.published_message_id)
+                else:
+                    self.ledger.record_failed(meme.meme_id)
+            except Exception as e:
+                logging.error(f"Не удалось записать исход публикации мема {meme_id} в журнал: {e}")
 
         if success:
-            self.scheduled_posts.pop(0)
-            self.last_published_time = datetime.now(timezone.utc)
-            self.save_publication()
+            self._mark_published(entry, datetime.now(timezone.utc))
             return
 
-        self._handle_failed_publication(entry, now)
+        # falsy-результат on_publish — ошибки нет, только факт неудачи.
+        entry["last_error"] = type(failure).__name__ if failure is not None else "publish_failed"
+        self._handle_failed_publication(entry, now, failure, policy)
 
-    def _handle_failed_publication(self, entry: dict, now: datetime) -> None:
+    async def _publish_album(self, head: dict, now: datetime) -> None:
+        """Публикует альбом, собранный догоном (kartoshka.catchup), одним постом.
+
+        Каждый мем альбома отмечается в журнале публикаций по отдельности.
+        Если альбом опубликовать не удалось (или он развалился — часть мемов
+        уже снята с очереди), он распускается: записи дальше живут и
+        повторяются поодиночке.
+        """
+        album = head["album"]
+        members = [self._queue.find(meme_id) for meme_id in album]
+        members = [e for e in members if e is not None and e.get("album") == album]
+        if head not in members:
+            members.insert(0, head)
+        members = [e for e in members if not self._settle_from_ledger(e, e.get("meme", {}).get("meme_id"))]
+        try:
+            memes = [Meme.from_dict(e["meme"]) for e in members]
+        except Exception as e:
+            logging.error(f"Альбом {album}: битая запись ({e}), публикую мемы по одному")
+            memes = None
+        if memes is None or len(members) < 2 or self.on_publish_album is None:
+            for entry in members:
+                self._dissolve_album(entry)
+            if members:
+                await self._publish_due_entry(members[0], now)
+            return
+
+        meme_ids = [m.meme_id for m in memes]
+        failure: Optional[BaseException] = None
+        try:
+            for meme in memes:
+                self.ledger.record_intent(meme.meme_id)
+            success = bool(await self.on_publish_album(memes))
+        except Exception as e:
+            logging.error(f"Ошибка в on_publish_album для мемов {meme_ids}: {e}")
+            success = False
+            failure = e
+        try:
+            for meme in memes:
+                if success:
+                    self.ledger.record_done(meme.meme_id, meme.published_message_id)
+                else:
+                    self.ledger.record_failed(meme.meme_id)
+        except Exception as e:
+            logging.error(f"Не удалось записать исход публикации альбома {meme_ids} в журнал: {e}")
+
+        if success:
+            published_at = datetime.now(timezone.utc)
+            for entry in members:
+                self._mark_published(entry, published_at)
+            return
+        for entry in members:
+            entry.pop("album", None)
+            entry["last_error"] = type(failure).__name__ if failure is not None else "publish_failed"
+            self._handle_failed_publication(entry, now, failure)
+
+    def _dissolve_album(self, entry: dict) -> None:
+        if entry.pop("album", None) is not None:
+            self._publication_changed("update", entry)
+
+    def _settle_from_ledger(self, entry: dict, meme_id: Optional[int]) -> bool:
+        """Запись уже побывала в on_publish до рестарта? True — разобрана по журналу."""
+        record = self.ledger.get(meme_id) if meme_id is not None else None
+        if record is None:
+            return False
+        if record["state"] == DONE:
+            # Крэш между публикацией и снятием с очереди: мем уже в канале.
+            logging.warning(
+                f"Мем {meme_id} уже опубликован (сообщение {record.get('message_id')}), "
+                f"снимаю запись с очереди без повторной отправки"
+            )
+            self._mark_published(entry, datetime.fromtimestamp(record["ts"], timezone.utc))
+            return True
+        # intent без исхода: процесс умер посреди отправки. Был ли пост, неизвестно —
+        # вслепую не повторяем, отдаём на ручную проверку (/dlq_replay, если поста нет).
+        entry["last_error"] = "interrupted"
+        self._queue.remove(entry)
+        self._append_failed_publication(entry)
+        self._publication_changed("remove", entry)
+        logging.error(
+            f"Мем {meme_id}: публикация прервана на полпути, исход неизвестен. "
+            f"Запись ушла в dead-letter для ручной проверки: {self._dead_letter_location()}"
+        )
+        return True
+
+    def _mark_published(self, entry: dict, published_at: datetime) -> None:
+        self._queue.remove(entry)
+        self.last_published_time = published_at
+        self._last_published_known = True
+        self._publication_changed("published", entry)
+
+    def _handle_failed_publication(
+        self,
+        entry: dict,
+        now: datetime,
+        error: Optional[BaseException] = None,
+        policy: Optional[RetryPolicy] = None,
+    ) -> None:
+        policy = policy or self.retry_policies.classify(error)
+        # Попытки считаются в пределах класса: череда 429 не съедает лимит
+        # на сетевые ошибки, и бэкофф нового класса начинается с начала.
+        if entry.get("retry_class", policy.name) != policy.name:
+            entry["attempts"] = 0
         attempts = entry.get("attempts", 0) + 1
         entry["attempts"] = attempts
+        entry["retry_class"] = policy.name
         meme_id = entry.get("meme", {}).get("meme_id", "?")
 
-        if attempts <= MAX_PUBLISH_ATTEMPTS:
-            backoff = now + timedelta(minutes=5 * attempts)
-            entry["scheduled_time"] = backoff.isoformat()
-            self.save_publication()
+        if attempts <= policy.max_attempts:
+            # Слот (scheduled_time) не трогаем: у записи свой таймер повтора,
+            # а место в очереди решает ordering.
+            backoff = now + policy.delay(attempts, getattr(error, "retry_after", None))
+            entry["retry_at"] = backoff.isoformat()
+            self._queue.reschedule(entry)
+            self._publication_changed("update", entry)
             logging.warning(
-                f"Публикация мема {meme_id} не удалась (попытка {attempts}/"
-                f"{MAX_PUBLISH_ATTEMPTS}), повтор в {backoff.isoformat()}"
+                f"Публикация мема {meme_id} не удалась ({policy.name}, попытка {attempts}/"
+                f"{policy.max_attempts}), повтор в {backoff.isoformat()}"
             )
             return
 
-        # Исчерпали попытки: снимаем запись с очереди и громко роняем в dead-letter.
-        self.scheduled_posts.pop(0)
+        # Исчерпали попытки (или повтор бесполезен): снимаем запись с очереди
+        # и громко роняем в dead-letter.
+        self._queue.remove(entry)
         self._append_failed_publication(entry)
-        self.save_publication()
+        self._publication_changed("remove", entry)
         logging.error(
-            f"Мем {meme_id} ушёл в dead-letter после {attempts - 1} неудачных "
-            f"попыток публикации: {self.FAILED_PUBLICATIONS_FILE}"
+            f"Мем {meme_id} ушёл в dead-letter ({policy.name}) после {attempts} неудачных "
+            f"попыток публикации: {self._dead_letter_location()}"
         )
 
+    def _dead_letter_location(self) -> str:
+        return "storage" if self.storage is not None else self.DEAD_LETTER_FILE
+
     def _append_failed_publication(self, entry: dict) -> None:
-        """Дописывает запись в dead-letter файл (append к существующему списку)."""
+        """Дописывает запись в dead-letter одной строкой, с отметкой времени."""
+        entry["dead_at"] = datetime.now(timezone.utc).isoformat()
         try:
-            try:
-                with open(self.FAILED_PUBLICATIONS_FILE, "r", encoding="utf-8") as f:
-                    failed = json.load(f)
-                if not isinstance(failed, list):
-                    failed = []
-            except (FileNotFoundError, json.JSONDecodeError):
-                failed = []
-            failed.append(entry)
-            atomic_write_json(self.FAILED_PUBLICATIONS_FILE, failed)
+            if self.storage is not None:
+                self.storage.append_failed_publication(entry)
+            else:
+                self.dead_letters.append(entry)
         except Exception as e:
             logging.error(f"Не удалось записать мем в dead-letter: {e}")
 
+    def dead_letter_entries(self, flt: DeadLetterFilter = DeadLetterFilter()) -> List[dict]:
+        if self.storage is not None:
+            return [e for e in self.storage.load_failed_publications() if flt.matches(e)]
+        return list(self.dead_letters.entries(flt.matches))
+
+    async def replay_dead_letters(self, flt: DeadLetterFilter = DeadLetterFilter()) -> List[int]:
+        """Возвращает подходящие записи dead-letter в хвост очереди публикации.
+
+        Все записи встают в очередь одной пачкой и одной записью на диск;
+        из dead-letter они вычёркиваются только после этого (крэш посередине
+        оставит копию в dead-letter, но не потеряет мем). Отметка мема в журнале
+        публикаций снимается: повтор — осознанное решение админа.
+        Файлы JSON-backend'а читаются и пишутся в worker-треде.
+        Возвращает meme_id вернувшихся записей.
+        """
+        if self.storage is None:
+            entries = await asyncio.to_thread(lambda: list(self.dead_letters.entries(flt.matches)))
+            self._requeue(entries)
+            if entries:
+                if self.on_dirty is not None:
+                    self.on_dirty("publication")  # снапшот group commit'а не должен её затереть
+                try:
+                    await asyncio.to_thread(self._write_publication, self.publication_snapshot())
+                except Exception as e:
+                    # Записи остаются и в dead-letter: лучше дубль, чем потерянный мем.
+                    logging.error(f"Ошибка при сохранении очереди публикации: {e}")
+                else:
+                    # Только взятые записи: пока шла запись, в dead-letter могли лечь новые.
+                    await asyncio.to_thread(
+                        self.dead_letters.discard, lambda e: flt.matches(e) and e in entries
+                    )
+        else:
+            with self.storage.transaction():
+                if self.shared:
+                    self._reload_shared()
+                entries = self.storage.take_failed_publications(flt.matches)
+                queued = self._requeue(entries)
+                if self.shared:
+                    for entry in queued:
+                        self.storage.append_publication(entry)
+                elif entries:
+                    self.save_publication()
+        replayed = [e.get("meme", {}).get("meme_id") for e in entries]
+        if replayed:
+            logging.info(f"Из dead-letter в очередь публикации вернулись мемы: {replayed}")
+        return replayed
+
+    def _requeue(self, entries: List[dict]) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        queued = []
+        for old in entries:
+            entry = {"scheduled_time": self._next_slot(now).isoformat(), "meme": old["meme"]}
+            self._queue.append(entry)
+            meme_id = old["meme"].get("meme_id")
+            if meme_id is not None:
+                self.ledger.forget(meme_id)
+            queued.append(entry)
+        if queued:
+            self.wake()
+        return queued
+
+    async def _expire_pending(self, memes: List[Meme]) -> None:
+        """Снимает истёкшие мемы одной записью на диск и гасит кнопки модераторов."""
+        if self.shared:
+            # Мем мог прямо сейчас финализировать другой процесс: снимаем только
+            # те, чей claim достался нам.
+            claimed = await asyncio.gather(*(self.claim(m.meme_id) for m in memes))
+            memes = [m for m, ok in zip(memes, claimed) if ok]
+            if not memes:
+                return
+        self._log_moderation_batch([{"op": "resolve", "id": m.meme_id} for m in memes])
+        logging.info(f"Истёк срок модерации мемов: {[m.meme_id for m in memes]}")
+        if self.bot is None:
+            return
+        for meme in memes:
+            # finalized — мем прямо сейчас финализируется (claim стоит),
+            # его клавиатуры перерисует _finalize_meme.
+            if not meme.finalized:
+                await notifications.update_mod_messages_with_resolution(self.bot, meme, EXPIRED_RESOLUTION)
+
+    async def _sleep(self, timeout: Optional[float]) -> None:
+        """Спит до timeout (None — до события), но просыпается по wake()."""
+        cap = SHARED_POLL_SEC if self.shared else MAX_IDLE_SLEEP_SEC
+        timeout = cap if timeout is None else min(timeout, cap)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
     async def run(self):
+        if self.shared:
+            # Новый лидер (после старта или падения прежнего) догоняет
+            # то, что просрочилось, пока публиковать было некому.
+            try:
+                self._catch_up_shared()
+            except Exception as e:
+                logging.error(f"Ошибка при догоне очереди публикации: {e}")
         while True:
             # Любое неожиданное исключение итерации (битая запись, сбой диска)
             # не должно убивать цикл публикации: логируем и продолжаем.
             # CancelledError — BaseException, поэтому отмена таска проходит насквозь.
             try:
+                # Сбрасываем до чтения очереди: wake() во время итерации
+                # не потеряется — следующий _sleep вернётся сразу.
+                self._wakeup.clear()
+                if self.shared:
+                    self._reload_shared()
                 now = datetime.now(timezone.utc)
-                expired = []
-                for mem_id, meme in list(self.pending_memes.items()):
-                    if now - meme.created_time > timedelta(days=3):
-                        expired.append(mem_id)
-                for mid in expired:
-                    del self.pending_memes[mid]
-                    self.save_moderation()
-
-                if self.scheduled_posts:
-                    self.scheduled_posts.sort(key=lambda x: datetime.fromisoformat(x["scheduled_time"]))
-                    next_entry = self.scheduled_posts[0]
-                    next_time = datetime.fromisoformat(next_entry["scheduled_time"])
-                    if next_time > now:
-                        await asyncio.sleep(min((next_time - now).total_seconds(), 10))
+                expired = self._pending.pop_expired(now.timestamp())
+                if expired:
+                    await self._expire_pending(expired)
+                next_expiry = self._pending.next_deadline()
+                expiry_wait = next_expiry - now.timestamp() if next_expiry is not None else None
+
+                next_entry = self._queue.peek()
+                if next_entry is not None:
+                    wait = self._queue.peek_epoch() - now.timestamp()
+                    if wait > 0:
+                        await self._sleep(wait if expiry_wait is None else min(wait, expiry_wait))
+                    elif self.lease is not None and not self.lease.held:
+                        # Аренда вот-вот перейдёт другому процессу — публиковать
+                        # теперь его забота; LeaderLease сам остановит этот цикл.
+                        await asyncio.sleep(1)
                     else:
                         # publish-then-pop: запись остаётся в очереди, пока публикация
-                        # не подтверждена. Семантика стала at-least-once — крэш между
-                        # успешной публикацией и pop() даст дубль поста после рестарта,
-                        # но для мем-канала дубль предпочтительнее тихой потери мема.
+                        # не подтверждена. Крэш между успешной публикацией и pop()
+                        # не даёт дубля: после рестарта запись сверяется с журналом.
                         await self._publish_due_entry(next_entry, now)
                 else:
-                    await asyncio.sleep(10)
+                    await self._sleep(expiry_wait)
             except Exception:
                 logging.exception("Ошибка в цикле планировщика")
                 await asyncio.sleep(10)
+
+
+def _adopt_transient(meme: Meme, local: Meme) -> None:
+    """Переносит на перечитанный из базы мем то, что живёт только в памяти процесса."""
+    meme.mod_messages = local.mod_messages
+    meme.user_messages = local.user_messages
+    meme.finalized = local.finalized
+    meme.user_status_text = local.user_status_text
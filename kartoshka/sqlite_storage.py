@@ -0,0 +1,603 @@
+"""SQLite-backend хранилища (STORAGE_BACKEND=sqlite).
+
+Вместо шести JSON-файлов, каждый из которых читается и переписывается
+целиком, — одна база в WAL-журнале: обновление одного пользователя — одна
+строка, мем ищется по PRIMARY KEY meme_id, а счётчик + автор + новый мем
+в handle_meme_suggestion коммитятся одной транзакцией.
+
+Базу могут делить несколько процессов бота (MULTI_INSTANCE): для них здесь
+аренда лидерства (leases), атомарная выдача meme_id, claim финализации и
+построчные операции над очередью публикации (storage.SharedStorage).
+
+Переезд с JSON — разовый импорт:
+    python -m kartoshka.sqlite_storage import [--db kartoshka.db] [--force]
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from kartoshka.models import VOTE_CODES, VOTE_NAMES
+from kartoshka.storage import UserStore
+from kartoshka.vote_history import EventFilter, VoteEvent
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    last_submission TEXT,
+    rejections INTEGER NOT NULL DEFAULT 0,
+    ban_until TEXT
+);
+CREATE TABLE IF NOT EXISTS pending_memes (
+    meme_id INTEGER PRIMARY KEY,
+    created_time TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS votes (
+    meme_id INTEGER NOT NULL,
+    crypto_id TEXT NOT NULL,
+    vote TEXT NOT NULL,
+    PRIMARY KEY (meme_id, crypto_id)
+);
+CREATE TABLE IF NOT EXISTS publication_queue (
+    position INTEGER PRIMARY KEY,
+    meme_id INTEGER,
+    scheduled_time TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_publication_meme_id ON publication_queue (meme_id);
+CREATE TABLE IF NOT EXISTS failed_publications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    meme_id INTEGER,
+    entry TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS publish_ledger (
+    meme_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    message_id INTEGER,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_publish_ledger_ts ON publish_ledger (ts);
+CREATE TABLE IF NOT EXISTS vote_history (
+    meme_id INTEGER NOT NULL,
+    editor_id INTEGER NOT NULL,
+    vote INTEGER NOT NULL,
+    at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vote_history_meme_id ON vote_history (meme_id);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS publish_choices (
+    user_id INTEGER PRIMARY KEY,
+    choice TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    ts TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('queue_version', '0');
+"""
+
+# Любая запись в очереди увеличивает meta.queue_version: процесс на общей
+# базе перечитывает очереди, только когда версия сменилась.
+_SCHEMA += "".join(
+    f"CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_version AFTER {op} ON {table} BEGIN "
+    f"UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'queue_version'; END;\n"
+    for table in ("pending_memes", "votes", "publication_queue")
+    for op in ("INSERT", "UPDATE", "DELETE")
+)
+
+
+def _dumps(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteStorage:
+    """Реализует storage.Storage и storage.QueueStorage поверх одной базы.
+
+    Соединение одно на процесс и разделяется между event loop'ом и
+    worker-тредами (asyncio.to_thread), поэтому доступ сериализуется RLock'ом.
+    transaction() реентерабелен: вложенные вызовы из того же треда попадают
+    во внешнюю транзакцию, коммит — на выходе из самой внешней.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # isolation_level=None: транзакциями управляем сами (BEGIN/COMMIT).
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL-журнале synchronous=NORMAL не теряет целостность, только
+        # последние транзакции при отключении питания — как и atomic_write_json без fsync каталога.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    # ----- Storage -----
+
+    def load_meme_counter(self) -> int:
+        value = self._get_meta("meme_counter")
+        return int(value) if value is not None else 0
+
+    def save_meme_counter(self, counter: int) -> None:
+        self._set_meta("meme_counter", str(counter))
+
+    def load_user_data(self) -> UserStore:
+        rows = self._query("SELECT user_id, last_submission, rejections, ban_until FROM users")
+        return UserStore({
+            uid: {
+                "last_submission": _parse(last),
+                "rejections": rejections,
+                "ban_until": _parse(ban),
+            }
+            for uid, last, rejections, ban in rows
+        })
+
+    def save_user_data(self, data) -> List[str]:
+        """UserStore — UPSERT только грязных строк; обычный dict — всех.
+
+        Возвращает записанные ключи. Ошибка пробрасывается, ключи UserStore
+        остаются грязными.
+        """
+        uids = data.drain_dirty() if isinstance(data, UserStore) else list(data.keys())
+        try:
+            with self.transaction():
+                for uid in uids:
+                    ud = data.get(uid)
+                    if ud is None:
+                        self._conn.execute("DELETE FROM users WHERE user_id = ?", (uid,))
+                        continue
+                    self._conn.execute(
+                        "INSERT INTO users (user_id, last_submission, rejections, ban_until) "
+                        "VALUES (?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                        "last_submission = excluded.last_submission, "
+                        "rejections = excluded.rejections, ban_until = excluded.ban_until",
+                        (uid, _iso(ud["last_submission"]), ud["rejections"], _iso(ud["ban_until"])),
+                    )
+        except Exception:
+            if isinstance(data, UserStore):
+                data.restore_dirty(uids)
+            raise
+        return uids
+
+    def load_candidates(self) -> list:
+        rows = self._query("SELECT user_id, username, first_name, ts FROM candidates ORDER BY ts")
+        return [
+            {"id": uid, "username": username, "first_name": first_name, "ts": ts}
+            for uid, username, first_name, ts in rows
+        ]
+
+    def add_candidate(self, user_id: int, username, first_name, ts: str) -> bool:
+        with self.transaction():
+            cur = self._conn.execute(
+                "UPDATE candidates SET username = ?, first_name = ? WHERE user_id = ?",
+                (username, first_name, user_id),
+            )
+            if cur.rowcount:
+                return False
+            self._conn.execute(
+                "INSERT INTO candidates (user_id, username, first_name, ts) VALUES (?, ?, ?, ?)",
+                (user_id, username, first_name, ts),
+            )
+            return True
+
+    # ----- QueueStorage -----
+
+    def _pending_with_votes(self, where: str = "", args: tuple = ()) -> List[dict]:
+        """Мемы вместе с голосами — одним запросом (LEFT JOIN), а не запросом на мем."""
+        rows = self._query(
+            "SELECT p.meme_id, p.data, v.crypto_id, v.vote FROM pending_memes p "
+            f"LEFT JOIN votes v ON v.meme_id = p.meme_id {where} ORDER BY p.meme_id",
+            args,
+        )
+        memes: Dict[int, dict] = {}
+        for meme_id, data, crypto_id, vote in rows:
+            meme = memes.get(meme_id)
+            if meme is None:
+                meme = memes[meme_id] = json.loads(data)
+                meme["votes"] = {}
+            if crypto_id is not None:
+                meme["votes"][crypto_id] = vote
+        return list(memes.values())
+
+    def load_pending(self) -> List[dict]:
+        return self._pending_with_votes()
+
+    def get_pending(self, meme_id: int) -> Optional[dict]:
+        memes = self._pending_with_votes("WHERE p.meme_id = ?", (meme_id,))
+        return memes[0] if memes else None
+
+    def put_pending(self, meme: dict) -> None:
+        body = {k: v for k, v in meme.items() if k != "votes"}
+        with self.transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_memes (meme_id, created_time, data) VALUES (?, ?, ?)",
+                (meme["meme_id"], meme["created_time"], _dumps(body)),
+            )
+            self._conn.execute("DELETE FROM votes WHERE meme_id = ?", (meme["meme_id"],))
+            self._conn.executemany(
+                "INSERT INTO votes (meme_id, crypto_id, vote) VALUES (?, ?, ?)",
+                [(meme["meme_id"], k, v) for k, v in meme.get("votes", {}).items()],
+            )
+
+    def put_vote(self, meme_id: int, crypto_id: str, vote: str) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO votes (meme_id, crypto_id, vote) VALUES (?, ?, ?)",
+                (meme_id, str(crypto_id), vote),
+            )
+
+    def append_vote_history(self, events: Iterable[VoteEvent]) -> None:
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT INTO vote_history (meme_id, editor_id, vote, at) VALUES (?, ?, ?, ?)",
+                [(e.meme_id, e.editor_id, VOTE_CODES[e.vote], int(e.at.timestamp())) for e in events],
+            )
+
+    def load_vote_history(self, flt: EventFilter = EventFilter()) -> List[VoteEvent]:
+        where, args = [], []
+        if flt.meme_id is not None:
+            where.append("meme_id = ?")
+            args.append(flt.meme_id)
+        if flt.editor_id is not None:
+            where.append("editor_id = ?")
+            args.append(flt.editor_id)
+        if flt.since is not None:
+            where.append("at >= ?")
+            args.append(int(flt.since.timestamp()))
+        if flt.until is not None:
+            where.append("at < ?")
+            args.append(int(flt.until.timestamp()))
+        sql = "SELECT meme_id, editor_id, vote, at FROM vote_history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._query(sql + " ORDER BY rowid", tuple(args))
+        return [
+            VoteEvent(meme_id, editor_id, VOTE_NAMES[vote], datetime.fromtimestamp(at, timezone.utc))
+            for meme_id, editor_id, vote, at in rows
+        ]
+
+    def delete_pending(self, meme_id: int) -> None:
+        with self.transaction():
+            self._conn.execute("DELETE FROM pending_memes WHERE meme_id = ?", (meme_id,))
+            self._conn.execute("DELETE FROM votes WHERE meme_id = ?", (meme_id,))
+
+    def replace_pending(self, memes: List[dict]) -> None:
+        with self.transaction():
+            self._conn.execute("DELETE FROM pending_memes")
+            self._conn.execute("DELETE FROM votes")
+            for meme in memes:
+                self.put_pending(meme)
+
+    def load_publication(self) -> Optional[dict]:
+        last = self._get_meta("last_published_time")
+        rows = self._query("SELECT entry FROM publication_queue ORDER BY position")
+        if last is None and not rows:
+            return None
+        data = {"queue": [json.loads(entry) for (entry,) in rows]}
+        if last is not None:
+            data["last_published_time"] = last
+        return data
+
+    def save_publication(self, data: dict) -> None:
+        with self.transaction():
+            self._set_meta("last_published_time", data["last_published_time"])
+            self._conn.execute("DELETE FROM publication_queue")
+            self._conn.executemany(
+                "INSERT INTO publication_queue (position, meme_id, scheduled_time, entry) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (i, entry.get("meme", {}).get("meme_id"), entry["scheduled_time"], _dumps(entry))
+                    for i, entry in enumerate(data["queue"])
+                ],
+            )
+
+    def append_failed_publication(self, entry: dict) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO failed_publications (meme_id, entry) VALUES (?, ?)",
+                (entry.get("meme", {}).get("meme_id"), _dumps(entry)),
+            )
+
+    def load_failed_publications(self) -> List[dict]:
+        rows = self._query("SELECT entry FROM failed_publications ORDER BY id")
+        return [json.loads(entry) for (entry,) in rows]
+
+    def take_failed_publications(self, predicate: Callable[[dict], bool]) -> List[dict]:
+        """Забирает (удаляет и возвращает) записи dead-letter, подходящие под predicate."""
+        with self.transaction():
+            rows = self._conn.execute("SELECT id, entry FROM failed_publications ORDER BY id").fetchall()
+            taken = [(row_id, json.loads(entry)) for row_id, entry in rows]
+            taken = [(row_id, entry) for row_id, entry in taken if predicate(entry)]
+            self._conn.executemany("DELETE FROM failed_publications WHERE id = ?", [(row_id,) for row_id, _ in taken])
+        return [entry for _, entry in taken]
+
+    def get_ledger_entry(self, meme_id: int) -> Optional[dict]:
+        rows = self._query("SELECT state, message_id, ts FROM publish_ledger WHERE meme_id = ?", (meme_id,))
+        if not rows:
+            return None
+        state, message_id, ts = rows[0]
+        return {"id": meme_id, "state": state, "message_id": message_id, "ts": ts}
+
+    def put_ledger_entry(self, meme_id: int, state: str, ts: float, message_id: Optional[int] = None) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO publish_ledger (meme_id, state, message_id, ts) VALUES (?, ?, ?, ?)",
+                (meme_id, state, message_id, ts),
+            )
+
+    def delete_ledger_entry(self, meme_id: int) -> None:
+        with self.transaction():
+            self._conn.execute("DELETE FROM publish_ledger WHERE meme_id = ?", (meme_id,))
+
+    def compact_ledger(self, cutoff: float) -> int:
+        """Удаляет записи журнала публикаций старше cutoff (epoch); возвращает их число."""
+        with self.transaction():
+            cur = self._conn.execute("DELETE FROM publish_ledger WHERE ts < ?", (cutoff,))
+        return cur.rowcount
+
+    # ----- SharedStorage (несколько процессов на одной базе) -----
+
+    def acquire_lease(self, name: str, holder: str, ttl_sec: float) -> bool:
+        """Берёт или продлевает аренду name; True — аренда у holder.
+
+        Чужая аренда перехватывается, только когда истекла: лидер, который
+        перестал продлевать (упал, завис), теряет её через ttl_sec.
+        """
+        now = time.time()
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, "
+                "expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl_sec, now),
+            )
+            row = self._conn.execute("SELECT holder FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == holder
+
+    def release_lease(self, name: str, holder: str) -> None:
+        with self.transaction():
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def next_meme_id(self) -> int:
+        """Атомарно увеличивает meme_counter: id уникален между процессами."""
+        with self.transaction():
+            current = self.load_meme_counter() + 1
+            self.save_meme_counter(current)
+        return current
+
+    def claim_pending(self, meme_id: int) -> bool:
+        """Снимает мем с модерации; True получает ровно один из конкурентов."""
+        with self.transaction():
+            cur = self._conn.execute("DELETE FROM pending_memes WHERE meme_id = ?", (meme_id,))
+            self._conn.execute("DELETE FROM votes WHERE meme_id = ?", (meme_id,))
+        return cur.rowcount > 0
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        rows = self._query(
+            "SELECT last_submission, rejections, ban_until FROM users WHERE user_id = ?", (user_id,)
+        )
+        if not rows:
+            return None
+        last, rejections, ban = rows[0]
+        return {"last_submission": _parse(last), "rejections": rejections, "ban_until": _parse(ban)}
+
+    def put_publish_choice(self, user_id: int, choice: str, expires_at: datetime) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO publish_choices (user_id, choice, expires_at) VALUES (?, ?, ?)",
+                (user_id, choice, expires_at.isoformat()),
+            )
+
+    def get_publish_choice(self, user_id: int) -> Optional[tuple]:
+        rows = self._query("SELECT choice, expires_at FROM publish_choices WHERE user_id = ?", (user_id,))
+        return (rows[0][0], _parse(rows[0][1])) if rows else None
+
+    def append_publication(self, entry: dict) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO publication_queue (position, meme_id, scheduled_time, entry) "
+                "VALUES ((SELECT COALESCE(MAX(position), -1) + 1 FROM publication_queue), ?, ?, ?)",
+                (entry.get("meme", {}).get("meme_id"), entry["scheduled_time"], _dumps(entry)),
+            )
+
+    def update_publication(self, entry: dict) -> None:
+        with self.transaction():
+            self._conn.execute(
+                "UPDATE publication_queue SET scheduled_time = ?, entry = ? WHERE meme_id = ?",
+                (entry["scheduled_time"], _dumps(entry), entry.get("meme", {}).get("meme_id")),
+            )
+
+    def delete_publication(self, meme_id: int) -> None:
+        with self.transaction():
+            self._conn.execute("DELETE FROM publication_queue WHERE meme_id = ?", (meme_id,))
+
+    def set_last_published_time(self, value: datetime) -> None:
+        self._set_meta("last_published_time", value.isoformat())
+
+    def queue_version(self) -> int:
+        """Растёт с каждой записью в pending_memes, votes и publication_queue."""
+        return int(self._get_meta("queue_version") or 0)
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _read_legacy_pending(snapshot_path: str, log_path: str) -> list:
+    """Мемы на модерации: снапшот плюс хвост WAL модерации."""
+    from kartoshka.models import Meme
+    from kartoshka.scheduler import apply_moderation_record
+    from kartoshka.wal import AppendLog
+
+    data = _read_json(snapshot_path, {})
+    pending = {m["meme_id"]: Meme.from_dict(m) for m in data.get("pending_memes", [])}
+    for record in AppendLog(log_path).replay():
+        try:
+            apply_moderation_record(pending, record)
+        except Exception as e:
+            logging.error(f"Пропущена запись лога модерации {record!r}: {e}")
+    return list(pending.values())
+
+
+def _read_legacy_dead_letters(path: str, legacy_path: str) -> List[dict]:
+    """Dead-letter: старый JSON-список и JSONL-лог с ротациями.
+
+    Только чтение: миграция DeadLetterQueue переименовала бы старый файл,
+    а исходные файлы после импорта должны остаться как были.
+    """
+    from kartoshka.dead_letter import DeadLetterQueue
+
+    legacy = _read_json(legacy_path, [])
+    entries = [e for e in legacy if isinstance(e, dict)] if isinstance(legacy, list) else []
+    return entries + list(DeadLetterQueue(path).entries())
+
+
+def import_json(storage: SQLiteStorage, force: bool = False) -> Dict[str, int]:
+    """Разовый перенос состояния из JSON-файлов (пути — из constants) в базу.
+
+    Файлы только читаются: Scheduler не создаётся, поэтому ни миграций,
+    ни догона очереди публикации — записи переносятся как есть.
+    Повторный импорт поверх уже импортированной базы требует force=True.
+    Возвращает, сколько записей каждого вида перенесено.
+    """
+    from kartoshka import storage as json_storage
+    from kartoshka.publish_ledger import PublishLedger
+    from kartoshka.scheduler import Scheduler
+    from kartoshka.vote_history import VoteHistory
+
+    if storage._get_meta("imported_at") is not None and not force:
+        raise RuntimeError(f"{storage.path} уже содержит импортированные данные (нужен --force)")
+
+    counter = json_storage.load_meme_counter()
+    user_data = json_storage.load_user_data()
+    candidates = json_storage.load_candidates()
+    pending = _read_legacy_pending(Scheduler.MODERATION_FILE, Scheduler.MODERATION_LOG_FILE)
+    publication = _read_json(Scheduler.PUBLICATION_FILE, {})
+    queue = publication.get("queue", [])
+    failed = _read_legacy_dead_letters(Scheduler.DEAD_LETTER_FILE, Scheduler.FAILED_PUBLICATIONS_FILE)
+    history = list(VoteHistory(Scheduler.VOTE_HISTORY_FILE).events())
+    ledger = PublishLedger(Scheduler.PUBLISH_LEDGER_FILE).entries()
+
+    max_id = max(
+        [m.meme_id for m in pending] + [e.get("meme", {}).get("meme_id", 0) for e in queue],
+        default=0,
+    )
+    with storage.transaction():
+        storage.save_meme_counter(max(counter, max_id))
+        storage.save_user_data(dict(user_data))  # dict, а не UserStore: все строки
+        for c in candidates:
+            storage.add_candidate(c["id"], c.get("username"), c.get("first_name"), c["ts"])
+        storage.replace_pending([m.to_dict() for m in pending])
+        storage.save_publication({
+            "last_published_time": publication.get(
+                "last_published_time", datetime.now(timezone.utc).isoformat()
+            ),
+            "queue": queue,
+        })
+        # Повторный импорт (--force) заменяет dead-letter и историю, а не дублирует их.
+        storage._conn.execute("DELETE FROM failed_publications")
+        for entry in failed:
+            storage.append_failed_publication(entry)
+        storage._conn.execute("DELETE FROM vote_history")
+        storage.append_vote_history(history)
+        for r in ledger:
+            storage.put_ledger_entry(int(r["id"]), r["state"], r["ts"], r.get("message_id"))
+        storage._set_meta("imported_at", datetime.now(timezone.utc).isoformat())
+
+    return {
+        "users": len(user_data),
+        "candidates": len(candidates),
+        "pending": len(pending),
+        "scheduled": len(queue),
+        "failed": len(failed),
+        "votes": len(history),
+        "ledger": len(ledger),
+    }
+
+
+def _main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser(description="SQLite-хранилище kartoshka_bot")
+    sub = ap.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="перенести состояние из JSON-файлов в базу")
+    imp.add_argument("--db", default="kartoshka.db")
+    imp.add_argument("--force", action="store_true")
+    args = ap.parse_args()
+
+    storage = SQLiteStorage(args.db)
+    try:
+        counts = import_json(storage, force=args.force)
+    finally:
+        storage.close()
+    logging.info(f"Импорт в {args.db} завершён: {counts}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,10 +1,16 @@
+import asyncio
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from kartoshka.persistence import Persistence
+from kartoshka.status_edits import StatusEdits
+from kartoshka.storage import JsonStorage, Storage, UserStore
 
 if TYPE_CHECKING:
     from aiogram import Bot
 
+    from kartoshka.media_groups import MediaGroupCollector
     from kartoshka.scheduler import Scheduler
 
 
@@ -18,20 +24,103 @@ class AppState:
     bot: "Bot"
     scheduler: "Scheduler"
     meme_counter: int = 0
-    user_data: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    user_data: UserStore = field(default_factory=UserStore)
     # user_id -> (choice, expires_at). Запись живёт PUBLISH_CHOICE_TTL после /start.
     user_publish_choice: Dict[int, Tuple[str, datetime]] = field(default_factory=dict)
+    storage: Storage = field(default_factory=JsonStorage)
+    # Окно group commit'а: пометки за это время пишутся на диск одной пачкой.
+    persist_window_sec: float = 0.05
+    persistence: Persistence = field(init=False, repr=False)
+    # Debounce перерисовки статуса автора при серии голосов.
+    status_edits: StatusEdits = field(default_factory=StatusEdits, repr=False)
+    # Сборщик альбомов; создаёт handlers.submit.register, закрывает main().
+    albums: Optional["MediaGroupCollector"] = field(default=None, repr=False)
+    # Базу делят несколько процессов (MULTI_INSTANCE): счётчик, авторы и выбор
+    # способа публикации читаются из storage (SharedStorage), а не из памяти.
+    shared: bool = False
+
+    def __post_init__(self) -> None:
+        # user_data всегда UserStore: сохранение пишет только изменённых пользователей.
+        if not isinstance(self.user_data, UserStore):
+            self.user_data = UserStore(self.user_data)
+        self.persistence = Persistence(self._commit, self.persist_window_sec)
+        if self.scheduler is not None:
+            self.scheduler.on_dirty = self.mark_dirty
+
+    def mark_dirty(self, kind: str) -> None:
+        """Помечает часть состояния к записи: users, counter, moderation, publication."""
+        self.persistence.mark_dirty(kind)
+
+    async def flush(self) -> None:
+        """Барьер durability: всё помеченное до вызова уже на диске."""
+        await self.persistence.flush()
+
+    async def next_meme_id(self) -> int:
+        """Выдаёт id нового мема; в общем режиме — атомарно в базе (в worker-треде)."""
+        if self.shared:
+            self.meme_counter = await asyncio.to_thread(self.storage.next_meme_id)
+        else:
+            self.meme_counter += 1
+            self.mark_dirty("counter")
+        return self.meme_counter
+
+    def refresh_user(self, user_id: int) -> None:
+        """Общий режим: подтягивает запись автора из базы (её мог менять другой процесс)."""
+        if not self.shared:
+            return
+        key = str(user_id)
+        row = self.storage.get_user(key)
+        # dict-методы напрямую: свежая запись из базы — не повод её перезаписывать.
+        if row is not None:
+            dict.__setitem__(self.user_data, key, row)
+        else:
+            dict.pop(self.user_data, key, None)
+
+    async def _commit(self, kinds: Set[str]) -> None:
+        # Payload, который мутирует event loop, снимаем здесь же — в worker-тред
+        # уходят только готовые копии и запись на диск.
+        records = self.scheduler.take_moderation_records() if "moderation" in kinds else []
+        publication = self.scheduler.publication_snapshot() if "publication" in kinds else None
+        counter = self.meme_counter
+        users: List[str] = []
+
+        def write():
+            with self.storage.transaction():
+                if records:
+                    self.scheduler._write_moderation_records(records)
+                if publication is not None:
+                    self.scheduler._write_publication(publication)
+                if "users" in kinds:
+                    users.extend(self.storage.save_user_data(self.user_data))
+                if "counter" in kinds:
+                    self.storage.save_meme_counter(counter)
+
+        try:
+            await asyncio.to_thread(write)
+        except Exception:
+            # Транзакция откатилась: снятое возвращаем, чтобы следующий commit
+            # записал его снова (kinds заново помечает Persistence).
+            self.scheduler.restore_moderation_records(records)
+            self.user_data.restore_dirty(users)
+            raise
 
     def set_publish_choice(self, user_id: int, choice: str) -> None:
         """Сохраняет выбор пользователя на PUBLISH_CHOICE_TTL."""
-        self.user_publish_choice[user_id] = (
-            choice,
-            datetime.now(timezone.utc) + PUBLISH_CHOICE_TTL,
-        )
+        expires_at = datetime.now(timezone.utc) + PUBLISH_CHOICE_TTL
+        self.user_publish_choice[user_id] = (choice, expires_at)
+        if self.shared:
+            # /start и мем могут попасть в разные процессы.
+            self.storage.put_publish_choice(user_id, choice, expires_at)
 
     def get_publish_choice(self, user_id: int) -> Optional[str]:
         """Возвращает активный выбор или None (с lazy-eviction истёкшего)."""
-        entry = self.user_publish_choice.get(user_id)
+        entry = None
+        if self.shared:
+            # Повторный /start мог попасть в другой процесс: база первична,
+            # локальная запись — только запасной вариант.
+            entry = self.storage.get_publish_choice(user_id)
+        if entry is None:
+            entry = self.user_publish_choice.get(user_id)
         if entry is None:
             return None
         choice, expires_at = entry
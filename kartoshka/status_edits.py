@@ -0,0 +1,81 @@
+"""Живой счёт голосов под сообщением автора — с debounce.
+
+Каждый голос раньше сразу перерисовывал статус автора: серия голосов давала
+серию edit'ов, а переголосование approve→urgent→approve — ещё и ошибки
+«message is not modified». StatusEdits копит голоса одного мема, пока они
+идут чаще quiet_sec, и шлёт один edit с итоговым счётом; если текст не
+изменился относительно показанного (meme.user_status_text) — не шлёт ничего.
+finalize() отменяет ожидание (и уже летящий промежуточный edit) и сразу
+показывает финальный статус.
+"""
+import asyncio
+from typing import TYPE_CHECKING, Dict
+
+from kartoshka import notifications
+from kartoshka.models import Meme
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# Тишина после последнего голоса, после которой статус автора перерисовывается.
+STATUS_QUIET_SEC = 1.5
+
+
+class StatusEdits:
+    """Debouncer перерисовки статуса автора, по одному таймеру на мем."""
+
+    def __init__(self, quiet_sec: float = STATUS_QUIET_SEC):
+        self.quiet_sec = quiet_sec
+        self._deadlines: Dict[int, float] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def schedule(self, bot: "Bot", meme: Meme) -> None:
+        """Голос учтён: перерисовать статус, когда голоса утихнут на quiet_sec."""
+        if meme.user_id is None or not meme.user_messages:
+            return
+        loop = asyncio.get_running_loop()
+        self._deadlines[meme.meme_id] = loop.time() + self.quiet_sec
+        if meme.meme_id not in self._tasks:
+            self._tasks[meme.meme_id] = loop.create_task(
+                self._debounce(bot, meme), name=f"status-edit-{meme.meme_id}"
+            )
+
+    async def finalize(self, bot: "Bot", meme: Meme, resolution: str) -> None:
+        """Отменяет отложенную перерисовку и сразу показывает финальный статус."""
+        self._deadlines.pop(meme.meme_id, None)
+        task = self._tasks.pop(meme.meme_id, None)
+        if task is not None:
+            task.cancel()
+            # Промежуточный edit мог быть уже в полёте: дожидаемся отмены, иначе
+            # он ляжет поверх финального статуса.
+            await asyncio.gather(task, return_exceptions=True)
+        await self._send(bot, meme, resolution)
+
+    async def _debounce(self, bot: "Bot", meme: Meme) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # Новый голос сдвигает дедлайн — досыпаем до него, а не перезапускаем таск.
+                while (delay := self._deadlines.get(meme.meme_id, 0) - loop.time()) > 0:
+                    await asyncio.sleep(delay)
+                self._deadlines.pop(meme.meme_id, None)
+                # Финал уже показан (или вот-вот будет) — промежуточный счёт его бы затёр.
+                if meme.finalized:
+                    return
+                await self._send(bot, meme)
+                # Голоса, пришедшие во время edit'а, — ещё один круг.
+                if meme.meme_id not in self._deadlines:
+                    return
+        finally:
+            # Таск числится за мемом, пока edit не завершён: finalize его дождётся.
+            if self._tasks.get(meme.meme_id) is asyncio.current_task():
+                del self._tasks[meme.meme_id]
+
+    async def _send(self, bot: "Bot", meme: Meme, final_resolution: str = None) -> None:
+        if notifications.user_status_text(meme, final_resolution) == meme.user_status_text:
+            return
+        await notifications.update_user_messages_with_status(bot, meme, final_resolution)
@@ -3,11 +3,19 @@ import json
 import logging
 import os
 import tempfile
-from contextlib import contextmanager
+import threading
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Dict, Iterable, List, Optional, Protocol
 
-from kartoshka.constants import CANDIDATES_FILE, COUNTER_FILE, USER_DATA_FILE
+from kartoshka.constants import CANDIDATES_FILE, COUNTER_FILE, USER_DATA_FILE, USER_DATA_LOG_FILE
+from kartoshka.wal import AppendLog
+
+if TYPE_CHECKING:
+    from kartoshka.vote_history import EventFilter, VoteEvent
+
+# Размер лога user_data.wal, после которого он сворачивается в снапшот user_data.json.
+USER_LOG_COMPACT_BYTES = 1024 * 1024
 
 
 def atomic_write_json(path: str, payload) -> None:
@@ -66,41 +74,169 @@ def save_meme_counter(counter: int):
         atomic_write_json(COUNTER_FILE, {"meme_counter": counter})
     except Exception as e:
         logging.error(f"Ошибка при сохранении счетчика meme_id: {e}")
+        raise
+
+
+class UserStore(dict):
+    """user_id -> запись пользователя, с учётом изменённых ключей.
+
+    Вставка/замена/удаление ключа помечают его грязным сами. Записи — обычные
+    dict'ы, и их мутацию на месте (ud["rejections"] += 1) словарь не видит:
+    после неё caller вызывает mark_dirty(user_id). save_user_data пишет только
+    грязные записи.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._dirty = set()
+        # Пометки ставит event loop, забирает save в worker-треде.
+        self._dirty_lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.mark_dirty(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.mark_dirty(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self.mark_dirty(key)
+        return super().pop(key, *default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def mark_dirty(self, key) -> None:
+        with self._dirty_lock:
+            self._dirty.add(key)
+
+    def drain_dirty(self) -> List[str]:
+        """Забирает грязные ключи и сбрасывает отметки.
+
+        Если запись забранного не удалась, caller возвращает ключи через
+        restore_dirty — иначе изменения потеряются до следующей их правки.
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        return list(dirty)
+
+    def restore_dirty(self, keys) -> None:
+        with self._dirty_lock:
+            self._dirty.update(keys)
 
 
-def load_user_data() -> Dict[str, Dict[str, Any]]:
+def _serialize_user(ud: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "last_submission": ud["last_submission"].isoformat() if ud["last_submission"] else None,
+        "rejections": ud["rejections"],
+        "ban_until": ud["ban_until"].isoformat() if ud["ban_until"] else None,
+    }
+
+
+def _parse_user(ud: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "last_submission": datetime.fromisoformat(ud["last_submission"]) if ud.get("last_submission") else None,
+        "rejections": ud.get("rejections", 0),
+        "ban_until": datetime.fromisoformat(ud["ban_until"]) if ud.get("ban_until") else None,
+    }
+
+
+_user_logs: Dict[str, AppendLog] = {}
+_user_logs_guard = threading.Lock()
+
+
+def _user_log() -> AppendLog:
+    """AppendLog для текущего USER_DATA_LOG_FILE (один объект и лок на путь)."""
+    with _user_logs_guard:
+        log = _user_logs.get(USER_DATA_LOG_FILE)
+        if log is None:
+            log = _user_logs[USER_DATA_LOG_FILE] = AppendLog(USER_DATA_LOG_FILE)
+        return log
+
+
+def load_user_data() -> UserStore:
+    """Снапшот user_data.json + докатка лога user_data.wal (запись на ключ)."""
+    data = UserStore()
     try:
         with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
             raw = json.load(f)
-
-        data = {}
         for uid, ud in raw.items():
-            data[uid] = {
-                "last_submission": datetime.fromisoformat(ud["last_submission"]) if ud.get("last_submission") else None,
-                "rejections": ud.get("rejections", 0),
-                "ban_until": datetime.fromisoformat(ud["ban_until"]) if ud.get("ban_until") else None,
-            }
-        return data
+            dict.__setitem__(data, uid, _parse_user(ud))
     except FileNotFoundError:
-        return {}
+        pass
     except Exception as e:
         logging.error(f"Ошибка при загрузке данных пользователей: {e}")
-        return {}
+        return UserStore()
 
+    for record in _user_log().replay():
+        try:
+            if record["u"] is None:
+                dict.pop(data, record["id"], None)
+            else:
+                dict.__setitem__(data, record["id"], _parse_user(record["u"]))
+        except Exception as e:
+            logging.error(f"Пропущена запись лога пользователей {record!r}: {e}")
+    return data
 
-def save_user_data(data: Dict[str, Dict[str, Any]]):
-    try:
-        serialized_data = {}
-        for uid, ud in data.items():
-            serialized_data[uid] = {
-                "last_submission": ud["last_submission"].isoformat() if ud["last_submission"] else None,
-                "rejections": ud["rejections"],
-                "ban_until": ud["ban_until"].isoformat() if ud["ban_until"] else None,
-            }
 
-        atomic_write_json(USER_DATA_FILE, serialized_data)
+def save_user_data(data: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Сохраняет пользователей.
+
+    UserStore — дописывает в лог только грязные записи, O(изменённых);
+    когда лог разрастается, он сворачивается в снапшот. Обычный dict —
+    полная перезапись снапшота (как раньше).
+
+    Возвращает записанные ключи. Ошибка записи пробрасывается, ключи
+    UserStore остаются грязными. Сбой свёртки в снапшот только логируется:
+    записи уже лежат в логе.
+    """
+    log = _user_log()
+    if isinstance(data, UserStore):
+        dirty = data.drain_dirty()
+        if not dirty:
+            return dirty
+        try:
+            records = []
+            for uid in dirty:
+                ud = data.get(uid)
+                records.append({"id": uid, "u": _serialize_user(ud) if ud is not None else None})
+            log.append_many(records)
+        except Exception as e:
+            data.restore_dirty(dirty)
+            logging.error(f"Ошибка при сохранении данных пользователей: {e}")
+            raise
+        if log.size() < USER_LOG_COMPACT_BYTES:
+            return dirty
+        try:
+            _write_user_snapshot(data, log)
+        except Exception as e:
+            logging.error(f"Ошибка при свёртке лога пользователей в снапшот: {e}")
+        return dirty
+    try:
+        _write_user_snapshot(data, log)
     except Exception as e:
         logging.error(f"Ошибка при сохранении данных пользователей: {e}")
+        raise
+    return list(data.keys())
+
+
+def _write_user_snapshot(data: Dict[str, Dict[str, Any]], log: AppendLog) -> None:
+    serialized_data = {uid: _serialize_user(ud) for uid, ud in list(data.items())}
+    with log.lock:
+        atomic_write_json(USER_DATA_FILE, serialized_data)
+        # Снапшот содержит всё: лог целиком устарел.
+        try:
+            os.unlink(log.path)
+        except FileNotFoundError:
+            pass
 
 
 def load_candidates() -> list:
@@ -144,3 +280,97 @@ def add_candidate(user_id: int, username, first_name, ts: str) -> bool:
         })
         save_candidates(candidates)
         return True
+
+
+class Storage(Protocol):
+    """Хранилище состояния бота вне очередей Scheduler'а.
+
+    Реализации: JsonStorage (дефолт) и SQLiteStorage (kartoshka.sqlite_storage).
+    save_user_data получает UserStore и пишет только его грязные записи;
+    возвращает записанные ключи — если объемлющая транзакция откатится,
+    caller вернёт их через UserStore.restore_dirty.
+    """
+
+    def transaction(self) -> ContextManager[None]: ...
+    def load_meme_counter(self) -> int: ...
+    def save_meme_counter(self, counter: int) -> None: ...
+    def load_user_data(self) -> Dict[str, Dict[str, Any]]: ...
+    def save_user_data(self, data: Dict[str, Dict[str, Any]]) -> List[str]: ...
+    def load_candidates(self) -> list: ...
+    def add_candidate(self, user_id: int, username, first_name, ts: str) -> bool: ...
+
+
+class QueueStorage(Protocol):
+    """Хранилище очередей Scheduler'а (модерация, публикация, dead-letter,
+    журнал публикаций, история голосов).
+
+    Без него Scheduler пишет собственные JSON-файлы (+ WAL модерации).
+    """
+
+    def load_pending(self) -> List[dict]: ...
+    def get_pending(self, meme_id: int) -> Optional[dict]: ...
+    def put_pending(self, meme: dict) -> None: ...
+    def put_vote(self, meme_id: int, crypto_id: str, vote: str) -> None: ...
+    def delete_pending(self, meme_id: int) -> None: ...
+    def replace_pending(self, memes: List[dict]) -> None: ...
+    def load_publication(self) -> Optional[dict]: ...
+    def save_publication(self, data: dict) -> None: ...
+    def append_failed_publication(self, entry: dict) -> None: ...
+    def load_failed_publications(self) -> List[dict]: ...
+    def take_failed_publications(self, predicate: Callable[[dict], bool]) -> List[dict]: ...
+    def get_ledger_entry(self, meme_id: int) -> Optional[dict]: ...
+    def put_ledger_entry(self, meme_id: int, state: str, ts: float, message_id: Optional[int] = None) -> None: ...
+    def delete_ledger_entry(self, meme_id: int) -> None: ...
+    def compact_ledger(self, cutoff: float) -> int: ...
+    def append_vote_history(self, events: Iterable["VoteEvent"]) -> None: ...
+    def load_vote_history(self, flt: "EventFilter") -> List["VoteEvent"]: ...
+
+
+class SharedStorage(QueueStorage, Protocol):
+    """Хранилище, которое делят несколько процессов бота (MULTI_INSTANCE).
+
+    Всё, что в одиночном режиме живёт в памяти процесса, здесь читается и
+    пишется построчно: аренда лидера, выдача meme_id, claim финализации,
+    свежие данные автора, выбор способа публикации, очередь публикации.
+    """
+
+    def acquire_lease(self, name: str, holder: str, ttl_sec: float) -> bool: ...
+    def release_lease(self, name: str, holder: str) -> None: ...
+    def next_meme_id(self) -> int: ...
+    def claim_pending(self, meme_id: int) -> bool: ...
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]: ...
+    def put_publish_choice(self, user_id: int, choice: str, expires_at: datetime) -> None: ...
+    def get_publish_choice(self, user_id: int) -> Optional[tuple]: ...
+    def append_publication(self, entry: dict) -> None: ...
+    def update_publication(self, entry: dict) -> None: ...
+    def delete_publication(self, meme_id: int) -> None: ...
+    def set_last_published_time(self, value: datetime) -> None: ...
+    def queue_version(self) -> int: ...
+
+
+class JsonStorage:
+    """Дефолтный backend: JSON-файлы из constants (функции этого модуля).
+
+    Транзакций нет — файлы пишутся последовательно, каждый атомарно.
+    """
+
+    def transaction(self) -> ContextManager[None]:
+        return nullcontext()
+
+    def load_meme_counter(self) -> int:
+        return load_meme_counter()
+
+    def save_meme_counter(self, counter: int) -> None:
+        save_meme_counter(counter)
+
+    def load_user_data(self) -> Dict[str, Dict[str, Any]]:
+        return load_user_data()
+
+    def save_user_data(self, data) -> List[str]:
+        return save_user_data(data)
+
+    def load_candidates(self) -> list:
+        return load_candidates()
+
+    def add_candidate(self, user_id: int, username, first_name, ts: str) -> bool:
+        return add_candidate(user_id, username, first_name, ts)
@@ -1,9 +1,9 @@
-from typing import Union
+from typing import List, Optional, Sequence, Tuple, Union
 
 from aiogram import Bot
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
 
-from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.message_snapshot import MediaItem, MessageSnapshot
 from kartoshka.models import Meme
 
 
@@ -24,7 +24,21 @@ async def send_media_message(
     caption = caption or ""
 
     ctype = content.content_type
-    if ctype == "photo":
+    if content.is_media_group:
+        if reply_markup is None:
+            # Подпись альбома — на первом элементе: так Telegram показывает её под всем альбомом.
+            items = [(item, caption if i == 0 else None) for i, item in enumerate(content.items)]
+            sent = await send_media_group(telegram_bot, chat_id, items)
+            return sent[0]
+        # К альбому клавиатуру не приложить: кнопки и подпись — ответом на него.
+        sent = await send_media_group(telegram_bot, chat_id, [(item, None) for item in content.items])
+        return await telegram_bot.send_message(
+            chat_id=chat_id,
+            text=caption,
+            reply_markup=reply_markup,
+            reply_to_message_id=sent[0].message_id,
+        )
+    elif ctype == "photo":
         return await telegram_bot.send_photo(
             chat_id=chat_id,
             photo=content.photo_file_id,
@@ -66,9 +80,42 @@ async def send_media_message(
         )
 
 
+def album_items(content: MessageSnapshot) -> List[MediaItem]:
+    """Элементы, которыми снимок ложится в альбом (пусто — в альбом не годится)."""
+    if content.is_media_group:
+        return list(content.items)
+    if content.content_type == "photo" and content.photo_file_id:
+        return [MediaItem("photo", content.photo_file_id)]
+    if content.content_type == "video" and content.video_file_id:
+        return [MediaItem("video", content.video_file_id)]
+    return []
+
+
+def build_input_media(item: MediaItem, caption: Optional[str] = None):
+    """Элемент альбома для sendMediaGroup."""
+    if item.content_type == "photo":
+        return InputMediaPhoto(media=item.file_id, caption=caption or None)
+    if item.content_type == "video":
+        return InputMediaVideo(media=item.file_id, caption=caption or None)
+    raise ValueError(f"{item.content_type!r} не отправить альбомом")
+
+
+async def send_media_group(
+    telegram_bot: Bot,
+    chat_id: int,
+    items: Sequence[Tuple[MediaItem, Optional[str]]],
+) -> List:
+    """Отправляет (элемент, подпись) одним альбомом — один вызов API вместо N.
+
+    Возвращает сообщения альбома по порядку.
+    """
+    media = [build_input_media(item, caption) for item, caption in items]
+    return await telegram_bot.send_media_group(chat_id=chat_id, media=media)
+
+
 def build_mod_keyboard(meme: Meme, mod_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для модератора mod_id: выбранная кнопка с «➤»."""
-    vote = meme.votes.get(str(mod_id))
+    vote = meme.get_vote(mod_id)
     actions = [
         ("approve", "✅Одбр."),
         ("urgent", "⚡Срч."),
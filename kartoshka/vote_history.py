@@ -0,0 +1,130 @@
+"""История голосов модераторов для аудита: кто, как и когда голосовал.
+
+Голос в Meme перезаписывает прежний, а WAL модерации компактируется в
+снапшот — ни там, ни там смены голоса не видно. История — append-only:
+каждый учтённый голос (в том числе передумавший) дописывается событием.
+
+Формат — записи фиксированной длины (struct RECORD, 21 байт): meme_id,
+ID модератора, время (секунды epoch) и код голоса (kartoshka.models.VOTE_NAMES).
+Дописывается пачкой вместе с записями лога модерации (group commit), не в
+callback'е голосования. Обрезок последней записи после kill -9 при чтении
+пропускается, а следующей записью — отрезается.
+
+В SQLite-хранилище история — таблица vote_history, формат событий тот же.
+"""
+import logging
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from kartoshka.models import VOTE_CODES, VOTE_NAMES
+
+RECORD = struct.Struct("<qqIB")
+# Сколько записей читаем за раз при поиске.
+READ_CHUNK_RECORDS = 4096
+
+
+class VoteEvent(NamedTuple):
+    meme_id: int
+    editor_id: int
+    vote: str
+    at: datetime
+
+
+def event_from_record(record: dict) -> Optional[VoteEvent]:
+    """Событие из записи лога модерации {"op": "vote", ...}; None — записать нельзя."""
+    try:
+        return VoteEvent(
+            meme_id=int(record["id"]),
+            editor_id=int(record["by"]),
+            vote=VOTE_NAMES[VOTE_CODES[record["v"]]],
+            at=datetime.fromtimestamp(record["at"], timezone.utc),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        logging.error(f"Голос {record!r} не попал в историю голосов: {e!r}")
+        return None
+
+
+class EventFilter(NamedTuple):
+    meme_id: Optional[int] = None
+    editor_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def matches(self, event: VoteEvent) -> bool:
+        return (
+            (self.meme_id is None or event.meme_id == self.meme_id)
+            and (self.editor_id is None or event.editor_id == self.editor_id)
+            and (self.since is None or event.at >= self.since)
+            and (self.until is None or event.at < self.until)
+        )
+
+    @classmethod
+    def parse(cls, tokens: List[str]) -> "EventFilter":
+        """Разбирает аргументы админ-команды: «12 by=111 since=2025-01-31».
+
+        Бросает ValueError на непонятном аргументе.
+        """
+        options = {}
+        for token in tokens:
+            key, sep, value = token.partition("=")
+            if not sep:
+                options["meme_id"] = int(token)
+            elif key == "by":
+                options["editor_id"] = int(value)
+            elif key in ("since", "until"):
+                options[key] = _parse_date(value)
+            else:
+                raise ValueError(f"неизвестный фильтр {key!r}")
+        return cls(**options)
+
+
+def _parse_date(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+class VoteHistory:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append_many(self, events: Iterable[VoteEvent]) -> None:
+        """Дописывает события одним write + fsync."""
+        payload = b"".join(
+            RECORD.pack(e.meme_id, e.editor_id, int(e.at.timestamp()), VOTE_CODES[e.vote]) for e in events
+        )
+        if not payload:
+            return
+        with self.lock:
+            with open(self.path, "ab") as f:
+                # Хвост после kill -9 посреди write выравниваем, чтобы новые записи
+                # не съехали относительно границ старых.
+                torn = f.tell() % RECORD.size
+                if torn:
+                    f.truncate(f.tell() - torn)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def events(self, flt: EventFilter = EventFilter()) -> Iterator[VoteEvent]:
+        """События по порядку записи, подходящие под фильтр."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            while True:
+                chunk = f.read(RECORD.size * READ_CHUNK_RECORDS)
+                whole = len(chunk) - len(chunk) % RECORD.size
+                for meme_id, editor_id, at, code in RECORD.iter_unpack(chunk[:whole]):
+                    if flt.meme_id is not None and meme_id != flt.meme_id:
+                        continue
+                    event = VoteEvent(meme_id, editor_id, VOTE_NAMES[code], datetime.fromtimestamp(at, timezone.utc))
+                    if flt.matches(event):
+                        yield event
+                if len(chunk) < RECORD.size * READ_CHUNK_RECORDS:
+                    return
+
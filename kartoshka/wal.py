@@ -0,0 +1,125 @@
+"""Append-only лог JSON-записей (write-ahead log) поверх обычного файла.
+
+Одна мутация = одна компактная JSON-строка + fsync: O(1) на запись вместо
+перезаписи всего снапшота. Снапшот (обычный JSON-файл) периодически
+перезаписывается целиком, после чего уже учтённый префикс лога отрезается.
+
+Недописанная последняя строка (kill -9 посреди write) отрезается перед
+следующим append'ом: иначе первая новая запись склеилась бы с обрезком в
+одну битую строку и пропала бы при replay.
+
+Запись и компакция сериализуются threading.Lock'ом: append может идти из
+worker-треда (asyncio.to_thread), а компакция — из фонового таска.
+"""
+import json
+import logging
+import os
+import threading
+from typing import BinaryIO, Iterator, List
+
+# Сколько байт за раз читать с конца файла в поисках последнего '\n'.
+TAIL_CHUNK = 4096
+
+
+class AppendLog:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, record: dict) -> None:
+        self.append_many([record])
+
+    def append_many(self, records: List[dict]) -> None:
+        """Дописывает записи одним write + одним fsync (group commit)."""
+        if not records:
+            return
+        payload = "".join(_dumps_line(r) for r in records).encode("utf-8")
+        with self.lock:
+            with open(self.path, "a+b") as f:
+                _drop_torn_tail(f, self.path)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def size(self) -> int:
+        """Текущая длина лога в байтах (0, если файла нет)."""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def replay(self) -> Iterator[dict]:
+        """Читает записи по порядку.
+
+        Битая строка (обрезок после kill -9 посреди write, ещё не отрезанный
+        append'ом) пропускается с логом: всё, что было до неё, уже
+        зафиксировано fsync'ом.
+        """
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.error(f"Пропущена битая запись лога {self.path}:{lineno}")
+
+    def drop_prefix(self, offset: int) -> None:
+        """Отрезает первые offset байт (уже попавшие в снапшот).
+
+        Хвост, дописанный после снятия offset, переносится в новый файл —
+        записи, сделанные во время компакции, не теряются. Вызывать под self.lock.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                tail = f.read()
+        except FileNotFoundError:
+            return
+        if not tail:
+            os.unlink(self.path)
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def rewrite(self, records: List[dict]) -> None:
+        """Атомарно заменяет лог набором records (компакция лога, у которого
+        нет отдельного снапшота). Вызывать под self.lock."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(_dumps_line(r) for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def _drop_torn_tail(f: BinaryIO, path: str) -> None:
+    """Обрезает файл до последнего '\n', если последняя строка не дописана."""
+    end = pos = f.seek(0, os.SEEK_END)
+    cut = 0
+    while pos > 0:
+        start = max(0, pos - TAIL_CHUNK)
+        f.seek(start)
+        chunk = f.read(pos - start)
+        newline = chunk.rfind(b"\n")
+        if newline >= 0:
+            cut = start + newline + 1
+            break
+        pos = start
+    if cut == end:
+        return
+    logging.error(f"Отрезан недописанный хвост лога {path}: {end - cut} байт")
+    f.truncate(cut)
+
+
+def _dumps_line(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
@@ -0,0 +1,141 @@
+"""Приём апдейтов через webhook (aiohttp) — альтернатива long polling.
+
+Telegram POST'ит апдейт на WEBHOOK_PATH с заголовком
+X-Telegram-Bot-Api-Secret-Token; чужие запросы отбиваются 401. Апдейт
+кладётся в ограниченную очередь, и Telegram сразу получает 200 — обработку
+ведут queue_workers воркеров. Очередь полна — отвечаем 503, Telegram
+повторит доставку позже (так мы не копим неограниченный backlog в памяти).
+
+Остановка: сначала перестаём принимать (503), затем дожидаемся, пока воркеры
+разберут очередь и доиграют начатые хендлеры (не дольше drain_timeout), и
+только потом закрываем сервер.
+
+Локальная проверка — POST записанного апдейта:
+    curl -X POST localhost:8080/webhook \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+import asyncio
+import hmac
+import logging
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DEFAULT_QUEUE_SIZE = 1000
+# Воркеры приёма только передают апдейт в dispatcher: параллельность хендлеров
+# ограничивает KeyedDispatcher, а здесь нужен запас на апдейты, ждущие свой ключ.
+DEFAULT_WORKERS = 64
+DEFAULT_DRAIN_TIMEOUT_SEC = 30.0
+
+
+class WebhookServer:
+    """aiohttp-приложение + очередь апдейтов + пул воркеров."""
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        secret: str,
+        path: str = "/webhook",
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        workers: int = DEFAULT_WORKERS,
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.path = path
+        self.queue_workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        # compare_digest: время сравнения не подсказывает, сколько символов совпало.
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return web.Response(status=401)
+        if not self._accepting:
+            return web.Response(status=503, text="shutting down")
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logging.error(f"Webhook: не удалось разобрать апдейт: {e}")
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logging.warning(f"Webhook: очередь апдейтов полна ({self.queue.maxsize}), апдейт {update.update_id} отклонён")
+            return web.Response(status=503, text="queue full")
+        return web.Response()
+
+    def start(self) -> None:
+        """Запускает воркеров и открывает приём апдейтов."""
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+            for i in range(self.queue_workers)
+        ]
+        self._accepting = True
+
+    async def drain(self, timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT_SEC) -> None:
+        """Закрывает приём и ждёт, пока очередь и начатые хендлеры доработают."""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Webhook: за {timeout} с не разобрано {self.queue.qsize()} апдейтов, бросаем")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logging.exception(f"Webhook: ошибка обработки апдейта {update.update_id}")
+            finally:
+                self.queue.task_done()
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str,
+    secret: str,
+    stop: asyncio.Event,
+    path: str = "/webhook",
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    reuse_port: bool = False,
+) -> None:
+    """Регистрирует webhook в Telegram и обслуживает его, пока не выставлен stop."""
+    server = WebhookServer(dp, bot, secret, path=path, queue_size=queue_size, workers=workers)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, reuse_port=reuse_port or None)
+    await site.start()
+    server.start()
+    try:
+        await bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info(f"Webhook слушает {host}:{port}{path}")
+        await stop.wait()
+    finally:
+        await server.drain()
+        await runner.cleanup()
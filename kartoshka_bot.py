@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 
 from kartoshka.main import main
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Картошка-бот")
+    parser.add_argument(
+        "--mode", choices=("polling", "webhook"), default="polling",
+        help="как получать апдейты: long polling (по умолчанию) или webhook",
+    )
+    asyncio.run(main(parser.parse_args().mode))
@@ -101,6 +101,8 @@ Group=$GROUP
 WorkingDirectory=$PROJECT_DIR
 EnvironmentFile=$ENV_FILE
 ExecStart=$VENV_DIR/bin/python3 $BOT_SCRIPT
+# systemctl reload: перечитать .env без рестарта (EDITOR_IDS, VOTES_TO_*, POST_FREQUENCY_MINUTES)
+ExecReload=/bin/kill -HUP \$MAINPID
 Restart=always
 RestartSec=5
 StandardOutput=journal
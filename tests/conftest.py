@@ -1,9 +1,9 @@
 """Shared pytest setup: env + изоляция JSON-storage от боевых файлов."""
 import os
 
-# env-переменные ставим ДО любого импорта kartoshka.* — config валидирует их
-# на module load. Порядок загрузки тестовых модулей алфавитный, поэтому
-# без conftest один файл мог перехватить env до другого.
+# env-переменные ставим до первого обращения к kartoshka.config: Settings
+# читаются из env один раз и кэшируются. Порядок загрузки тестовых модулей
+# алфавитный, поэтому без conftest один файл мог перехватить env до другого.
 os.environ.setdefault("BOT_TOKEN", "123:dummy")
 os.environ.setdefault("EDITOR_IDS", "111,222,333")
 os.environ.setdefault("PUBLISH_CHAT_ID", "12345")
@@ -23,7 +23,7 @@ def _stable_config():
     """Защита от гонок env: закрепляем config-значения на время теста.
 
     - CI workflow ставит VOTES_TO_*=3, локальный env из conftest — 2.
-    - Некоторые тесты патчат importlib.reload(config), что сдвигает значения.
+    - Некоторые тесты перечитывают настройки из своего env, что сдвигает значения.
     Фиксируем stable-набор для всех тестов; кому надо другое — патчит поверх.
     """
     with _patch("kartoshka.config.VOTES_TO_APPROVE", 2), \
@@ -47,12 +47,29 @@ def isolate_json_storage(tmp_path, monkeypatch):
     # storage.py импортирует имена на уровне модуля
     monkeypatch.setattr("kartoshka.storage.COUNTER_FILE", counter)
     monkeypatch.setattr("kartoshka.storage.USER_DATA_FILE", user_data)
+    monkeypatch.setattr("kartoshka.storage.USER_DATA_LOG_FILE", str(tmp_path / "user_data.wal"))
     monkeypatch.setattr("kartoshka.storage.CANDIDATES_FILE", str(tmp_path / "candidates.json"))
 
     # Scheduler использует class attrs
     monkeypatch.setattr("kartoshka.scheduler.Scheduler.MODERATION_FILE", moderation)
+    monkeypatch.setattr(
+        "kartoshka.scheduler.Scheduler.MODERATION_LOG_FILE",
+        str(tmp_path / "moderation_queue.wal"),
+    )
     monkeypatch.setattr("kartoshka.scheduler.Scheduler.PUBLICATION_FILE", publication)
     monkeypatch.setattr(
         "kartoshka.scheduler.Scheduler.FAILED_PUBLICATIONS_FILE",
         str(tmp_path / "failed_publications.json"),
     )
+    monkeypatch.setattr(
+        "kartoshka.scheduler.Scheduler.DEAD_LETTER_FILE",
+        str(tmp_path / "failed_publications.jsonl"),
+    )
+    monkeypatch.setattr(
+        "kartoshka.scheduler.Scheduler.PUBLISH_LEDGER_FILE",
+        str(tmp_path / "publish_ledger.jsonl"),
+    )
+    monkeypatch.setattr(
+        "kartoshka.scheduler.Scheduler.VOTE_HISTORY_FILE",
+        str(tmp_path / "vote_history.bin"),
+    )
@@ -0,0 +1,80 @@
+"""Перерисовка клавиатур пачкой: параллельно, сбои — одной строкой лога."""
+import asyncio
+import logging
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from kartoshka import notifications
+from kartoshka.handlers.moderation import _finalize_meme
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.state import AppState
+
+
+def _meme(mod_messages, user_messages=()):
+    snap = MessageSnapshot(content_type="text", text="x")
+    meme = Meme(meme_id=1, user_id=7, publish_choice="user", content=snap)
+    meme.mod_messages = list(mod_messages)
+    meme.user_messages = list(user_messages)
+    return meme
+
+
+class SlowBot:
+    """edit_message_reply_markup с фиксированной задержкой; чаты из fail падают."""
+
+    def __init__(self, delay=0.05, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.edited = []
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup):
+        await asyncio.sleep(self.delay)
+        if chat_id in self.fail:
+            raise RuntimeError("message to edit not found")
+        self.edited.append((chat_id, message_id))
+
+
+@pytest.mark.asyncio
+async def test_mod_edits_run_concurrently():
+    bot = SlowBot()
+    meme = _meme([(cid, 100 + cid) for cid in range(10)])
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await notifications.update_mod_messages_with_resolution(bot, meme, "✅ Одбр.")
+
+    assert loop.time() - started < 0.2  # не 10 × 0.05
+    assert sorted(bot.edited) == sorted(meme.mod_messages)
+
+
+@pytest.mark.asyncio
+async def test_failures_reported_in_one_line(caplog):
+    bot = SlowBot(delay=0, fail={2, 3})
+    meme = _meme([(1, 11), (2, 12), (3, 13)])
+
+    with caplog.at_level(logging.ERROR):
+        failed = await notifications.edit_reply_markups(bot, meme.mod_messages, MagicMock(), "редактора")
+
+    assert [r.target for r in failed] == [(2, 12), (3, 13)]
+    errors = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert len(errors) == 1
+    assert "(2 из 3)" in errors[0].getMessage()
+    assert bot.edited == [(1, 11)]
+
+
+@pytest.mark.asyncio
+async def test_finalize_updates_author_and_editors_in_one_round_trip():
+    bot = SlowBot(delay=0.05)
+    scheduler = MagicMock()
+    scheduler.schedule = AsyncMock()
+    state = AppState(bot=bot, scheduler=scheduler, persist_window_sec=0)
+    meme = _meme([(111, 1), (222, 2), (333, 3)], user_messages=[(7, 9)])
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await _finalize_meme(meme, "approve", state)
+
+    assert loop.time() - started < 0.095  # одна задержка, а не две подряд
+    assert sorted(bot.edited) == [(7, 9), (111, 1), (222, 2), (333, 3)]
+    scheduler.resolve.assert_called_once_with(1)
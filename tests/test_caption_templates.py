@@ -0,0 +1,59 @@
+"""Шаблоны подписей: экранирование, кэш на снимке и лимиты Telegram."""
+from kartoshka import captions
+from kartoshka.captions import CAPTION_LIMIT, TEXT_LIMIT, Template, truncate, visible_len
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+
+
+def _snap(**kwargs):
+    fields = {"content_type": "photo", "photo_file_id": "f", "from_user_id": 7}
+    fields.update(kwargs)
+    return MessageSnapshot(**fields)
+
+
+def test_optional_field_drops_with_separator():
+    t = Template("Мем от {author}\n\n{text?}")
+    assert t.render(author="a", text="") == "Мем от a"
+    assert t.render(author="a", text="x") == "Мем от a\n\nx"
+
+
+def test_fields_are_escaped_once_and_cached_on_snapshot():
+    snap = _snap(caption="<b>жирно</b> & всё", from_user_username="<u>")
+    caption = captions.public_caption(snap, "user", 1)
+    assert caption == "Мем от пользователя @&lt;u&gt;\n\n&lt;b&gt;жирно&lt;/b&gt; &amp; всё"
+    assert snap.html_text is snap.html_text
+    # Кэш не меняет ни формат на диске, ни равенство снимков.
+    assert snap.to_dict() == _snap(caption="<b>жирно</b> & всё", from_user_username="<u>").to_dict()
+    assert snap == _snap(caption="<b>жирно</b> & всё", from_user_username="<u>")
+
+
+def test_long_caption_fits_limit_and_keeps_markup():
+    text = ("слово & <тег> " * 200).strip()
+    caption = Meme(1, 7, "potato", _snap(caption=text)).get_caption()
+    assert caption.startswith("<tg-spoiler>Мем от Анонимной ") and "</tg-spoiler>\n\n" in caption
+    assert caption.endswith("…")
+    visible = caption.replace("<tg-spoiler>", "").replace("</tg-spoiler>", "")
+    visible = visible.replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+    assert visible_len(visible) <= CAPTION_LIMIT
+    # Сущности не разрезаны: после последнего & — целая сущность.
+    assert caption[caption.rfind("&"):].split(";")[0] in ("&amp", "&lt", "&gt")
+
+
+def test_text_messages_get_the_larger_limit():
+    snap = MessageSnapshot(content_type="text", text="я " * 3000, from_user_id=7)
+    caption = captions.public_caption(snap, "user", 1)
+    assert CAPTION_LIMIT < visible_len(caption) <= TEXT_LIMIT
+
+
+def test_truncate_prefers_word_boundary_and_counts_utf16():
+    assert truncate("один два три", 9) == "один два…"
+    assert truncate("коротко", 100) == "коротко"
+    assert visible_len("😀" * 10) == 20
+    assert visible_len(truncate("😀" * 10, 7)) <= 7
+
+
+def test_moderator_caption_escapes_user_text():
+    snap = _snap(caption="<i>x</i>")
+    text = captions.moderator_caption(snap, 5, "potato", captions.ANONYMOUS_AUTHOR)
+    assert text == "Мем ID: 5\n\n&lt;i&gt;x&lt;/i&gt;\n\nОт: Картошка\nПубликация как: potato"
+    assert "[Без текста]" in captions.moderator_caption(_snap(), 6, "user", "7")
@@ -0,0 +1,131 @@
+"""Догон очереди публикации после простоя: политики, альбомы, прогноз."""
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from kartoshka.catchup import COMPRESS, KEEP, MEDIA_GROUP, CatchUpPolicy, plan_catch_up
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.scheduler import Scheduler
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+def _entry(meme_id, at, content_type="photo"):
+    if content_type == "text":
+        snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}")
+    else:
+        snap = MessageSnapshot(content_type=content_type, **{f"{content_type}_file_id": f"file{meme_id}"})
+    meme = Meme(meme_id=meme_id, user_id=None, publish_choice="potato", content=snap)
+    return {"scheduled_time": at.isoformat(), "meme": meme.to_publication_dict()}
+
+
+def _times(entries):
+    return [datetime.fromisoformat(e["scheduled_time"]) for e in entries]
+
+
+def test_keep_respaces_from_last_post_and_pushes_future_entries():
+    entries = [_entry(i, NOW - (10 - i) * HOUR) for i in range(3)] + [_entry(3, NOW + HOUR / 2)]
+    plan = plan_catch_up(entries, NOW, NOW - HOUR / 4, HOUR, CatchUpPolicy(KEEP))
+
+    assert _times(entries) == [NOW + HOUR * 3 / 4, NOW + HOUR * 7 / 4, NOW + HOUR * 11 / 4, NOW + HOUR * 15 / 4]
+    assert (plan.overdue, plan.posts, plan.drain_at) == (3, 3, NOW + HOUR * 11 / 4)
+
+
+def test_compress_and_drop_old_entries():
+    entries = [_entry(1, NOW - 30 * HOUR)] + [_entry(i, NOW - HOUR * i) for i in (2, 3, 4)]
+    policy = CatchUpPolicy(COMPRESS, min_interval=timedelta(minutes=5), drop_older_than=24 * HOUR)
+    plan = plan_catch_up(entries, NOW, None, HOUR, policy)
+
+    assert [e["meme"]["meme_id"] for e in plan.dropped] == [1]
+    assert sorted(_times(entries[1:])) == [NOW, NOW + timedelta(minutes=5), NOW + timedelta(minutes=10)]
+    assert plan.drain_at == NOW + timedelta(minutes=10)
+
+
+def test_media_group_packs_consecutive_photos_and_videos():
+    kinds = ["photo"] * 11 + ["text", "video", "video"]
+    entries = [_entry(i, NOW - HOUR + timedelta(minutes=i), kind) for i, kind in enumerate(kinds)]
+    plan = plan_catch_up(entries, NOW, None, HOUR, CatchUpPolicy(MEDIA_GROUP))
+
+    assert (plan.overdue, plan.posts, plan.albums) == (14, 4, 2)
+    assert entries[0]["album"] == list(range(10)) and "album" not in entries[10]
+    assert entries[12]["album"] == [12, 13]
+    assert len(set(_times(entries[:10]))) == 1
+    assert plan.drain_at == NOW + 3 * HOUR
+
+    # Без on_publish_album альбомы не собираются.
+    entries = [_entry(i, NOW - HOUR + timedelta(minutes=i), kind) for i, kind in enumerate(kinds)]
+    plan = plan_catch_up(entries, NOW, None, HOUR, CatchUpPolicy(MEDIA_GROUP), albums=False)
+    assert plan.albums == 0 and not any("album" in e for e in entries)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        CatchUpPolicy("burst")
+
+
+def test_start_drops_stale_entries_and_reports_drain_time(caplog):
+    now = datetime.now(timezone.utc)
+    first = Scheduler(post_frequency_minutes=60)
+    first.scheduled_posts = [_entry(1, now - 48 * HOUR), _entry(2, now - 2 * HOUR)]
+    first.last_published_time = now - 3 * HOUR
+    first.save_publication()
+    with open(Scheduler.PUBLICATION_FILE, encoding="utf-8") as f:
+        saved = f.read()
+
+    s = Scheduler(post_frequency_minutes=60, catch_up=CatchUpPolicy(drop_older_than=24 * HOUR))
+    # Загрузка ничего не меняет: догоняет только явный catch_up_on_start().
+    assert len(s.scheduled_posts) == 2 and s.dead_letter_entries() == []
+    with open(Scheduler.PUBLICATION_FILE, encoding="utf-8") as f:
+        assert f.read() == saved
+
+    with caplog.at_level(logging.INFO):
+        s.catch_up_on_start()
+
+    assert [e["meme"]["meme_id"] for e in s.scheduled_posts] == [2]
+    [dead] = s.dead_letter_entries()
+    assert dead["meme"]["meme_id"] == 1 and dead["last_error"] == "expired"
+    assert "Последний выйдет" in caplog.text
+    # Новое расписание сохранено: повторный старт ничего не выбрасывает.
+    assert [e["meme"]["meme_id"] for e in Scheduler(post_frequency_minutes=60).scheduled_posts] == [2]
+
+
+@pytest.mark.asyncio
+async def test_album_is_published_once_and_recorded_per_meme():
+    albums = []
+
+    async def on_publish_album(memes):
+        albums.append([m.meme_id for m in memes])
+        for i, meme in enumerate(memes):
+            meme.published_message_id = 100 + i
+        return True
+
+    s = Scheduler(post_frequency_minutes=60, on_publish_album=on_publish_album)
+    s.scheduled_posts = [_entry(i, NOW - HOUR) for i in (1, 2, 3)]
+    s.catch_up_policy = CatchUpPolicy(MEDIA_GROUP)
+    s.catch_up(NOW)
+
+    await s._publish_due_entry(s.scheduled_posts.peek(), NOW)
+
+    assert albums == [[1, 2, 3]]
+    assert s.scheduled_posts == []
+    assert s.ledger.get(3)["message_id"] == 102
+
+
+@pytest.mark.asyncio
+async def test_failed_album_dissolves_into_single_retries():
+    async def on_publish_album(memes):
+        return False
+
+    s = Scheduler(post_frequency_minutes=60, on_publish_album=on_publish_album)
+    s.scheduled_posts = [_entry(i, NOW - HOUR) for i in (1, 2)]
+    s.catch_up_policy = CatchUpPolicy(MEDIA_GROUP)
+    s.catch_up(NOW)
+
+    await s._publish_due_entry(s.scheduled_posts.peek(), NOW)
+
+    assert len(s.scheduled_posts) == 2
+    assert all("album" not in e and e["attempts"] == 1 and "retry_at" in e for e in s.scheduled_posts)
+    assert s.ledger.get(1) is None
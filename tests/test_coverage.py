@@ -51,7 +51,7 @@ def test_storage_save_meme_counter_roundtrip(tmp_path, monkeypatch):
 def test_storage_save_meme_counter_exception(monkeypatch, caplog):
     monkeypatch.setattr(storage, "COUNTER_FILE", "/nonexistent_dir_xyz/file.json")
     import logging
-    with caplog.at_level(logging.ERROR):
+    with caplog.at_level(logging.ERROR), pytest.raises(OSError):
         storage.save_meme_counter(1)
     assert "Ошибка при сохранении счетчика" in caplog.text
 
@@ -89,7 +89,7 @@ def test_storage_load_user_data_corrupt(tmp_path, monkeypatch, caplog):
 def test_storage_save_user_data_exception(monkeypatch, caplog):
     monkeypatch.setattr(storage, "USER_DATA_FILE", "/nonexistent_xyz/user.json")
     import logging
-    with caplog.at_level(logging.ERROR):
+    with caplog.at_level(logging.ERROR), pytest.raises(OSError):
         storage.save_user_data({"1": {"last_submission": None, "rejections": 0, "ban_until": None}})
     assert "Ошибка при сохранении данных пользователей" in caplog.text
 
@@ -271,8 +271,8 @@ def test_scheduler_load_moderation_roundtrip(tmp_path, monkeypatch):
     assert s2.pending_memes[1].publish_choice == "user"
 
 
-def test_scheduler_load_publication_reschedules_past_entries(tmp_path, monkeypatch):
-    """Если загруженные scheduled_posts в прошлом — пересчитываются относительно now."""
+def test_scheduler_catch_up_on_start_reschedules_past_entries(tmp_path, monkeypatch):
+    """Если загруженные scheduled_posts в прошлом — при старте пересчитываются относительно now."""
     mod_path = tmp_path / "mod.json"
     pub_path = tmp_path / "pub.json"
     past = datetime.now(timezone.utc) - timedelta(days=2)
@@ -284,6 +284,8 @@ def test_scheduler_load_publication_reschedules_past_entries(tmp_path, monkeypat
     monkeypatch.setattr(Scheduler, "PUBLICATION_FILE", str(pub_path))
 
     s = Scheduler(post_frequency_minutes=5)
+    assert s.scheduled_posts[0]["scheduled_time"] == past.isoformat()
+    s.catch_up_on_start()
     assert len(s.scheduled_posts) == 1
     scheduled_time = datetime.fromisoformat(s.scheduled_posts[0]["scheduled_time"])
     assert scheduled_time >= datetime.now(timezone.utc) - timedelta(seconds=1)
@@ -474,7 +476,7 @@ async def test_finalize_silent_loss_keeps_meme(tmp_path, monkeypatch):
     meme = _make_meme(1)
     meme.finalized = True  # caller уже поставил claim
 
-    with patch("kartoshka.handlers.moderation.save_user_data"), \
+    with patch("kartoshka.storage.save_user_data"), \
          patch("kartoshka.notifications.publish_meme", AsyncMock(return_value=False)):
         await moderation_module._finalize_meme(meme, "urgent", state)
 
@@ -489,7 +491,7 @@ async def test_increment_ban_send_failure_logged(caplog):
     bot.send_message = AsyncMock(side_effect=Exception("user blocked"))
     state = AppState(bot=bot, scheduler=MagicMock())
 
-    with patch("kartoshka.handlers.moderation.save_user_data"):
+    with patch("kartoshka.storage.save_user_data"):
         # 3 rejections подряд → должен сработать ban-notification
         state.user_data["7"] = {"last_submission": None, "rejections": 2, "ban_until": None}
         import logging
@@ -554,13 +556,14 @@ async def test_submit_send_media_failure_logged(caplog):
     msg.text = "hi"
     msg.caption = None
     msg.content_type = "text"
+    msg.media_group_id = None
     msg.from_user = SimpleNamespace(id=7, username="u", first_name="U")
     msg.chat = SimpleNamespace(id=7)
     msg.message_id = 50
     msg.answer = AsyncMock(return_value=SimpleNamespace(message_id=51))
 
-    with patch("kartoshka.handlers.submit.save_user_data"), \
-         patch("kartoshka.handlers.submit.save_meme_counter"), \
+    with patch("kartoshka.storage.save_user_data"), \
+         patch("kartoshka.storage.save_meme_counter"), \
          patch("kartoshka.handlers.submit.send_media_message",
                AsyncMock(side_effect=Exception("editor offline"))):
         import logging
@@ -607,13 +610,14 @@ async def test_submit_potato_anonymous_no_user_message_widget():
     msg.text = None
     msg.caption = "anon meme"
     msg.content_type = "text"
+    msg.media_group_id = None
     msg.from_user = SimpleNamespace(id=7, username=None, first_name=None)
     msg.chat = SimpleNamespace(id=7)
     msg.message_id = 1
     msg.answer = AsyncMock(return_value=SimpleNamespace(message_id=2))
 
-    with patch("kartoshka.handlers.submit.save_user_data"), \
-         patch("kartoshka.handlers.submit.save_meme_counter"), \
+    with patch("kartoshka.storage.save_user_data"), \
+         patch("kartoshka.storage.save_meme_counter"), \
          patch("kartoshka.handlers.submit.send_media_message",
                AsyncMock(return_value=SimpleNamespace(message_id=777))):
         await handle_meme(msg)
@@ -729,7 +733,7 @@ async def test_crypto_reject_path_in_callback():
     # На CI VOTES_TO_REJECT=3 по workflow-env, патчим в 2 явно.
     with patch("kartoshka.config.CRYPTOSELECTARCHY", True), \
          patch("kartoshka.config.VOTES_TO_REJECT", 2), \
-         patch("kartoshka.handlers.moderation.save_user_data"), \
+         patch("kartoshka.storage.save_user_data"), \
          patch("kartoshka.notifications.update_user_messages_with_status", AsyncMock()), \
          patch("kartoshka.notifications.update_mod_messages_with_resolution", AsyncMock()):
         for mod_id in (111, 222):
@@ -774,6 +778,7 @@ async def test_submit_user_without_username_shows_id():
     msg.text = "x"
     msg.caption = None
     msg.content_type = "text"
+    msg.media_group_id = None
     msg.from_user = SimpleNamespace(id=99, username=None, first_name="NoUser")
     msg.chat = SimpleNamespace(id=99)
     msg.message_id = 1
@@ -784,8 +789,8 @@ async def test_submit_user_without_username_shows_id():
         sent_calls.append(kw)
         return SimpleNamespace(message_id=777)
 
-    with patch("kartoshka.handlers.submit.save_user_data"), \
-         patch("kartoshka.handlers.submit.save_meme_counter"), \
+    with patch("kartoshka.storage.save_user_data"), \
+         patch("kartoshka.storage.save_meme_counter"), \
          patch("kartoshka.handlers.submit.send_media_message", side_effect=fake_send):
         await handle_meme(msg)
 
@@ -800,12 +805,13 @@ async def test_main_on_publish_closure_invokes_publish_meme():
 
     published = []
 
-    async def fake_publish_meme(bot, meme, chat_id):
+    async def fake_publish_meme(bot, meme, chat_id, raise_errors=False):
+        assert raise_errors  # ошибки нужны scheduler'у для выбора политики повтора
         published.append(meme.meme_id)
 
     captured_callback = {}
 
-    def capture_scheduler(post_frequency_minutes, bot=None, on_publish=None):
+    def capture_scheduler(post_frequency_minutes, bot=None, on_publish=None, **kwargs):
         captured_callback["on_publish"] = on_publish
         scheduler = MagicMock()
         scheduler.get_max_meme_id.return_value = 0
@@ -813,8 +819,8 @@ async def test_main_on_publish_closure_invokes_publish_meme():
 
     with patch("kartoshka.main.Bot") as FakeBot, \
          patch("kartoshka.main.Scheduler", side_effect=capture_scheduler), \
-         patch("kartoshka.main.load_meme_counter", return_value=0), \
-         patch("kartoshka.main.load_user_data", return_value={}), \
+         patch("kartoshka.storage.load_meme_counter", return_value=0), \
+         patch("kartoshka.storage.load_user_data", return_value={}), \
          patch("kartoshka.main.publish_meme", fake_publish_meme):
         FakeBot.return_value = MagicMock()
         build_app_state()
@@ -1267,8 +1273,8 @@ def test_meme_from_dict_potato_no_user_id():
 def test_build_app_state_constructs_everything():
     from kartoshka.main import build_app_state
 
-    with patch("kartoshka.main.load_meme_counter", return_value=5), \
-         patch("kartoshka.main.load_user_data", return_value={"1": {"last_submission": None, "rejections": 0, "ban_until": None}}), \
+    with patch("kartoshka.storage.load_meme_counter", return_value=5), \
+         patch("kartoshka.storage.load_user_data", return_value={"1": {"last_submission": None, "rejections": 0, "ban_until": None}}), \
          patch("kartoshka.main.Bot") as FakeBot, \
          patch("kartoshka.main.Scheduler") as FakeScheduler:
         FakeBot.return_value = MagicMock()
@@ -0,0 +1,146 @@
+"""Dead-letter в JSONL: ротация, фильтры и повтор в очередь публикации."""
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.filters import CommandObject
+
+from kartoshka.dead_letter import DeadLetterFilter, DeadLetterQueue
+from kartoshka.handlers import admin
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.scheduler import Scheduler
+from kartoshka.sqlite_storage import SQLiteStorage
+
+
+def _entry(meme_id, error="publish_failed", dead_at="2026-03-01T12:00:00+00:00"):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}")
+    meme = Meme(meme_id=meme_id, user_id=None, publish_choice="potato", content=snap)
+    return {
+        "scheduled_time": "2026-03-01T11:00:00+00:00",
+        "meme": meme.to_publication_dict(),
+        "attempts": 4,
+        "last_error": error,
+        "dead_at": dead_at,
+    }
+
+
+def test_filter_parse_and_match():
+    flt = DeadLetterFilter.parse(["3", "5", "error=TimeoutError", "since=2026-03-01"])
+    assert flt.matches(_entry(3, error="TimeoutError"))
+    assert not flt.matches(_entry(4, error="TimeoutError"))
+    assert not flt.matches(_entry(5, error="publish_failed"))
+    assert not flt.matches(_entry(5, error="TimeoutError", dead_at="2026-02-28T23:59:00+00:00"))
+    assert DeadLetterFilter().matches({"meme": {}})
+    with pytest.raises(ValueError):
+        DeadLetterFilter.parse(["colour=red"])
+
+
+def test_rotation_keeps_backups_and_order(tmp_path):
+    path = str(tmp_path / "dlq.jsonl")
+    dlq = DeadLetterQueue(path, max_bytes=1, backups=2)
+    for i in range(1, 5):
+        dlq.append({"meme": {"meme_id": i}})
+
+    # Каждая запись переполняет файл: в живых последние две ротации, текущий пуст.
+    assert [e["meme"]["meme_id"] for e in dlq.entries()] == [3, 4]
+    assert not (tmp_path / "dlq.jsonl.3").exists()
+
+    assert dlq.discard(lambda e: e["meme"]["meme_id"] == 3) == 1
+    assert [e["meme"]["meme_id"] for e in dlq.entries()] == [4]
+
+
+@pytest.mark.asyncio
+async def test_replay_requeues_matching_entries_in_one_batch():
+    s = Scheduler(post_frequency_minutes=60)
+    for meme_id, error in [(1, "publish_failed"), (2, "TelegramNetworkError"), (3, "TelegramNetworkError")]:
+        s._append_failed_publication(_entry(meme_id, error))
+    s.ledger.record_intent(2)
+
+    with patch.object(s, "_write_publication", wraps=s._write_publication) as save:
+        replayed = await s.replay_dead_letters(DeadLetterFilter(error="TelegramNetworkError"))
+
+    assert replayed == [2, 3]
+    save.assert_called_once()
+    assert [e["meme"]["meme_id"] for e in s.dead_letter_entries()] == [1]
+    queue = sorted(s.scheduled_posts, key=lambda e: e["scheduled_time"])
+    assert [e["meme"]["meme_id"] for e in queue] == [2, 3]
+    assert "attempts" not in queue[0] and "last_error" not in queue[0]
+    first, second = (datetime.fromisoformat(e["scheduled_time"]) for e in queue)
+    assert second - first >= timedelta(minutes=60)
+    assert s.ledger.get(2) is None  # повтор не упрётся в «прерванную» отметку
+
+    with open(Scheduler.PUBLICATION_FILE, encoding="utf-8") as f:
+        assert len(json.load(f)["queue"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_entries_that_arrive_during_the_write():
+    s = Scheduler(post_frequency_minutes=60)
+    s._append_failed_publication(_entry(1))
+    write = s._write_publication
+
+    def slow_write(data):
+        # Пока очередь пишется в worker-треде, публикация успела упасть ещё раз.
+        s._append_failed_publication(_entry(2))
+        write(data)
+
+    with patch.object(s, "_write_publication", side_effect=slow_write):
+        assert await s.replay_dead_letters() == [1]
+
+    assert [e["meme"]["meme_id"] for e in s.dead_letter_entries()] == [2]
+
+
+@pytest.mark.asyncio
+async def test_replay_from_shared_sqlite(tmp_path):
+    db = SQLiteStorage(str(tmp_path / "k.db"))
+    try:
+        s = Scheduler(post_frequency_minutes=60, storage=db, shared=True)
+        s._append_failed_publication(_entry(7))
+        s._append_failed_publication(_entry(8))
+
+        assert await s.replay_dead_letters(DeadLetterFilter(meme_ids=frozenset({8}))) == [8]
+        assert [e["meme"]["meme_id"] for e in db.load_failed_publications()] == [7]
+        assert [e["meme"]["meme_id"] for e in db.load_publication()["queue"]] == [8]
+    finally:
+        db.close()
+
+
+class RecordingDP:
+    def __init__(self):
+        self.messages = []
+
+    def message(self, *a, **kw):
+        return lambda fn: self.messages.append(fn) or fn
+
+
+@pytest.mark.asyncio
+async def test_admin_commands_are_editor_only():
+    scheduler = MagicMock()
+    scheduler.dead_letter_entries.return_value = [_entry(4, error="TimeoutError")]
+    scheduler.replay_dead_letters = AsyncMock(return_value=[4])
+    dp = RecordingDP()
+    admin.register(dp, SimpleNamespace(scheduler=scheduler))
+    handler = dp.messages[0]
+
+    def message(user_id):
+        return SimpleNamespace(from_user=SimpleNamespace(id=user_id), answer=AsyncMock())
+
+    with patch("kartoshka.config.EDITOR_IDS", [1]):
+        stranger = message(2)
+        await handler(stranger, CommandObject(command="dlq_replay"))
+        stranger.answer.assert_not_awaited()
+        scheduler.replay_dead_letters.assert_not_called()
+
+        editor = message(1)
+        await handler(editor, CommandObject(command="dlq", args="error=TimeoutError"))
+        assert "#4" in editor.answer.await_args.args[0]
+
+        await handler(editor, CommandObject(command="dlq_replay", args="4"))
+        scheduler.replay_dead_letters.assert_called_once_with(DeadLetterFilter(meme_ids=frozenset({4})))
+        assert "4" in editor.answer.await_args.args[0]
+
+        await handler(editor, CommandObject(command="dlq", args="since=вчера"))
+        assert "Не понял фильтр" in editor.answer.await_args.args[0]
@@ -0,0 +1,135 @@
+"""KeyedDispatcher: один ключ — по очереди, разные — параллельно, с backpressure."""
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import CallbackQuery, Update
+
+from kartoshka.dispatch import KeyedDispatcher, KeyedUpdateMiddleware, update_key
+
+USER = {"id": 7, "is_bot": False, "first_name": "U"}
+
+
+def _callback_update(update_id, data, user_id=7):
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": dict(USER, id=user_id),
+            "chat_instance": "ci",
+            "data": data,
+        },
+    })
+
+
+def _message_update(update_id, user_id=7):
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1767225600,
+            "chat": {"id": user_id, "type": "private"},
+            "from": dict(USER, id=user_id),
+            "text": "мем",
+        },
+    })
+
+
+def test_update_keys():
+    assert update_key(_callback_update(1, "approve_42", user_id=111)) == ("meme", 42)
+    assert update_key(_callback_update(2, "reject_42", user_id=222)) == ("meme", 42)
+    assert update_key(_callback_update(3, "noop")) == ("user", 7)
+    assert update_key(_message_update(4, user_id=9)) == ("user", 9)
+
+
+@pytest.mark.asyncio
+async def test_same_key_serial_other_keys_parallel():
+    pool = KeyedDispatcher(workers=4)
+    log = []
+
+    async def job(key, i):
+        log.append(("start", key, i))
+        await asyncio.sleep(0.02)
+        log.append(("end", key, i))
+        return i
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await asyncio.gather(
+        pool.run("a", lambda: job("a", 1)),
+        pool.run("a", lambda: job("a", 2)),
+        pool.run("b", lambda: job("b", 3)),
+    )
+    elapsed = loop.time() - started
+    await pool.close()
+
+    assert results == [1, 2, 3]
+    a_events = [(kind, i) for kind, key, i in log if key == "a"]
+    assert a_events == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert elapsed < 0.06  # b шёл параллельно с a, а не третьим
+
+
+@pytest.mark.asyncio
+async def test_backpressure_holds_submitters_when_full():
+    pool = KeyedDispatcher(workers=1, queue_size=2)
+    release = asyncio.Event()
+    ran = []
+
+    async def job(i):
+        await release.wait()
+        ran.append(i)
+
+    tasks = [asyncio.create_task(pool.run(i, lambda i=i: job(i))) for i in range(3)]
+    await asyncio.sleep(0.01)
+    assert pool.pending == 1  # первый в работе, второй ждёт, третий не принят
+
+    release.set()
+    await asyncio.gather(*tasks)
+    await pool.close()
+    assert ran == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_caller_and_worker_survives():
+    pool = KeyedDispatcher(workers=1)
+
+    async def boom():
+        raise RuntimeError("handler failed")
+
+    async def fine():
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        await pool.run("k", boom)
+    assert await pool.run("k", fine) == "ok"
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_votes_on_one_meme_never_overlap_in_dispatcher():
+    dp = Dispatcher()
+    pool = KeyedDispatcher(workers=8)
+    dp.update.outer_middleware(KeyedUpdateMiddleware(pool))
+    running = 0
+    peak = 0
+
+    @dp.callback_query()
+    async def vote(callback: CallbackQuery):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    bot = Bot(token="123:dummy")
+    await asyncio.gather(*(
+        dp.feed_update(bot, _callback_update(i, "approve_5", user_id=100 + i)) for i in range(5)
+    ))
+    assert peak == 1
+
+    peak = 0
+    await asyncio.gather(*(
+        dp.feed_update(bot, _callback_update(10 + i, f"approve_{i}")) for i in range(5)
+    ))
+    assert peak == 5
+    await pool.close()
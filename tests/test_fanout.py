@@ -0,0 +1,111 @@
+"""fan_out: параллельно, с лимитом одновременности и таймаутом, порядок результатов = порядок адресатов."""
+import asyncio
+import logging
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from kartoshka.config import EditorIds
+from kartoshka.fanout import fan_out
+from kartoshka.handlers import register_handlers
+from kartoshka.state import AppState
+
+
+class RecordingDP:
+    def __init__(self):
+        self.messages = []
+        self.callbacks = []
+
+    def message(self, *a, **kw):
+        return lambda fn: self.messages.append(fn) or fn
+
+    def callback_query(self, *a, **kw):
+        return lambda fn: self.callbacks.append(fn) or fn
+
+
+@pytest.mark.asyncio
+async def test_results_keep_target_order():
+    delays = {1: 0.05, 2: 0.0, 3: 0.02}
+
+    async def call(target):
+        await asyncio.sleep(delays[target])
+        return target * 10
+
+    results = await fan_out([1, 2, 3], call)
+    assert [(r.target, r.value) for r in results] == [(1, 10), (2, 20), (3, 30)]
+    assert all(r.ok for r in results)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    running = 0
+    peak = 0
+
+    async def call(target):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await fan_out(range(20), call, concurrency=3)
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_timeout_and_errors_are_per_target():
+    async def call(target):
+        if target == "stuck":
+            await asyncio.sleep(10)
+        if target == "bad":
+            raise RuntimeError("blocked")
+        return target
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await fan_out(["ok", "stuck", "bad"], call, timeout=0.05)
+
+    assert loop.time() - started < 1
+    assert results[0].value == "ok"
+    assert isinstance(results[1].error, asyncio.TimeoutError)
+    assert isinstance(results[2].error, RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_submit_sends_to_editors_in_parallel_and_keeps_order(caplog):
+    scheduler = MagicMock()
+    scheduler.pending_memes = {}
+    scheduler.add_pending = MagicMock(side_effect=lambda m: scheduler.pending_memes.__setitem__(m.meme_id, m))
+    state = AppState(bot=AsyncMock(), scheduler=scheduler, persist_window_sec=0)
+    dp = RecordingDP()
+    register_handlers(dp, state)
+    handle_meme = dp.messages[1]
+    state.set_publish_choice(7, "user")
+
+    msg = MagicMock()
+    msg.text = "hi"
+    msg.caption = None
+    msg.content_type = "text"
+    msg.media_group_id = None
+    msg.from_user = SimpleNamespace(id=7, username="u", first_name="U")
+    msg.answer = AsyncMock(return_value=SimpleNamespace(message_id=51))
+
+    async def send(telegram_bot, chat_id, content, caption, reply_markup):
+        await asyncio.sleep({111: 0.1, 222: 0.1, 333: 0.0}[chat_id])
+        if chat_id == 222:
+            raise RuntimeError("editor offline")
+        return SimpleNamespace(message_id=chat_id + 1)
+
+    loop = asyncio.get_running_loop()
+    with patch("kartoshka.config.EDITOR_IDS", EditorIds([333, 111, 222])), \
+         patch("kartoshka.handlers.submit.send_media_message", send), \
+         caplog.at_level(logging.ERROR):
+        started = loop.time()
+        await handle_meme(msg)
+        elapsed = loop.time() - started
+
+    assert elapsed < 0.19  # не 0.2 — чаты ждали параллельно
+    meme = scheduler.pending_memes[1]
+    assert meme.mod_messages == [(333, 334), (111, 112)]  # порядок EDITOR_IDS
+    assert "Не удалось отправить сообщение редактору 222" in caplog.text
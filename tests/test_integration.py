@@ -17,6 +17,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 from kartoshka.handlers import register_handlers
+from kartoshka.persistence import PersistenceError
 from kartoshka.state import AppState
 
 
@@ -67,9 +68,9 @@ def state(bot, scheduler):
 @pytest.fixture(autouse=True)
 def no_disk_writes():
     """Не пишем на диск из тестов."""
-    with patch("kartoshka.handlers.submit.save_user_data"), \
-         patch("kartoshka.handlers.submit.save_meme_counter"), \
-         patch("kartoshka.handlers.moderation.save_user_data"):
+    with patch("kartoshka.storage.save_user_data"), \
+         patch("kartoshka.storage.save_meme_counter"), \
+         patch("kartoshka.storage.JsonStorage.save_user_data"):
         yield
 
 
@@ -106,6 +107,7 @@ def make_message(text="hello", user_id=100, username="testuser", first_name="Tes
     msg.text = text
     msg.caption = caption
     msg.content_type = content_type
+    msg.media_group_id = None
     msg.from_user = SimpleNamespace(id=user_id, username=username, first_name=first_name)
     msg.chat = SimpleNamespace(id=user_id)
     msg.message_id = 50
@@ -253,6 +255,23 @@ async def test_submission_updates_last_submission_timestamp(dp, state):
     assert ts is not None and ts >= before
 
 
+@pytest.mark.asyncio
+async def test_unsaved_meme_is_not_sent_to_moderators(dp, state):
+    h = handlers_for(dp)
+    state.set_publish_choice(7, "user")
+    msg = make_message(user_id=7)
+    send = AsyncMock(return_value=SimpleNamespace(message_id=777))
+
+    with patch.object(state, "flush", AsyncMock(side_effect=PersistenceError("disk full"))), \
+         patch("kartoshka.handlers.submit.send_media_message", send):
+        await h.handle_meme(msg)
+
+    send.assert_not_awaited()
+    assert state.scheduler.pending_memes == {}
+    assert state.user_data["7"]["last_submission"] is None  # кулдаун откатан
+    assert "Не удалось сохранить мем" in msg.answer.await_args.args[0]
+
+
 @pytest.mark.asyncio
 async def test_meme_blocked_by_24h_limit(dp, state):
     h = handlers_for(dp)
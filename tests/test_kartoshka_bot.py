@@ -1,6 +1,5 @@
 import asyncio
 import math
-import random
 from datetime import datetime, timezone, timedelta
 import pytest
 
@@ -30,8 +29,8 @@ def setup_environment():
 # Предполагается, что исходный код находится в файле kartoshka_bot.py.
 import kartoshka.main as bot
 from kartoshka import config as _config
+from kartoshka import names
 from kartoshka.config import VOTES_TO_APPROVE, VOTES_TO_REJECT
-from kartoshka.constants import METALS_AND_TOXINS
 from kartoshka.models import Meme
 from kartoshka.notifications import publish_meme
 from kartoshka.scheduler import Scheduler
@@ -235,7 +234,7 @@ def test_meme_get_caption_anonymous(monkeypatch):
     user = DummyUser(username="IgnoredUser", id=2020)
     msg = FakeMessage(caption="Anonymous meme caption", text="Anonymous meme text", from_user=user)
     meme = Meme(11, 2020, "potato", msg)
-    monkeypatch.setattr(random, "choice", lambda x: "Талиевая")
+    monkeypatch.setattr(names, "potato_name", lambda meme_id: "Талиевая")
     caption = meme.get_caption()
     expected_prefix = "<tg-spoiler>Мем от Анонимной Талиевая Картошки</tg-spoiler>"
     assert expected_prefix in caption
@@ -445,35 +444,28 @@ def test_missing_env_vars(monkeypatch):
     monkeypatch.setenv("VOTES_TO_APPROVE", "1")
     monkeypatch.setenv("VOTES_TO_REJECT", "1")
     with pytest.raises(ValueError, match="Отсутствуют обязательные переменные окружения"):
-        importlib.reload(_config)
-        importlib.reload(bot)
+        _config.load_settings()
 
-def test_print_environment_mode_crypto(monkeypatch, capsys):
-    # Устанавливаем корректный BOT_TOKEN (например, "123:dummy") чтобы не выбрасывалась ошибка валидации
-    monkeypatch.setenv("BOT_TOKEN", "123:dummy")
-    monkeypatch.setenv("EDITOR_IDS", "111,222")
-    monkeypatch.setenv("PUBLISH_CHAT_ID", "123")
-    monkeypatch.setenv("BOT_NAME", "TestBot")
-    monkeypatch.setenv("POST_FREQUENCY_MINUTES", "1")
-    monkeypatch.setenv("CRYPTOSELECTARCHY", "true")
-    monkeypatch.setenv("VOTES_TO_APPROVE", "1")
-    monkeypatch.setenv("VOTES_TO_REJECT", "1")
+def test_import_does_not_read_env(monkeypatch, capsys):
+    # Модули бота импортируются без env и ничего не печатают.
+    monkeypatch.delenv("BOT_TOKEN")
     importlib.reload(_config)
     importlib.reload(bot)
+    assert capsys.readouterr().out == ""
+    with pytest.raises(ValueError, match="BOT_TOKEN"):
+        _config.API_TOKEN
+    monkeypatch.undo()
+    importlib.reload(_config)
+
+def test_print_environment_mode_crypto(monkeypatch, capsys):
+    monkeypatch.setattr(_config, "CRYPTOSELECTARCHY", True)
+    bot.print_mode()
     captured = capsys.readouterr().out
     assert "Криптоселектархическая олигархия включена!" in captured
 
 def test_print_environment_mode_nocrypto(monkeypatch, capsys):
-    monkeypatch.setenv("BOT_TOKEN", "123:dummy")
-    monkeypatch.setenv("EDITOR_IDS", "111,222")
-    monkeypatch.setenv("PUBLISH_CHAT_ID", "123")
-    monkeypatch.setenv("BOT_NAME", "TestBot")
-    monkeypatch.setenv("POST_FREQUENCY_MINUTES", "1")
-    monkeypatch.setenv("CRYPTOSELECTARCHY", "false")
-    monkeypatch.setenv("VOTES_TO_APPROVE", "1")
-    monkeypatch.setenv("VOTES_TO_REJECT", "1")
-    importlib.reload(_config)
-    importlib.reload(bot)
+    monkeypatch.setattr(_config, "CRYPTOSELECTARCHY", False)
+    bot.print_mode()
     captured = capsys.readouterr().out
     # Проверяем наличие части строки вместо полного соответствия
     assert "Единоличный Узурпатор у власти" in captured
@@ -486,9 +478,14 @@ async def test_main(monkeypatch):
     fake_state = MagicMock()
     fake_state.bot = MagicMock()
     fake_state.scheduler.run = AsyncMock(return_value=None)
+    fake_state.flush = AsyncMock(return_value=None)
+    fake_state.shared = False
     monkeypatch.setattr(bot, "build_app_state", lambda: fake_state)
     await bot.main()
+    fake_state.flush.assert_awaited_once()
     dp_instance.start_polling.assert_called_once_with(
         fake_state.bot,
         allowed_updates=dp_instance.resolve_used_update_types.return_value,
+        tasks_concurrency_limit=_config.UPDATE_QUEUE_SIZE,
     )
+    dp_instance.update.outer_middleware.assert_called_once()
@@ -0,0 +1,148 @@
+"""Альбомы: сборка по media_group_id, один мем, отправка одним sendMediaGroup."""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.types import InlineKeyboardMarkup
+
+from kartoshka.handlers import submit
+from kartoshka.media_groups import MediaGroupCollector
+from kartoshka.message_snapshot import MediaItem, MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.notifications import publish_meme
+from kartoshka.state import AppState
+from kartoshka.telegram_io import send_media_message
+
+
+def _photo_message(message_id, file_id, caption=None, group="g1", user_id=7):
+    return SimpleNamespace(
+        message_id=message_id,
+        media_group_id=group,
+        content_type="photo",
+        photo=[SimpleNamespace(file_id=file_id)],
+        caption=caption,
+        text=None,
+        chat=SimpleNamespace(id=user_id),
+        from_user=SimpleNamespace(id=user_id, username="u", first_name="U"),
+        answer=AsyncMock(return_value=SimpleNamespace(message_id=900 + message_id)),
+    )
+
+
+def _album():
+    return MessageSnapshot(
+        content_type="media_group",
+        caption="два кадра",
+        items=(MediaItem("photo", "p1"), MediaItem("video", "v2")),
+    )
+
+
+def test_album_snapshot_round_trip_and_single_fallback():
+    snap = MessageSnapshot.from_messages([_photo_message(1, "p1"), _photo_message(2, "p2", caption="подпись")])
+    assert snap.is_media_group and snap.caption == "подпись"
+    assert [i.file_id for i in snap.items] == ["p1", "p2"]
+    assert MessageSnapshot.from_dict(snap.to_dict()) == snap
+
+    single = MessageSnapshot.from_messages([_photo_message(1, "p1")])
+    assert single.content_type == "photo" and single.photo_file_id == "p1"
+
+
+@pytest.mark.asyncio
+async def test_collector_emits_one_sorted_batch_per_group():
+    batches = []
+
+    async def on_complete(messages):
+        batches.append([m.message_id for m in messages])
+
+    collector = MediaGroupCollector(on_complete, window=0.02)
+    collector.add(_photo_message(2, "b"))
+    collector.add(_photo_message(1, "a"))
+    collector.add(_photo_message(5, "x", group="g2"))
+    await asyncio.sleep(0.1)
+
+    assert sorted(batches) == [[1, 2], [5]]
+    assert collector.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_pending_groups_and_waits_for_them():
+    done = []
+
+    async def on_complete(messages):
+        await asyncio.sleep(0.01)
+        done.append([m.message_id for m in messages])
+
+    collector = MediaGroupCollector(on_complete, window=10)
+    collector.add(_photo_message(1, "a"))
+    collector.add(_photo_message(2, "b"))
+
+    await collector.close()
+
+    assert done == [[1, 2]]
+    assert collector.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_album_becomes_one_meme_and_one_submission():
+    class RecordingDP:
+        def __init__(self):
+            self.messages = []
+
+        def message(self, *a, **kw):
+            return lambda fn: self.messages.append(fn) or fn
+
+    scheduler = MagicMock()
+    scheduler.pending_memes = {}
+    scheduler.add_pending = MagicMock(side_effect=lambda m: scheduler.pending_memes.__setitem__(m.meme_id, m))
+    state = AppState(bot=AsyncMock(), scheduler=scheduler)
+    state.set_publish_choice(7, "user")
+    dp = RecordingDP()
+    send = AsyncMock(return_value=SimpleNamespace(message_id=777))
+
+    with patch.object(submit, "MEDIA_GROUP_WINDOW_SEC", 0.02), \
+         patch.object(submit, "send_media_message", send), \
+         patch("kartoshka.storage.save_user_data"), \
+         patch("kartoshka.storage.save_meme_counter"):
+        submit.register(dp, state)
+        [handle] = dp.messages
+        first, second = _photo_message(1, "p1", caption="мем"), _photo_message(2, "p2")
+        await handle(first)
+        await handle(second)
+        await asyncio.sleep(0.1)
+
+    [meme] = scheduler.pending_memes.values()
+    assert [i.file_id for i in meme.content.items] == ["p1", "p2"]
+    assert send.await_args.kwargs["content"] is meme.content
+    # Лимит «мем в 24 ч» не сработал на втором элементе альбома.
+    first.answer.assert_awaited_once()
+    second.answer.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_album_to_moderator_gets_keyboard_as_reply():
+    bot = AsyncMock()
+    bot.send_media_group.return_value = [SimpleNamespace(message_id=10), SimpleNamespace(message_id=11)]
+    bot.send_message.return_value = SimpleNamespace(message_id=12)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+
+    sent = await send_media_message(bot, 5, _album(), caption="Мем ID: 1", reply_markup=keyboard)
+
+    assert sent.message_id == 12
+    media = bot.send_media_group.await_args.kwargs["media"]
+    assert [m.media for m in media] == ["p1", "v2"] and all(m.caption is None for m in media)
+    assert bot.send_message.await_args.kwargs["reply_to_message_id"] == 10
+
+
+@pytest.mark.asyncio
+async def test_album_is_published_with_a_single_call():
+    bot = AsyncMock()
+    bot.send_media_group.return_value = [SimpleNamespace(message_id=30), SimpleNamespace(message_id=31)]
+    meme = Meme(1, 7, "user", _album())
+
+    assert await publish_meme(bot, meme, -100) is True
+
+    bot.send_media_group.assert_awaited_once()
+    bot.send_photo.assert_not_awaited()
+    first, second = bot.send_media_group.await_args.kwargs["media"]
+    assert "два кадра" in first.caption and second.caption is None
+    assert meme.published_message_id == 30
@@ -0,0 +1,58 @@
+"""Компактный Meme: __slots__, коды голосов со счётчиками, ссылки на сообщения в array."""
+import pytest
+
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme, MessageRefs
+
+
+def _meme():
+    return Meme(1, 7, "user", MessageSnapshot(content_type="text", text="x", from_user_id=7))
+
+
+def test_meme_has_no_instance_dict():
+    meme = _meme()
+    assert not hasattr(meme, "__dict__")
+    with pytest.raises(AttributeError):
+        meme.unexpected = 1
+
+
+def test_counters_follow_changed_votes():
+    meme = _meme()
+    assert meme.add_vote(111, "approve") is None
+    meme.add_vote(222, "urgent")
+    assert meme.add_vote("111", "reject") == "approve"  # тот же модератор, ID строкой
+
+    assert meme.count_votes("approve") == 1 and meme.count_votes("reject") == 1
+    assert meme.get_vote_summary() == "(✅ 0 | ⚡ 1 | ❌ 1)"
+    assert meme.get_vote(111) == "reject" and meme.get_vote(333) is None
+    assert meme.votes == {"111": "reject", "222": "urgent"}
+
+
+def test_disk_format_is_unchanged():
+    meme = _meme()
+    meme.add_vote(111, "approve")
+    meme.add_vote(222, "reject")
+    d = meme.to_dict()
+    assert d["votes"] == {"111": "approve", "222": "reject"}
+
+    restored = Meme.from_dict(d)
+    assert restored.to_dict() == d
+    assert restored.get_vote_summary() == "(✅ 1 | ⚡ 0 | ❌ 1)"
+
+
+def test_unknown_vote_in_stored_data_is_skipped():
+    meme = _meme()
+    meme.votes = {"111": "approve", "222": "maybe"}
+    assert meme.votes == {"111": "approve"}
+
+
+def test_message_refs_behave_like_list_of_tuples():
+    refs = MessageRefs([(111, 1)])
+    refs.append((-1001234567890, 2))
+    assert refs == [(111, 1), (-1001234567890, 2)]
+    assert list(refs) == [(111, 1), (-1001234567890, 2)] and refs[-1] == (-1001234567890, 2)
+    assert len(refs) == 2 and MessageRefs() == [] and not MessageRefs()
+
+    meme = _meme()
+    meme.mod_messages = [(111, 10)]
+    assert isinstance(meme.mod_messages, MessageRefs) and meme.mod_messages == [(111, 10)]
@@ -0,0 +1,139 @@
+"""WAL-режим модерационной очереди: append вместо перезаписи, replay, компакция."""
+import json
+import logging
+import os
+
+import pytest
+
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.scheduler import Scheduler
+from kartoshka.storage import atomic_write_json
+
+
+def _meme(meme_id, publish_choice="user"):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}", from_user_id=7)
+    return Meme(meme_id=meme_id, user_id=7, publish_choice=publish_choice, content=snap)
+
+
+def _log_lines():
+    if not os.path.exists(Scheduler.MODERATION_LOG_FILE):
+        return []
+    with open(Scheduler.MODERATION_LOG_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_mutations_append_to_log_without_snapshot():
+    s = Scheduler(post_frequency_minutes=5)
+    s.add_pending(_meme(1))
+    s.pending_memes[1].add_vote(111, "approve")
+    s.record_vote(1, 111, "approve")
+    s.add_pending(_meme(2))
+    s.resolve(2)
+
+    assert [r["op"] for r in _log_lines()] == ["add", "vote", "add", "resolve"]
+    with pytest.raises(FileNotFoundError):
+        open(Scheduler.MODERATION_FILE)
+
+    restored = Scheduler(post_frequency_minutes=5)
+    assert set(restored.pending_memes) == {1}
+    assert restored.pending_memes[1].votes == {"111": "approve"}
+
+
+def test_save_moderation_compacts_log():
+    s = Scheduler(post_frequency_minutes=5)
+    s.add_pending(_meme(1))
+    s.save_moderation()
+
+    assert _log_lines() == []
+    with open(Scheduler.MODERATION_FILE, encoding="utf-8") as f:
+        assert [m["meme_id"] for m in json.load(f)["pending_memes"]] == [1]
+    assert not s.needs_compaction
+
+
+def test_records_after_snapshot_offset_survive_compaction():
+    """Запись, дописанная между снятием снапшота и обрезкой лога, не теряется."""
+    s = Scheduler(post_frequency_minutes=5)
+    s.add_pending(_meme(1))
+    data, offset = s._moderation_snapshot()
+    s.add_pending(_meme(2))  # пришло «во время» компакции
+    s._write_moderation_snapshot(data, offset)
+
+    assert [r["meme"]["meme_id"] for r in _log_lines()] == [2]
+    restored = Scheduler(post_frequency_minutes=5)
+    assert set(restored.pending_memes) == {1, 2}
+
+
+def test_replay_over_snapshot_is_idempotent():
+    """Крэш между записью снапшота и обрезкой лога: двойное применение безопасно."""
+    s = Scheduler(post_frequency_minutes=5)
+    s.add_pending(_meme(1))
+    s.pending_memes[1].add_vote(111, "approve")
+    s.record_vote(1, 111, "approve")
+    s.pending_memes[1].add_vote(111, "reject")
+    s.record_vote(1, 111, "reject")
+    s.add_pending(_meme(2))
+    s.resolve(2)
+    data, _ = s._moderation_snapshot()
+    atomic_write_json(Scheduler.MODERATION_FILE, data)  # лог не обрезан
+
+    restored = Scheduler(post_frequency_minutes=5)
+    assert set(restored.pending_memes) == {1}
+    assert restored.pending_memes[1].votes == {"111": "reject"}
+
+
+def test_torn_tail_is_skipped(caplog):
+    s = Scheduler(post_frequency_minutes=5)
+    s.add_pending(_meme(1))
+    with open(Scheduler.MODERATION_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write('{"op":"add","meme":{"meme_')  # обрезок после kill -9
+
+    with caplog.at_level(logging.ERROR):
+        restored = Scheduler(post_frequency_minutes=5)
+    assert set(restored.pending_memes) == {1}
+    assert "битая запись лога" in caplog.text
+
+
+def test_append_after_torn_tail_keeps_new_records():
+    s = Scheduler(post_frequency_minutes=5)
+    s.add_pending(_meme(1))
+    with open(Scheduler.MODERATION_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write('{"op":"vote","id":1,"by"')  # обрезок после kill -9
+
+    restarted = Scheduler(post_frequency_minutes=5)
+    restarted.resolve(1)
+
+    assert [r["op"] for r in _log_lines()] == ["add", "resolve"]
+    assert Scheduler(post_frequency_minutes=5).pending_memes == {}
+
+
+def test_legacy_snapshot_without_log_is_readable():
+    """Старый moderation_queue.json без лога читается как есть (миграция)."""
+    with open(Scheduler.MODERATION_FILE, "w", encoding="utf-8") as f:
+        json.dump({"pending_memes": [_meme(5).to_dict()]}, f)
+    s = Scheduler(post_frequency_minutes=5)
+    assert set(s.pending_memes) == {5}
+
+
+@pytest.mark.asyncio
+async def test_compaction_threshold_and_background_compact(monkeypatch):
+    monkeypatch.setattr("kartoshka.scheduler.WAL_COMPACT_RECORDS", 3)
+    s = Scheduler(post_frequency_minutes=5)
+    for i in range(1, 4):
+        s.add_pending(_meme(i))
+    assert s.needs_compaction
+
+    await s.compact_moderation()
+
+    assert not s.needs_compaction
+    assert _log_lines() == []
+    restored = Scheduler(post_frequency_minutes=5)
+    assert set(restored.pending_memes) == {1, 2, 3}
+
+
+def test_wal_disabled_rewrites_snapshot():
+    s = Scheduler(post_frequency_minutes=5, wal=False)
+    s.add_pending(_meme(1))
+    assert not os.path.exists(Scheduler.MODERATION_LOG_FILE)
+    with open(Scheduler.MODERATION_FILE, encoding="utf-8") as f:
+        assert [m["meme_id"] for m in json.load(f)["pending_memes"]] == [1]
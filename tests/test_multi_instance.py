@@ -0,0 +1,183 @@
+"""Несколько процессов на одной SQLite-базе: аренда лидера, общий счётчик, claim, общая очередь.
+
+«Процессы» здесь — отдельные соединения SQLiteStorage к одному файлу.
+"""
+import asyncio
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+from kartoshka.leader import LeaderLease
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.scheduler import Scheduler
+from kartoshka.sqlite_storage import SQLiteStorage
+from kartoshka.state import AppState
+
+
+def _meme(meme_id):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}", from_user_id=7)
+    return Meme(meme_id=meme_id, user_id=7, publish_choice="user", content=snap)
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    path = str(tmp_path / "shared.db")
+    a, b = SQLiteStorage(path), SQLiteStorage(path)
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_lease_is_exclusive_until_expiry(dbs):
+    a, b = dbs
+    assert a.acquire_lease("scheduler", "A", ttl_sec=0.2) is True
+    assert b.acquire_lease("scheduler", "B", ttl_sec=0.2) is False
+    assert a.acquire_lease("scheduler", "A", ttl_sec=0.05) is True  # продление
+
+    time.sleep(0.06)
+    assert b.acquire_lease("scheduler", "B", ttl_sec=10) is True
+    assert a.acquire_lease("scheduler", "A", ttl_sec=10) is False
+
+
+def test_meme_ids_and_claims_are_unique_across_processes(dbs):
+    a, b = dbs
+    ids = [a.next_meme_id(), b.next_meme_id(), a.next_meme_id()]
+    assert ids == [1, 2, 3]
+
+    a.put_pending(_meme(5).to_dict())
+    assert [a.claim_pending(5), b.claim_pending(5)] == [True, False]
+    assert b.get_pending(5) is None
+
+
+def test_publish_choice_reads_latest_from_shared_storage(dbs):
+    a, b = dbs
+    state_a = AppState(bot=AsyncMock(), scheduler=None, storage=a, shared=True)
+    state_b = AppState(bot=AsyncMock(), scheduler=None, storage=b, shared=True)
+
+    state_a.set_publish_choice(7, "user")
+    state_b.set_publish_choice(7, "potato")  # повторный /start попал в процесс B
+
+    assert state_a.get_publish_choice(7) == "potato"
+
+
+@pytest.mark.asyncio
+async def test_votes_from_both_processes_finalize_once(dbs):
+    a, b = dbs
+    sa = Scheduler(post_frequency_minutes=60, storage=a, shared=True)
+    sb = Scheduler(post_frequency_minutes=60, storage=b, shared=True)
+    state_a = AppState(bot=AsyncMock(), scheduler=sa, storage=a, shared=True, persist_window_sec=0)
+
+    meme = _meme(await state_a.next_meme_id())
+    sa.add_pending(meme)
+    meme.mod_messages = [(111, 1)]
+    await state_a.flush()  # запись — group commit'ом, в worker-треде
+
+    # Процесс B о меме не слышал — видит его через базу.
+    assert sb.refresh_pending(meme.meme_id) is not None
+    sa.pending_memes[meme.meme_id].add_vote(111, "approve")
+    sa.record_vote(meme.meme_id, 111, "approve")
+    await state_a.flush()
+    sb.pending_memes[meme.meme_id].add_vote(222, "approve")
+    sb.record_vote(meme.meme_id, 222, "approve")
+
+    fresh = sa.refresh_pending(meme.meme_id)
+    assert fresh.votes == {"111": "approve", "222": "approve"}
+    assert fresh.mod_messages == [(111, 1)]  # то, что живёт только в памяти, сохранено
+    assert [await sb.claim(meme.meme_id), await sa.claim(meme.meme_id)] == [True, False]
+
+
+def test_pending_votes_load_in_one_query_and_reload_only_on_change(dbs):
+    a, b = dbs
+    sa = Scheduler(post_frequency_minutes=60, storage=a, shared=True)
+    sb = Scheduler(post_frequency_minutes=60, storage=b, shared=True)
+    sa.add_pending(_meme(1))
+    sa.add_pending(_meme(2))
+    sa.record_vote(1, 111, "approve")
+    sa.record_vote(1, 222, "reject")
+
+    statements = []
+    b._conn.set_trace_callback(statements.append)
+    sb._reload_shared()
+    assert {m.meme_id: m.votes for m in sb.pending_memes.values()} == {
+        1: {"111": "approve", "222": "reject"}, 2: {},
+    }
+    assert sum("FROM votes" in sql or "JOIN votes" in sql for sql in statements) == 1
+
+    statements.clear()
+    sb._reload_shared()  # ничего не менялось — только проверка версии
+    assert not any("pending_memes" in sql for sql in statements)
+
+    sa.record_vote(2, 111, "approve")
+    sb._reload_shared()
+    assert sb.pending_memes[2].votes == {"111": "approve"}
+
+
+@pytest.mark.asyncio
+async def test_schedules_from_two_processes_share_one_queue(dbs):
+    a, b = dbs
+    sa = Scheduler(post_frequency_minutes=60, storage=a, shared=True)
+    sb = Scheduler(post_frequency_minutes=60, storage=b, shared=True)
+
+    await sa.schedule(_meme(1))
+    await sb.schedule(_meme(2))
+
+    queue = a.load_publication()["queue"]
+    assert [e["meme"]["meme_id"] for e in queue] == [1, 2]
+    first, second = (datetime.fromisoformat(e["scheduled_time"]) for e in queue)
+    assert second - first >= timedelta(minutes=60)
+
+
+@pytest.mark.asyncio
+async def test_leader_publishes_entries_written_by_followers(dbs):
+    a, b = dbs
+    published = []
+
+    async def on_publish(meme):
+        published.append(meme.meme_id)
+        return True
+
+    leader = Scheduler(post_frequency_minutes=60, storage=a, shared=True, on_publish=on_publish)
+    # Запись дописал другой процесс уже после старта лидера.
+    past = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    b.append_publication({"scheduled_time": past, "meme": _meme(9).to_publication_dict()})
+
+    task = asyncio.create_task(leader.run())
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+    assert published == [9]
+    assert b.load_publication()["queue"] == []
+
+
+@pytest.mark.asyncio
+async def test_lease_fails_over_when_leader_stops(dbs):
+    a, b = dbs
+    running = []
+
+    async def body(name):
+        running.append(name)
+        await asyncio.Event().wait()
+
+    lease_a = LeaderLease(a, holder="A", ttl_sec=0.3)
+    lease_b = LeaderLease(b, holder="B", ttl_sec=0.3)
+    task_a = asyncio.create_task(lease_a.run(lambda: body("A")))
+    await asyncio.sleep(0.02)
+    task_b = asyncio.create_task(lease_b.run(lambda: body("B")))
+    await asyncio.sleep(0.05)
+    assert running == ["A"] and lease_a.held and not lease_b.held
+
+    task_a.cancel()
+    with suppress(asyncio.CancelledError):
+        await task_a
+    await asyncio.sleep(0.15)  # B пробует раз в ttl/3
+    assert running == ["A", "B"] and lease_b.held
+
+    task_b.cancel()
+    with suppress(asyncio.CancelledError):
+        await task_b
@@ -0,0 +1,40 @@
+"""Имена анонимных картошек: детерминированы, без повторов в окне."""
+from kartoshka import names
+from kartoshka.constants import METALS_AND_TOXINS
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.names import PotatoNamer, load_names
+
+
+def test_dictionary_has_metals_and_adjectives_without_duplicates():
+    loaded = load_names()
+    assert loaded[:len(METALS_AND_TOXINS)] == tuple(METALS_AND_TOXINS)
+    assert len(loaded) > len(METALS_AND_TOXINS) + 600
+    assert len(set(loaded)) == len(loaded) and all(loaded)
+
+
+def test_missing_adjectives_file_falls_back_to_metals(tmp_path):
+    assert load_names(str(tmp_path / "нет.txt")) == tuple(METALS_AND_TOXINS)
+
+
+def test_same_meme_gets_same_name_across_instances():
+    a = PotatoNamer(load_names(), b"key")
+    b = PotatoNamer(load_names(), b"key")
+    assert [a.name(i) for i in range(0, 5000, 7)] == [b.name(i) for i in range(0, 5000, 7)]
+    other = PotatoNamer(load_names(), b"other key")
+    assert [a.name(i) for i in range(50)] != [other.name(i) for i in range(50)]
+
+
+def test_no_repeats_within_window_across_cycles():
+    dictionary = tuple(f"Имя{i}" for i in range(40))
+    namer = PotatoNamer(dictionary, b"key", window=10)
+    sequence = [namer.name(i) for i in range(40 * 6)]
+    for start in range(len(sequence) - 10):
+        assert len(set(sequence[start:start + 10])) == 10
+
+
+def test_anonymous_caption_is_stable_between_renders():
+    meme = Meme(42, 7, "potato", MessageSnapshot(content_type="text", text="мем", from_user_id=7))
+    caption = meme.get_caption()
+    assert caption == meme.get_caption()
+    assert f"Мем от Анонимной {names.potato_name(42)} Картошки" in caption
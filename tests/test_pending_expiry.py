@@ -0,0 +1,98 @@
+"""Индекс истечения pending-мемов: снимается только истёкшее, одна запись на диск за проход."""
+import asyncio
+import json
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.pending_memes import PendingMemes
+from kartoshka.scheduler import EXPIRED_RESOLUTION, PENDING_TTL, Scheduler
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _meme(meme_id, age):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}")
+    meme = Meme(meme_id=meme_id, user_id=None, publish_choice="potato", content=snap)
+    meme.created_time = NOW - age
+    return meme
+
+
+def test_pop_expired_returns_only_due_memes():
+    pending = PendingMemes(ttl=PENDING_TTL)
+    for i, days in enumerate([4, 1, 5, 2], start=1):
+        pending[i] = _meme(i, timedelta(days=days))
+
+    expired = pending.pop_expired(NOW.timestamp())
+
+    assert sorted(m.meme_id for m in expired) == [1, 3]
+    assert set(pending) == {2, 4}
+    assert pending.next_deadline() == (NOW - timedelta(days=2) + PENDING_TTL).timestamp()
+
+
+def test_resolved_and_replaced_memes_are_skipped_lazily():
+    pending = PendingMemes(ttl=PENDING_TTL)
+    pending[1] = _meme(1, timedelta(days=4))
+    pending[2] = _meme(2, timedelta(days=4))
+    pending.pop(1)                            # резолвнут модераторами
+    pending[2] = _meme(2, timedelta(hours=1))  # заменён свежей версией
+
+    assert pending.pop_expired(NOW.timestamp()) == []
+    assert set(pending) == {2}
+
+
+def test_changed_created_time_is_reindexed():
+    pending = PendingMemes(ttl=PENDING_TTL)
+    meme = _meme(1, timedelta(hours=1))
+    pending[1] = meme
+    meme.created_time = NOW - timedelta(days=4)
+
+    # Старый ключ ещё в будущем — вершина перекладывается при next_deadline().
+    assert pending.next_deadline() == (meme.created_time + PENDING_TTL).timestamp()
+    assert pending.pop_expired(NOW.timestamp()) == [meme]
+
+
+def test_heap_does_not_grow_with_churn():
+    pending = PendingMemes(ttl=PENDING_TTL)
+    for i in range(1000):
+        pending[i] = _meme(i, timedelta(hours=1))
+        pending.pop(i)
+    assert len(pending._heap) <= 2 * len(pending) + 65
+
+
+@pytest.mark.asyncio
+async def test_run_expires_in_one_batch_and_updates_mod_keyboards():
+    s = Scheduler(post_frequency_minutes=5, bot=AsyncMock())
+    now = datetime.now(timezone.utc)
+    for i in range(1, 4):
+        meme = _meme(i, timedelta())
+        meme.created_time = now - timedelta(days=4)
+        meme.mod_messages = [(111, 100 + i)]
+        s.pending_memes[i] = meme
+    fresh = _meme(4, timedelta())
+    fresh.created_time = now
+    s.pending_memes[4] = fresh
+
+    with patch(
+        "kartoshka.scheduler.notifications.update_mod_messages_with_resolution",
+        new_callable=AsyncMock,
+    ) as update_mod, patch.object(s._moderation_log, "append_many", wraps=s._moderation_log.append_many) as append:
+        task = asyncio.create_task(s.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    assert set(s.pending_memes) == {4}
+    assert append.call_count == 1
+    assert [r["id"] for r in append.call_args.args[0]] == [1, 2, 3]
+    assert sorted(c.args[1].meme_id for c in update_mod.await_args_list) == [1, 2, 3]
+    assert all(c.args[2] == EXPIRED_RESOLUTION for c in update_mod.await_args_list)
+
+    with open(Scheduler.MODERATION_LOG_FILE, encoding="utf-8") as f:
+        ops = [json.loads(line)["op"] for line in f]
+    assert ops == ["resolve"] * 3
@@ -0,0 +1,156 @@
+"""Group commit: пометки за окно сливаются в одну запись, flush() — барьер."""
+import asyncio
+import json
+import os
+
+import pytest
+
+from kartoshka import persistence, storage
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.persistence import Persistence, PersistenceError
+from kartoshka.scheduler import Scheduler
+from kartoshka.state import AppState
+
+
+def _meme(meme_id):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}", from_user_id=7)
+    return Meme(meme_id=meme_id, user_id=7, publish_choice="user", content=snap)
+
+
+@pytest.mark.asyncio
+async def test_marks_within_window_share_one_commit():
+    commits = []
+
+    async def commit(kinds):
+        commits.append(set(kinds))
+
+    p = Persistence(commit, window_sec=0.01)
+    p.mark_dirty("users")
+    p.mark_dirty("counter")
+    p.mark_dirty("users")
+    await p.flush()
+
+    assert commits == [{"users", "counter"}]
+    assert p.stats.batches == 1
+    assert p.stats.last_batch_size == 3
+    assert p.stats.as_dict()["max_batch_size"] == 3
+
+
+@pytest.mark.asyncio
+async def test_flush_without_marks_returns_immediately():
+    async def commit(kinds):
+        raise AssertionError("нечего коммитить")
+
+    await Persistence(commit).flush()
+
+
+@pytest.mark.asyncio
+async def test_failed_commit_fails_barrier_and_retries(caplog, monkeypatch):
+    monkeypatch.setattr(persistence, "RETRY_BASE_SEC", 0.01)
+    attempts = []
+
+    async def commit(kinds):
+        attempts.append(set(kinds))
+        if len(attempts) < 3:
+            raise OSError("disk full")
+
+    p = Persistence(commit, window_sec=0.01)
+    p.mark_dirty("users")
+    with pytest.raises(PersistenceError) as excinfo:
+        await p.flush()
+    assert isinstance(excinfo.value.__cause__, OSError)
+    assert p.pending
+    assert "Ошибка group commit" in caplog.text
+
+    # Повтор — сам, без новых пометок; backoff растёт со сбоями подряд.
+    await asyncio.sleep(0.1)
+    assert attempts == [{"users"}] * 3
+    assert not p.pending
+    await p.flush()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_flushes_group_into_one_commit():
+    commits = []
+
+    async def commit(kinds):
+        commits.append(set(kinds))
+
+    p = Persistence(commit, window_sec=0.02)
+
+    async def handler(kind):
+        p.mark_dirty(kind)
+        await p.flush()
+
+    await asyncio.gather(handler("users"), handler("counter"), handler("moderation"))
+    assert commits == [{"users", "counter", "moderation"}]
+
+
+@pytest.mark.asyncio
+async def test_app_state_commits_scheduler_and_users():
+    scheduler = Scheduler(post_frequency_minutes=5)
+    state = AppState(bot=None, scheduler=scheduler, persist_window_sec=0.01)
+
+    scheduler.add_pending(_meme(1))
+    scheduler.add_pending(_meme(2))
+    state.user_data["7"] = {"last_submission": None, "rejections": 1, "ban_until": None}
+    state.mark_dirty("users")
+    state.meme_counter = 2
+    state.mark_dirty("counter")
+    assert not os.path.exists(Scheduler.MODERATION_LOG_FILE)  # ещё в буфере
+
+    await state.flush()
+
+    with open(Scheduler.MODERATION_LOG_FILE, encoding="utf-8") as f:
+        assert [json.loads(line)["op"] for line in f] == ["add", "add"]
+    assert storage.load_meme_counter() == 2
+    assert storage.load_user_data()["7"]["rejections"] == 1
+    assert set(Scheduler(post_frequency_minutes=5).pending_memes) == {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_app_state_commits_publication_snapshot():
+    scheduler = Scheduler(post_frequency_minutes=5)
+    state = AppState(bot=None, scheduler=scheduler, persist_window_sec=0.01)
+    scheduler.add_pending(_meme(1))
+    await scheduler.schedule(scheduler.pending_memes[1])
+    assert not os.path.exists(Scheduler.PUBLICATION_FILE)
+
+    await state.flush()
+    restored = Scheduler(post_frequency_minutes=5)
+    assert [e["meme"]["meme_id"] for e in restored.scheduled_posts] == [1]
+    assert restored.pending_memes == {}
+
+
+@pytest.mark.asyncio
+async def test_app_state_retries_rolled_back_commit(tmp_path, monkeypatch):
+    from kartoshka.sqlite_storage import SQLiteStorage
+
+    monkeypatch.setattr(persistence, "RETRY_BASE_SEC", 0.01)
+
+    db = SQLiteStorage(str(tmp_path / "kartoshka.db"))
+    scheduler = Scheduler(post_frequency_minutes=5, storage=db)
+    state = AppState(bot=None, scheduler=scheduler, storage=db, persist_window_sec=0.01)
+    scheduler.add_pending(_meme(1))
+    state.user_data["7"] = {"last_submission": None, "rejections": 1, "ban_until": None}
+    state.mark_dirty("users")
+    state.meme_counter = 1
+    state.mark_dirty("counter")
+
+    def boom(counter):
+        raise OSError("диск полон")
+
+    # Счётчик пишется последним: откатываются и уже записанные мем и автор.
+    with monkeypatch.context() as m:
+        m.setattr(db, "save_meme_counter", boom)
+        with pytest.raises(PersistenceError):
+            await state.flush()
+    assert db.get_pending(1) is None
+    assert db.load_user_data() == {}
+
+    await state.flush()
+    assert db.get_pending(1) is not None
+    assert db.load_user_data()["7"]["rejections"] == 1
+    assert db.load_meme_counter() == 1
+    db.close()
@@ -0,0 +1,152 @@
+"""PublicationQueue: куча по scheduled_time без пересортировки на каждом тике."""
+import asyncio
+import random
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.publication_queue import BEST_EFFORT, FIFO, PublicationQueue
+from kartoshka.scheduler import Scheduler
+
+BASE = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _entry(meme_id, minutes):
+    return {"scheduled_time": (BASE + timedelta(minutes=minutes)).isoformat(), "meme": {"meme_id": meme_id}}
+
+
+def _meme_dict(meme_id):
+    meme = Meme(meme_id=meme_id, user_id=None, publish_choice="potato",
+                content=MessageSnapshot(content_type="text", text=f"meme {meme_id}"))
+    return meme.to_publication_dict()
+
+
+def _ids(queue):
+    return [e["meme"]["meme_id"] for e in queue]
+
+
+def test_orders_by_time_regardless_of_insert_order():
+    minutes = list(range(1000))
+    random.Random(1).shuffle(minutes)
+    q = PublicationQueue(_entry(m, m) for m in minutes)
+
+    assert len(q) == 1000
+    assert q.peek()["meme"]["meme_id"] == 0
+    assert q[-1]["meme"]["meme_id"] == 999
+    assert _ids(q) == list(range(1000))
+
+
+def test_equal_times_keep_insert_order():
+    q = PublicationQueue([_entry(2, 5), _entry(1, 5)])
+    assert _ids(q) == [2, 1]
+
+
+def test_remove_and_last_skip_dead_entries():
+    entries = [_entry(i, i) for i in range(5)]
+    q = PublicationQueue(entries)
+    q.remove(entries[4])
+    q.remove(entries[0])
+
+    assert q.peek() is entries[1]
+    assert q.last() is entries[3]
+    assert q.find(4) is None
+    assert q.find(2) is entries[2]
+    assert not q.remove(entries[0])  # повторное удаление — no-op
+
+
+def test_reschedule_moves_entry():
+    entries = [_entry(i, i) for i in range(3)]
+    q = PublicationQueue(entries)
+    entries[0]["scheduled_time"] = (BASE + timedelta(minutes=10)).isoformat()
+    q.reschedule(entries[0])
+
+    assert _ids(q) == [1, 2, 0]
+    assert q.last() is entries[0]
+    assert q.peek_epoch() == (BASE + timedelta(minutes=1)).timestamp()
+
+
+def test_retry_timer_orders_best_effort_but_blocks_fifo():
+    def queue(ordering):
+        entries = [_entry(i, i) for i in range(3)]
+        entries[0]["retry_at"] = (BASE + timedelta(minutes=10)).isoformat()
+        return PublicationQueue(entries, ordering=ordering)
+
+    best = queue(BEST_EFFORT)
+    assert _ids(best) == [1, 2, 0]
+    assert best.peek_epoch() == (BASE + timedelta(minutes=1)).timestamp()
+
+    fifo = queue(FIFO)
+    assert _ids(fifo) == [0, 1, 2]
+    # Голова ждёт повтора — и вся очередь вместе с ней.
+    assert fifo.peek_epoch() == (BASE + timedelta(minutes=10)).timestamp()
+    # Таймер повтора не двигает слот: следующий мем встаёт за последним слотом.
+    assert best.last()["meme"]["meme_id"] == 2 and fifo.last()["meme"]["meme_id"] == 2
+
+    with pytest.raises(ValueError):
+        PublicationQueue(ordering="lifo")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("ordering, published, left", [
+    (BEST_EFFORT, [1, 2, 3], [1]),
+    (FIFO, [1], [1, 2, 3]),
+])
+async def test_failing_entry_stalls_only_fifo_queue(ordering, published, left):
+    attempts = []
+
+    async def on_publish(meme):
+        attempts.append(meme.meme_id)
+        return meme.meme_id != 1  # первый мем падает, остальные публикуются
+
+    s = Scheduler(post_frequency_minutes=60, on_publish=on_publish, ordering=ordering)
+    now = datetime.now(timezone.utc)
+    s.scheduled_posts = [
+        {"scheduled_time": (now - timedelta(minutes=3 - i)).isoformat(), "meme": _meme_dict(i)}
+        for i in (1, 2, 3)
+    ]
+
+    task = asyncio.create_task(s.run())
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+    assert attempts == published
+    assert _ids(s.scheduled_posts) == left
+
+
+def test_heaps_are_compacted_after_many_removals():
+    entries = [_entry(i, i) for i in range(100)]
+    q = PublicationQueue(entries)
+    for entry in entries[:90]:
+        q.remove(entry)
+    assert len(q) == 10
+    assert len(q._heap) <= 2 * len(q) + 1
+
+
+def test_behaves_like_list_for_callers():
+    q = PublicationQueue()
+    assert q == [] and not q
+    entry = _entry(1, 0)
+    q.append(entry)
+    assert q == [entry]
+    assert q[0] is entry
+    with pytest.raises(IndexError):
+        q[3]
+
+
+@pytest.mark.asyncio
+async def test_schedule_appends_after_last_without_sorting():
+    s = Scheduler(post_frequency_minutes=60)
+    s.scheduled_posts = [_entry(i, 24 * 60 + i) for i in (3, 1, 2)]
+    meme = Meme(meme_id=9, user_id=None, publish_choice="potato",
+                content=MessageSnapshot(content_type="text", text="x"))
+    await s.schedule(meme)
+
+    last = datetime.fromisoformat(s.scheduled_posts[-1]["scheduled_time"])
+    assert s.scheduled_posts[-1]["meme"]["meme_id"] == 9
+    assert last == BASE + timedelta(minutes=24 * 60 + 3 + 60)
+    assert s.scheduled_posts.find(9) is s.scheduled_posts[-1]
@@ -0,0 +1,158 @@
+"""Журнал публикаций: крэш между отправкой и снятием с очереди не даёт дубля."""
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.publish_ledger import DONE, INTENT, PublishLedger
+from kartoshka.scheduler import Scheduler
+from kartoshka.sqlite_storage import SQLiteStorage
+
+
+def _entry(meme_id):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}")
+    meme = Meme(meme_id=meme_id, user_id=None, publish_choice="potato", content=snap)
+    return {
+        "scheduled_time": (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat(),
+        "meme": meme.to_publication_dict(),
+    }
+
+
+def _publisher(calls, message_id=555, result=True):
+    async def on_publish(meme):
+        calls.append(meme.meme_id)
+        meme.published_message_id = message_id
+        return result
+    return on_publish
+
+
+def test_ledger_survives_reload_and_failed_clears_intent(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = PublishLedger(path)
+    ledger.record_intent(1)
+    ledger.record_done(1, 700)
+    ledger.record_intent(2)
+    ledger.record_intent(3)
+    ledger.record_failed(3)
+
+    reloaded = PublishLedger(path)
+    assert reloaded.get(1)["state"] == DONE and reloaded.get(1)["message_id"] == 700
+    assert reloaded.get(2)["state"] == INTENT
+    assert reloaded.get(3) is None
+
+
+def test_compaction_drops_old_records_and_superseded_lines(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    ledger = PublishLedger(str(path), max_age=timedelta(days=1))
+    ledger.record_intent(1)
+    ledger.record_done(1, 10)
+    ledger.record_intent(2)
+    ledger.record_done(2, 20)
+    assert not ledger.needs_compaction
+
+    removed = ledger.compact(now=time.time() + 2 * 86400)
+    assert removed == 2 and ledger.get(1) is None
+
+    ledger.record_intent(3)
+    ledger.record_done(3, 30)
+    assert ledger.compact() == 0
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["id"], r["state"]) for r in lines] == [(3, DONE)]
+
+
+@pytest.mark.asyncio
+async def test_successful_publish_is_recorded_with_message_id():
+    calls = []
+    s = Scheduler(post_frequency_minutes=60, on_publish=_publisher(calls))
+    entry = _entry(5)
+    s.scheduled_posts = [entry]
+
+    await s._publish_due_entry(entry, datetime.now(timezone.utc))
+
+    assert calls == [5]
+    assert s.ledger.get(5)["state"] == DONE and s.ledger.get(5)["message_id"] == 555
+
+
+@pytest.mark.asyncio
+async def test_failed_publish_leaves_no_intent_behind():
+    s = Scheduler(post_frequency_minutes=60, on_publish=_publisher([], result=False))
+    entry = _entry(6)
+    s.scheduled_posts = [entry]
+
+    await s._publish_due_entry(entry, datetime.now(timezone.utc))
+
+    assert s.ledger.get(6) is None
+    assert entry["attempts"] == 1 and len(s.scheduled_posts) == 1
+
+
+@pytest.mark.asyncio
+async def test_restart_after_publish_does_not_resend():
+    """Крэш между on_publish и pop(): запись ещё в очереди, но журнал помнит пост."""
+    first = Scheduler(post_frequency_minutes=60)
+    entry = _entry(7)
+    first.scheduled_posts = [entry]
+    first.save_publication()
+    first.ledger.record_intent(7)
+    first.ledger.record_done(7, 900)
+
+    calls = []
+    restarted = Scheduler(post_frequency_minutes=60, on_publish=_publisher(calls))
+    assert len(restarted.scheduled_posts) == 1
+    await restarted._publish_due_entry(restarted.scheduled_posts.peek(), datetime.now(timezone.utc))
+
+    assert calls == []
+    assert restarted.scheduled_posts == []
+
+
+@pytest.mark.asyncio
+async def test_restart_mid_publish_goes_to_dead_letter_not_channel():
+    """intent без исхода: был ли пост, неизвестно — не повторяем вслепую."""
+    first = Scheduler(post_frequency_minutes=60)
+    first.scheduled_posts = [_entry(8)]
+    first.save_publication()
+    first.ledger.record_intent(8)
+
+    calls = []
+    restarted = Scheduler(post_frequency_minutes=60, on_publish=_publisher(calls))
+    await restarted._publish_due_entry(restarted.scheduled_posts.peek(), datetime.now(timezone.utc))
+
+    assert calls == []
+    assert restarted.scheduled_posts == []
+    assert [e["last_error"] for e in restarted.dead_letter_entries()] == ["interrupted"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_ledger_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "shared.db")
+    a, b = SQLiteStorage(path), SQLiteStorage(path)
+    try:
+        calls = []
+        sa = Scheduler(post_frequency_minutes=60, storage=a, on_publish=_publisher(calls))
+        entry = _entry(9)
+        sa.scheduled_posts = [entry]
+        await sa._publish_due_entry(entry, datetime.now(timezone.utc))
+
+        sb = Scheduler(post_frequency_minutes=60, storage=b)
+        assert sb.ledger.get(9)["message_id"] == 555
+        assert sb.ledger.compact(now=time.time() + 365 * 86400) == 1
+        assert sa.ledger.get(9) is None
+    finally:
+        a.close()
+        b.close()
+
+
+@pytest.mark.asyncio
+async def test_publish_meme_remembers_channel_message_id(monkeypatch):
+    from kartoshka import notifications
+
+    async def fake_send(**kwargs):
+        return SimpleNamespace(message_id=4242)
+
+    monkeypatch.setattr(notifications, "send_media_message", fake_send)
+    meme = Meme(1, None, "potato", MessageSnapshot(content_type="text", text="x"))
+    assert await notifications.publish_meme(object(), meme, -100) is True
+    assert meme.published_message_id == 4242
@@ -0,0 +1,149 @@
+"""RateLimiter: вёдра на чат и на бота, приоритеты, retry_after."""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, GetUpdates, SendMessage
+
+from kartoshka import notifications, ratelimit
+from kartoshka.ratelimit import BULK, INTERACTIVE, RateLimiter, TokenBucket
+
+
+def _send(chat_id):
+    return SendMessage(chat_id=chat_id, text="x")
+
+
+class Recorder:
+    """make_request, запоминающий порядок и время запросов."""
+
+    def __init__(self, failures=0, retry_after=0.05):
+        self.calls = []
+        self.failures = failures
+        self.retry_after = retry_after
+
+    async def __call__(self, bot, method):
+        self.calls.append((asyncio.get_running_loop().time(), method))
+        if self.failures:
+            self.failures -= 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+        return True
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=1, now=0.0)
+    assert bucket.wait_time(0.0) == 0
+    bucket.take(0.0)
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.5) == 0
+
+    bucket.block(until=3.0)
+    assert bucket.wait_time(1.0) == pytest.approx(2.0)
+    assert bucket.wait_time(3.5) == 0
+
+
+@pytest.mark.asyncio
+async def test_same_chat_is_spaced_other_chats_are_not():
+    limiter = RateLimiter(global_rate=1000, per_chat_rate=20)
+    make_request = Recorder()
+
+    await asyncio.gather(*(limiter(make_request, None, _send(chat)) for chat in (1, 1, 1, 2, 3)))
+
+    times = {}
+    for at, method in make_request.calls:
+        times.setdefault(method.chat_id, []).append(at)
+    assert times[1][2] - times[1][0] >= 0.09  # 3 сообщения при 20/с
+    assert times[2][0] - times[1][0] < 0.02
+    assert times[3][0] - times[1][0] < 0.02
+
+
+@pytest.mark.asyncio
+async def test_global_limit_caps_burst():
+    limiter = RateLimiter(global_rate=10)
+    make_request = Recorder()
+
+    await asyncio.gather(*(limiter(make_request, None, _send(chat)) for chat in range(1, 12)))
+
+    first, last = make_request.calls[0][0], make_request.calls[-1][0]
+    assert last - first >= 0.09  # 11-й ждёт токен (10 в запасе)
+
+
+@pytest.mark.asyncio
+async def test_interactive_overtakes_queued_bulk():
+    limiter = RateLimiter(global_rate=20)
+    limiter._global.tokens = 0  # бот только что выбрал лимит
+    make_request = Recorder()
+
+    async def bulk_send(chat):
+        with ratelimit.bulk():
+            await limiter(make_request, None, _send(chat))
+
+    await asyncio.gather(
+        bulk_send(1),
+        bulk_send(2),
+        limiter(make_request, None, AnswerCallbackQuery(callback_query_id="q")),
+        bulk_send(3),
+    )
+
+    order = [type(m).__name__ for _, m in make_request.calls]
+    assert order[0] == "AnswerCallbackQuery"
+    assert [m.chat_id for _, m in make_request.calls[1:]] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_freezes_chat_and_retries():
+    limiter = RateLimiter(global_rate=1000, per_chat_rate=1000)
+    make_request = Recorder(failures=1, retry_after=0.1)
+
+    assert await limiter(make_request, None, _send(5)) is True
+
+    (first, _), (second, _) = make_request.calls
+    assert second - first >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_retry_after_gives_up_after_max_retries():
+    limiter = RateLimiter(global_rate=1000, per_chat_rate=1000, max_retries=1)
+    make_request = Recorder(failures=5, retry_after=0)
+
+    with pytest.raises(TelegramRetryAfter):
+        await limiter(make_request, None, _send(5))
+    assert len(make_request.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_non_message_methods_bypass_queue():
+    limiter = RateLimiter(global_rate=1)
+    limiter._global.block(limiter._clock() + 60)
+    make_request = Recorder()
+
+    await asyncio.wait_for(limiter(make_request, None, GetUpdates()), 0.5)
+    assert limiter.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_status_edits_are_bulk_and_publish_is_interactive():
+    seen = []
+
+    class Bot:
+        async def edit_message_reply_markup(self, **kwargs):
+            seen.append(("edit", ratelimit.current_priority()))
+
+    await notifications.edit_reply_markups(Bot(), [(1, 2)], MagicMock(), "редактора")
+
+    async def send_media_message(**kwargs):
+        seen.append(("publish", ratelimit.current_priority()))
+
+    meme = MagicMock()
+    meme.get_caption.return_value = ""
+    with patch("kartoshka.notifications.send_media_message", send_media_message):
+        assert await notifications.publish_meme(Bot(), meme, -100) is True
+
+    assert seen == [("edit", BULK), ("publish", INTERACTIVE)]
+    assert ratelimit.current_priority() == ratelimit.NORMAL
+
+
+def test_group_chats_get_stricter_bucket():
+    limiter = RateLimiter()
+    assert limiter._chat_bucket(-100123).rate == ratelimit.GROUP_RATE
+    assert limiter._chat_bucket(42).rate == ratelimit.PER_CHAT_RATE
@@ -0,0 +1,110 @@
+"""Политики повтора публикации: классы ошибок, экспоненциальный бэкофф с jitter."""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramEntityTooLarge,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import SendMessage
+
+from kartoshka import notifications
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.retry_policy import BAD_REQUEST, DEFAULT, FORBIDDEN, NETWORK, RATE_LIMIT, RetryPolicies, RetryPolicy
+from kartoshka.scheduler import Scheduler
+
+METHOD = SendMessage(chat_id=-100, text="meme")
+
+
+def _entry(meme_id=1):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}")
+    meme = Meme(meme_id=meme_id, user_id=None, publish_choice="potato", content=snap)
+    return {
+        "scheduled_time": (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat(),
+        "meme": meme.to_publication_dict(),
+    }
+
+
+def _failing(error):
+    async def on_publish(meme):
+        raise error
+    return on_publish
+
+
+def test_classify_by_error_class():
+    policies = RetryPolicies()
+    assert policies.classify(TelegramRetryAfter(METHOD, "flood", retry_after=3)) is RATE_LIMIT
+    assert policies.classify(TelegramNetworkError(METHOD, "timeout")) is NETWORK
+    assert policies.classify(TelegramServerError(METHOD, "bad gateway")) is NETWORK
+    assert policies.classify(TelegramEntityTooLarge(METHOD, "too large")) is BAD_REQUEST
+    assert policies.classify(TelegramBadRequest(METHOD, "wrong file identifier")) is BAD_REQUEST
+    assert policies.classify(TelegramForbiddenError(METHOD, "bot was kicked")) is FORBIDDEN
+    assert policies.classify(RuntimeError("?")) is DEFAULT
+    assert policies.classify(None) is DEFAULT
+
+
+def test_delay_is_exponential_capped_and_jittered():
+    policy = RetryPolicy("t", max_attempts=10, base_delay=timedelta(seconds=10), max_delay=timedelta(seconds=60))
+    assert policy.delay(1, rand=lambda: 0.0) == timedelta(seconds=5)
+    assert policy.delay(1, rand=lambda: 1.0) == timedelta(seconds=10)
+    assert policy.delay(3, rand=lambda: 1.0) == timedelta(seconds=40)
+    assert policy.delay(9, rand=lambda: 1.0) == timedelta(seconds=60)
+    # retry_after — нижняя граница, jitter сверху.
+    assert policy.delay(1, retry_after=30, rand=lambda: 0.0) == timedelta(seconds=35)
+
+
+@pytest.mark.asyncio
+async def test_retry_after_waits_seconds_not_minutes():
+    s = Scheduler(post_frequency_minutes=60, on_publish=_failing(TelegramRetryAfter(METHOD, "flood", retry_after=3)))
+    entry = _entry()
+    s.scheduled_posts = [entry]
+    now = datetime.now(timezone.utc)
+
+    await s._publish_due_entry(entry, now)
+
+    delay = datetime.fromisoformat(entry["retry_at"]) - now
+    assert timedelta(seconds=3) <= delay <= timedelta(seconds=4)
+    assert entry["retry_class"] == "rate_limit" and entry["attempts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_permanent_error_goes_straight_to_dead_letter():
+    s = Scheduler(post_frequency_minutes=60, on_publish=_failing(TelegramBadRequest(METHOD, "wrong file identifier")))
+    entry = _entry(4)
+    s.scheduled_posts = [entry]
+
+    await s._publish_due_entry(entry, datetime.now(timezone.utc))
+
+    assert s.scheduled_posts == []
+    [dead] = s.dead_letter_entries()
+    assert dead["last_error"] == "TelegramBadRequest" and dead["attempts"] == 1
+
+
+def test_attempts_restart_when_error_class_changes():
+    s = Scheduler(post_frequency_minutes=60)
+    entry = _entry()
+    s.scheduled_posts = [entry]
+    now = datetime.now(timezone.utc)
+    for _ in range(3):
+        s._handle_failed_publication(entry, now, TelegramRetryAfter(METHOD, "flood", retry_after=1))
+    assert entry["attempts"] == 3
+
+    s._handle_failed_publication(entry, now, TelegramNetworkError(METHOD, "reset"))
+    assert (entry["retry_class"], entry["attempts"]) == ("network", 1)
+    assert len(s.scheduled_posts) == 1
+
+
+@pytest.mark.asyncio
+async def test_publish_meme_raises_when_asked():
+    meme = Meme(1, None, "potato", MessageSnapshot(content_type="text", text="x"))
+    error = TelegramNetworkError(METHOD, "reset")
+    with patch.object(notifications, "send_media_message", AsyncMock(side_effect=error)):
+        assert await notifications.publish_meme(object(), meme, -100) is False
+        with pytest.raises(TelegramNetworkError):
+            await notifications.publish_meme(object(), meme, -100, raise_errors=True)
@@ -0,0 +1,107 @@
+"""Событийный цикл Scheduler.run: сон до дедлайна головы очереди, wake() будит раньше."""
+import asyncio
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.scheduler import Scheduler
+
+
+def _meme(meme_id):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}")
+    return Meme(meme_id=meme_id, user_id=None, publish_choice="potato", content=snap)
+
+
+def _entry(meme_id, delay_sec):
+    return {
+        "scheduled_time": (datetime.now(timezone.utc) + timedelta(seconds=delay_sec)).isoformat(),
+        "meme": _meme(meme_id).to_publication_dict(),
+    }
+
+
+async def _run_for(s, seconds):
+    task = asyncio.create_task(s.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+def _count_iterations(s, monkeypatch):
+    calls = []
+    original = s.scheduled_posts.peek
+
+    def counting_peek():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(s.scheduled_posts, "peek", counting_peek)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_publishes_at_deadline_not_next_poll():
+    published = []
+
+    async def on_publish(meme):
+        published.append((meme.meme_id, datetime.now(timezone.utc)))
+        return True
+
+    s = Scheduler(post_frequency_minutes=5, on_publish=on_publish)
+    entry = _entry(1, 0.15)
+    deadline = datetime.fromisoformat(entry["scheduled_time"])
+    s.scheduled_posts.append(entry)
+
+    await _run_for(s, 0.4)
+
+    assert [mid for mid, _ in published] == [1]
+    assert abs((published[0][1] - deadline).total_seconds()) < 0.1
+
+
+@pytest.mark.asyncio
+async def test_idle_loop_does_not_spin(monkeypatch):
+    s = Scheduler(post_frequency_minutes=5)
+    s.scheduled_posts.append(_entry(1, 3600))
+    calls = _count_iterations(s, monkeypatch)
+
+    await _run_for(s, 0.2)
+    assert len(calls) == 1  # одна итерация и сон до дедлайна через час
+
+
+@pytest.mark.asyncio
+async def test_schedule_wakes_sleeping_loop(monkeypatch):
+    published = []
+
+    async def on_publish(meme):
+        published.append(meme.meme_id)
+        return True
+
+    s = Scheduler(post_frequency_minutes=5, on_publish=on_publish)
+    calls = _count_iterations(s, monkeypatch)
+    task = asyncio.create_task(s.run())
+    await asyncio.sleep(0.05)
+    assert len(calls) == 1  # очередь пуста — спит без таймера
+
+    # Голова очереди меняется снаружи (как при срочном перепланировании).
+    s.scheduled_posts.append(_entry(7, -1))
+    s.wake()
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+    assert published == [7]
+
+
+@pytest.mark.asyncio
+async def test_sleeps_until_pending_expiry():
+    s = Scheduler(post_frequency_minutes=5)
+    meme = _meme(1)
+    meme.created_time = datetime.now(timezone.utc) - timedelta(days=3) + timedelta(seconds=0.1)
+    s.pending_memes[1] = meme
+
+    await _run_for(s, 0.3)
+    assert 1 not in s.pending_memes
@@ -0,0 +1,153 @@
+"""SQLite-backend: построчные обновления, транзакции, Scheduler поверх storage, импорт из JSON."""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from kartoshka import storage as json_storage
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.publish_ledger import PublishLedger
+from kartoshka.scheduler import Scheduler
+from kartoshka.sqlite_storage import SQLiteStorage, import_json
+from kartoshka.storage import UserStore
+from kartoshka.vote_history import VoteEvent, VoteHistory
+
+
+def _meme(meme_id):
+    snap = MessageSnapshot(content_type="text", text=f"meme {meme_id}", from_user_id=7)
+    return Meme(meme_id=meme_id, user_id=7, publish_choice="user", content=snap)
+
+
+@pytest.fixture
+def db(tmp_path):
+    s = SQLiteStorage(str(tmp_path / "kartoshka.db"))
+    yield s
+    s.close()
+
+
+def test_user_data_roundtrip_only_touches_dirty_rows(db):
+    now = datetime.now(timezone.utc)
+    data = UserStore()
+    data["1"] = {"last_submission": now, "rejections": 2, "ban_until": None}
+    data["2"] = {"last_submission": None, "rejections": 0, "ban_until": now + timedelta(days=14)}
+    db.save_user_data(data)
+    data["1"]["rejections"] = 3
+    data.mark_dirty("1")
+    data["2"]["rejections"] = 9  # без mark_dirty
+    db.save_user_data(data)
+
+    loaded = db.load_user_data()
+    assert loaded["1"] == {"last_submission": now, "rejections": 3, "ban_until": None}
+    assert loaded["2"]["rejections"] == 0  # "2" не помечен — строка не тронута
+    assert loaded["2"]["ban_until"] == now + timedelta(days=14)
+
+
+def test_transaction_rolls_back_everything(db):
+    db.save_meme_counter(1)
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.save_meme_counter(2)
+            db.save_user_data({"1": {"last_submission": None, "rejections": 1, "ban_until": None}})
+            raise RuntimeError("boom")
+    assert db.load_meme_counter() == 1
+    assert db.load_user_data() == {}
+
+
+def test_failed_user_write_keeps_keys_dirty(db):
+    data = UserStore()
+    data["1"] = {"last_submission": None, "rejections": 1, "ban_until": None}
+    db._conn.execute("DROP TABLE users")
+    with pytest.raises(Exception):
+        db.save_user_data(data)
+    assert data.drain_dirty() == ["1"]
+
+
+def test_candidates_idempotent(db):
+    assert db.add_candidate(111, "alice", "Alice", "2026-06-02T10:00:00+00:00") is True
+    assert db.add_candidate(111, "alice_new", "Alice", "2026-06-02T11:00:00+00:00") is False
+    assert db.load_candidates() == [
+        {"id": 111, "username": "alice_new", "first_name": "Alice", "ts": "2026-06-02T10:00:00+00:00"}
+    ]
+
+
+def test_scheduler_over_storage_persists_rows(db):
+    s = Scheduler(post_frequency_minutes=5, storage=db)
+    s.add_pending(_meme(1))
+    s.pending_memes[1].add_vote(111, "approve")
+    s.record_vote(1, 111, "approve")
+    s.add_pending(_meme(2))
+    s.resolve(2)
+
+    assert db.get_pending(1)["votes"] == {"111": "approve"}
+    assert db.get_pending(2) is None
+    restored = Scheduler(post_frequency_minutes=5, storage=db)
+    assert set(restored.pending_memes) == {1}
+    assert restored.pending_memes[1].votes == {"111": "approve"}
+    assert not restored.needs_compaction
+
+
+@pytest.mark.asyncio
+async def test_scheduler_over_storage_schedule_and_dead_letter(db):
+    s = Scheduler(post_frequency_minutes=5, storage=db)
+    s.add_pending(_meme(1))
+    await s.schedule(s.pending_memes[1])
+
+    assert db.get_pending(1) is None
+    assert [e["meme"]["meme_id"] for e in db.load_publication()["queue"]] == [1]
+
+    entry = s.scheduled_posts[0]
+    entry["attempts"] = 3
+    s._handle_failed_publication(entry, datetime.now(timezone.utc))
+    assert db.load_publication()["queue"] == []
+    assert [e["meme"]["meme_id"] for e in db.load_failed_publications()] == [1]
+
+
+def test_import_json_moves_state(db, tmp_path):
+    json_storage.save_meme_counter(4)
+    json_storage.save_user_data({"5": {"last_submission": None, "rejections": 1, "ban_until": None}})
+    json_storage.add_candidate(111, "alice", "Alice", "2026-06-02T10:00:00+00:00")
+    legacy = Scheduler(post_frequency_minutes=5)
+    legacy.add_pending(_meme(7))  # только в WAL, снапшота ещё нет
+    with open(Scheduler.FAILED_PUBLICATIONS_FILE, "w", encoding="utf-8") as f:
+        json.dump([{"scheduled_time": "2026-01-01T00:00:00+00:00", "meme": {"meme_id": 3}}], f)
+
+    voted_at = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    VoteHistory(Scheduler.VOTE_HISTORY_FILE).append_many([VoteEvent(2, 111, "approve", voted_at)])
+    PublishLedger(Scheduler.PUBLISH_LEDGER_FILE).record_done(2, message_id=42)
+
+    counts = import_json(db)
+
+    assert counts == {
+        "users": 1, "candidates": 1, "pending": 1, "scheduled": 0, "failed": 1, "votes": 1, "ledger": 1,
+    }
+    assert db.load_meme_counter() == 7  # max(счётчик, максимальный meme_id в очередях)
+    assert db.load_user_data()["5"]["rejections"] == 1
+    assert set(Scheduler(post_frequency_minutes=5, storage=db).pending_memes) == {7}
+    assert db.load_vote_history() == [VoteEvent(2, 111, "approve", voted_at)]
+    assert db.get_ledger_entry(2)["message_id"] == 42
+    # Импорт только читает: старый dead-letter не мигрирован и не переименован.
+    assert os.path.exists(Scheduler.FAILED_PUBLICATIONS_FILE)
+    assert not os.path.exists(Scheduler.DEAD_LETTER_FILE)
+
+    with pytest.raises(RuntimeError):
+        import_json(db)
+    import_json(db, force=True)
+    assert len(db.load_vote_history()) == 1  # повторный импорт не дублирует историю
+
+
+def test_import_json_copies_overdue_entries_verbatim(db):
+    overdue = (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
+    entry = {"scheduled_time": overdue, "meme": _meme(1).to_dict()}
+    with open(Scheduler.PUBLICATION_FILE, "w", encoding="utf-8") as f:
+        json.dump({"last_published_time": overdue, "queue": [entry]}, f)
+    with open(Scheduler.PUBLICATION_FILE, encoding="utf-8") as f:
+        source = f.read()
+
+    import_json(db)
+
+    assert db.load_publication()["queue"] == [entry]
+    assert db.load_failed_publications() == []
+    with open(Scheduler.PUBLICATION_FILE, encoding="utf-8") as f:
+        assert f.read() == source
@@ -122,7 +122,7 @@ async def test_crypto_callback_answer_failure_does_not_break_vote(caplog):
 
     cb = _editor_callback("approve_1")
     cb.answer = AsyncMock(side_effect=Exception("query is too old"))
-    with patch("kartoshka.handlers.moderation.save_user_data"), \
+    with patch("kartoshka.storage.save_user_data"), \
          caplog.at_level(logging.ERROR):
         await crypto_callback(cb)
 
@@ -142,7 +142,7 @@ async def test_crypto_callback_edit_failure_still_finalizes(caplog):
     state.scheduler.pending_memes[2] = meme
 
     cb = _editor_callback("approve_2")
-    with patch("kartoshka.handlers.moderation.save_user_data"), \
+    with patch("kartoshka.storage.save_user_data"), \
          caplog.at_level(logging.ERROR):
         await crypto_callback(cb)
 
@@ -176,13 +176,22 @@ def test_load_publication_skips_corrupt_entries(tmp_path, monkeypatch, caplog):
     assert caplog.text.count("битым scheduled_time") == 2
 
 
+def test_assigned_queue_skips_corrupt_entries(tmp_path, monkeypatch, caplog):
+    """Битый scheduled_time отсекается ещё при построении кучи, а не падает в run()."""
+    s = _isolated_scheduler(tmp_path, monkeypatch)
+    with caplog.at_level(logging.ERROR):
+        s.scheduled_posts = [{"scheduled_time": "не-дата", "meme": {"meme_id": 1}}]
+    assert s.scheduled_posts == []
+    assert "битым scheduled_time" in caplog.text
+
+
 @pytest.mark.asyncio
 async def test_scheduler_run_survives_iteration_error(tmp_path, monkeypatch, caplog):
-    """Битая запись (Meme.from_dict падает) не убивает цикл и уходит в бэкофф.
+    """Битая запись (Meme.from_dict падает) не убивает цикл и не зацикливает его.
 
     Раньше KeyError ловился внешним try/except цикла; теперь битая запись —
-    такая же неудачная попытка публикации: логируется как ошибка on_publish,
-    запись остаётся в очереди со сдвинутым scheduled_time (не зацикливается).
+    неудачная попытка публикации: логируется как ошибка on_publish и, раз
+    повтор её не починит, сразу уходит в dead-letter.
     """
     s = _isolated_scheduler(tmp_path, monkeypatch)
     s.scheduled_posts = [{
@@ -197,9 +206,8 @@ async def test_scheduler_run_survives_iteration_error(tmp_path, monkeypatch, cap
         with suppress(asyncio.CancelledError):
             await task
     assert "Ошибка в on_publish" in caplog.text
-    # битая запись не выброшена сразу: первая неудача → бэкофф, attempts=1
-    assert len(s.scheduled_posts) == 1
-    assert s.scheduled_posts[0]["attempts"] == 1
+    assert len(s.scheduled_posts) == 0
+    assert [e["attempts"] for e in s.dead_letter_entries()] == [1]
 
 
 # ===== scheduler: publish-then-pop, retry/backoff, dead-letter =====
@@ -244,7 +252,7 @@ async def test_publish_success_pops_and_updates_time(tmp_path, monkeypatch):
 
 @pytest.mark.asyncio
 async def test_publish_false_keeps_entry_and_backs_off(tmp_path, monkeypatch):
-    """on_publish вернул False → запись осталась, attempts=1, scheduled_time +5 мин."""
+    """on_publish вернул False → запись осталась, attempts=1, повтор через 2.5–5 мин (jitter)."""
     async def bad_publish(meme):
         return False
 
@@ -257,8 +265,8 @@ async def test_publish_false_keeps_entry_and_backs_off(tmp_path, monkeypatch):
 
     assert len(s.scheduled_posts) == 1
     assert entry["attempts"] == 1
-    new_time = datetime.fromisoformat(entry["scheduled_time"])
-    assert abs((new_time - (now + timedelta(minutes=5))).total_seconds()) < 1
+    delay = datetime.fromisoformat(entry["retry_at"]) - now
+    assert timedelta(minutes=2.5) <= delay <= timedelta(minutes=5)
 
 
 @pytest.mark.asyncio
@@ -297,9 +305,9 @@ async def test_publish_fourth_failure_goes_to_dead_letter(tmp_path, monkeypatch,
     assert s.scheduled_posts == []  # выброшена из очереди
     assert "Мем 99 ушёл в dead-letter" in caplog.text
 
-    with open(Scheduler.FAILED_PUBLICATIONS_FILE, encoding="utf-8") as f:
-        failed = json.load(f)
+    failed = s.dead_letter_entries()
     assert [e["meme"]["meme_id"] for e in failed] == [99]
+    assert failed[0]["last_error"] == "publish_failed" and "dead_at" in failed[0]
 
     # очередь сохранена пустой
     with open(Scheduler.PUBLICATION_FILE, encoding="utf-8") as f:
@@ -324,56 +332,57 @@ async def test_corrupt_entry_eventually_dead_letters(tmp_path, monkeypatch, capl
         await s._publish_due_entry(entry, datetime.now(timezone.utc))
 
     assert s.scheduled_posts == []
-    with open(Scheduler.FAILED_PUBLICATIONS_FILE, encoding="utf-8") as f:
-        failed = json.load(f)
+    failed = s.dead_letter_entries()
     assert [e["meme"]["meme_id"] for e in failed] == [5]
+    assert failed[0]["last_error"] == "KeyError"
 
 
-def test_dead_letter_appends_to_existing_file(tmp_path, monkeypatch):
-    """Существующий failed_publications.json с записью + новая → обе в файле."""
-    s = _isolated_scheduler(tmp_path, monkeypatch)
-    existing = _due_entry(meme_id=1)
+def test_dead_letter_migrates_legacy_json_list(tmp_path, monkeypatch):
+    """Старый failed_publications.json со списком переносится в JSONL, новая запись — следом."""
     with open(Scheduler.FAILED_PUBLICATIONS_FILE, "w", encoding="utf-8") as f:
-        json.dump([existing], f)
+        json.dump([_due_entry(meme_id=1)], f)
+    s = _isolated_scheduler(tmp_path, monkeypatch)
 
     s._append_failed_publication(_due_entry(meme_id=2))
 
-    with open(Scheduler.FAILED_PUBLICATIONS_FILE, encoding="utf-8") as f:
-        failed = json.load(f)
-    assert [e["meme"]["meme_id"] for e in failed] == [1, 2]
+    assert [e["meme"]["meme_id"] for e in s.dead_letter_entries()] == [1, 2]
+    assert not os.path.exists(Scheduler.FAILED_PUBLICATIONS_FILE)
+    assert os.path.exists(Scheduler.FAILED_PUBLICATIONS_FILE + ".migrated")
 
 
-def test_dead_letter_recovers_from_corrupt_file(tmp_path, monkeypatch):
-    """Битый dead-letter файл не теряет новую запись: список начинается заново."""
-    s = _isolated_scheduler(tmp_path, monkeypatch)
+def test_dead_letter_keeps_corrupt_legacy_file(tmp_path, monkeypatch):
+    """Битый старый файл не трогается, а новая запись всё равно не теряется."""
     with open(Scheduler.FAILED_PUBLICATIONS_FILE, "w", encoding="utf-8") as f:
         f.write("{not json")
+    s = _isolated_scheduler(tmp_path, monkeypatch)
 
     s._append_failed_publication(_due_entry(meme_id=3))
 
+    assert [e["meme"]["meme_id"] for e in s.dead_letter_entries()] == [3]
     with open(Scheduler.FAILED_PUBLICATIONS_FILE, encoding="utf-8") as f:
-        failed = json.load(f)
-    assert [e["meme"]["meme_id"] for e in failed] == [3]
+        assert f.read() == "{not json"
 
 
-def test_dead_letter_ignores_non_list_file(tmp_path, monkeypatch):
-    """Если dead-letter файл содержит не-список — он перезаписывается списком."""
-    s = _isolated_scheduler(tmp_path, monkeypatch)
+def test_dead_letter_ignores_non_list_legacy_file(tmp_path, monkeypatch):
+    """Старый файл с не-списком переносить нечего: в dead-letter только новая запись."""
     with open(Scheduler.FAILED_PUBLICATIONS_FILE, "w", encoding="utf-8") as f:
         json.dump({"unexpected": "object"}, f)
+    s = _isolated_scheduler(tmp_path, monkeypatch)
 
     s._append_failed_publication(_due_entry(meme_id=8))
 
-    with open(Scheduler.FAILED_PUBLICATIONS_FILE, encoding="utf-8") as f:
-        failed = json.load(f)
-    assert [e["meme"]["meme_id"] for e in failed] == [8]
+    assert [e["meme"]["meme_id"] for e in s.dead_letter_entries()] == [8]
 
 
 @pytest.mark.asyncio
-async def test_scheduler_run_survives_sort_error(tmp_path, monkeypatch, caplog):
-    """Сбой внутри итерации (битый scheduled_time при sort) ловится внешним try."""
+async def test_scheduler_run_survives_iteration_failure(tmp_path, monkeypatch, caplog):
+    """Неожиданный сбой внутри итерации (здесь — чтения головы очереди) ловится внешним try."""
     s = _isolated_scheduler(tmp_path, monkeypatch)
-    s.scheduled_posts = [{"scheduled_time": "не-дата", "meme": {"meme_id": 1}}]
+
+    def broken_peek():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(s.scheduled_posts, "peek", broken_peek)
     with caplog.at_level(logging.ERROR):
         task = asyncio.create_task(s.run())
         await asyncio.sleep(0.05)
@@ -387,7 +396,7 @@ async def test_scheduler_run_survives_sort_error(tmp_path, monkeypatch, caplog):
 def test_dead_letter_write_failure_is_logged(tmp_path, monkeypatch, caplog):
     """Сбой записи dead-letter не валит вызывающий код, только логируется."""
     monkeypatch.setattr(
-        Scheduler, "FAILED_PUBLICATIONS_FILE", "/nonexistent_dir_xyz/failed.json"
+        Scheduler, "DEAD_LETTER_FILE", "/nonexistent_dir_xyz/failed.jsonl"
     )
     s = Scheduler(post_frequency_minutes=1)
     with caplog.at_level(logging.ERROR):
@@ -456,22 +465,63 @@ async def test_supervise_propagates_cancel():
 # ===== config: валидация EDITOR_IDS =====
 
 def test_config_editor_ids_validation(monkeypatch):
-    import importlib
-
     from kartoshka import config as config_module
 
     monkeypatch.setenv("EDITOR_IDS", "111,abc")
     with pytest.raises(ValueError, match="EDITOR_IDS"):
-        importlib.reload(config_module)
+        config_module.load_settings()
 
     monkeypatch.setenv("EDITOR_IDS", " , ")
     with pytest.raises(ValueError, match="ни одного"):
-        importlib.reload(config_module)
+        config_module.load_settings()
+
+    monkeypatch.setenv("EDITOR_IDS", "333,111,222,111")
+    editor_ids = config_module.load_settings().editor_ids
+    assert list(editor_ids) == [333, 111, 222]  # порядок рассылки — как в конфиге, без повторов
+    assert 111 in editor_ids and 444 not in editor_ids
+
+
+def test_config_reload_applies_only_reloadable_fields(monkeypatch, caplog):
+    from kartoshka import config as config_module
+    from kartoshka.main import reload_config
+
+    monkeypatch.setattr(config_module, "_settings", None)
+    before = config_module.get_settings()
+    monkeypatch.setenv("EDITOR_IDS", "111,444")
+    monkeypatch.setenv("VOTES_TO_APPROVE", "7")
+    monkeypatch.setenv("POST_FREQUENCY_MINUTES", "15")
+    monkeypatch.setenv("BOT_TOKEN", "999:other")
+
+    state = SimpleNamespace(scheduler=SimpleNamespace(post_frequency_minutes=60))
+    with caplog.at_level(logging.INFO):
+        reload_config(state)
+    after = config_module.get_settings()
+    assert after.editor_ids == (111, 444) and after.votes_to_approve == 7
+    assert state.scheduler.post_frequency_minutes == 15
+    assert after.api_token == before.api_token  # токен — только с рестартом
+    assert "BOT_TOKEN" in caplog.text
+
+    # Негодный env не ломает текущие настройки.
+    monkeypatch.setenv("VOTES_TO_REJECT", "много")
+    reload_config(state)
+    assert config_module.get_settings() is after
+
+
+def test_config_fresh_dotenv_beats_value_inherited_from_it(monkeypatch):
+    """Под systemd EnvironmentFile=.env: правка .env видна при перечитывании."""
+    from kartoshka import config as config_module
 
-    # восстанавливаем валидный конфиг для остальных тестов
-    monkeypatch.setenv("EDITOR_IDS", "111,222,333")
-    importlib.reload(config_module)
-    assert config_module.EDITOR_IDS == [111, 222, 333]
+    dotenv = {"EDITOR_IDS": "1,2", "BOT_NAME": "Картошка"}
+    monkeypatch.setattr("dotenv.dotenv_values", lambda *a, **kw: dict(dotenv))
+    monkeypatch.setattr(config_module, "_startup_dotenv", None)
+    monkeypatch.setenv("EDITOR_IDS", "1,2")  # пришло из .env
+    monkeypatch.setenv("BOT_NAME", "Явно")  # задано поверх .env
+    config_module._environ()
+
+    dotenv.update(EDITOR_IDS="1,2,3", BOT_NAME="Другое")
+    env = config_module._environ()
+    assert env["EDITOR_IDS"] == "1,2,3"
+    assert env["BOT_NAME"] == "Явно"
 
 
 # ===== recruit-хендлер =====
@@ -0,0 +1,187 @@
+"""Debounce статуса автора: серия голосов — один edit, без «message is not modified»."""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from kartoshka.handlers import register_handlers
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.state import AppState
+from kartoshka.status_edits import StatusEdits
+
+
+def _meme():
+    snap = MessageSnapshot(content_type="text", text="x")
+    meme = Meme(meme_id=1, user_id=7, publish_choice="user", content=snap)
+    meme.user_messages = [(7, 9)]
+    meme.user_status_text = "Голосование: (✅ 0 | ⚡ 0 | ❌ 0)"
+    return meme
+
+
+def _edited_texts(bot):
+    return [
+        c.kwargs["reply_markup"].inline_keyboard[0][0].text
+        for c in bot.edit_message_reply_markup.await_args_list
+    ]
+
+
+@pytest.mark.asyncio
+async def test_burst_of_votes_gives_one_edit():
+    bot = AsyncMock()
+    edits = StatusEdits(quiet_sec=0.05)
+    meme = _meme()
+
+    for crypto_id in (1, 2, 3):
+        meme.add_vote(crypto_id, "approve")
+        edits.schedule(bot, meme)
+        await asyncio.sleep(0.02)
+    assert bot.edit_message_reply_markup.await_count == 0
+
+    await asyncio.sleep(0.1)
+    assert _edited_texts(bot) == ["Голосование: (✅ 3 | ⚡ 0 | ❌ 0)"]
+    assert edits.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_vote_flip_back_sends_nothing():
+    bot = AsyncMock()
+    edits = StatusEdits(quiet_sec=0.02)
+    meme = _meme()
+    meme.add_vote(1, "approve")
+    edits.schedule(bot, meme)
+    await asyncio.sleep(0.05)
+
+    for vote in ("urgent", "approve"):
+        meme.add_vote(1, vote)
+        edits.schedule(bot, meme)
+    await asyncio.sleep(0.05)
+
+    assert bot.edit_message_reply_markup.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_finalize_cancels_pending_and_shows_final_state():
+    bot = AsyncMock()
+    edits = StatusEdits(quiet_sec=10)
+    meme = _meme()
+    meme.add_vote(1, "reject")
+    edits.schedule(bot, meme)
+
+    meme.finalized = True
+    await edits.finalize(bot, meme, "❌ Отк.")
+
+    assert _edited_texts(bot) == ["❌ Отк. (✅ 0 | ⚡ 0 | ❌ 1)"]
+    assert edits.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_finalize_waits_for_in_flight_edit():
+    started, release = asyncio.Event(), asyncio.Event()
+    texts = []
+
+    async def slow_edit(**kwargs):
+        texts.append(kwargs["reply_markup"].inline_keyboard[0][0].text)
+        if len(texts) == 1:
+            started.set()
+            await release.wait()
+
+    bot = AsyncMock()
+    bot.edit_message_reply_markup.side_effect = slow_edit
+    edits = StatusEdits(quiet_sec=0.01)
+    meme = _meme()
+    meme.add_vote(1, "approve")
+    edits.schedule(bot, meme)
+    await started.wait()
+    assert edits.pending == 1  # промежуточный edit в полёте — таск ещё числится
+
+    meme.finalized = True
+    await edits.finalize(bot, meme, "✅ Одобрен")
+    release.set()
+    await asyncio.sleep(0.02)
+
+    assert texts[-1] == "✅ Одобрен (✅ 1 | ⚡ 0 | ❌ 0)"
+    assert meme.user_status_text == texts[-1]
+    assert edits.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_vote_during_edit_gets_another_round():
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_edit(**kwargs):
+        if not started.is_set():
+            started.set()
+            await release.wait()
+
+    bot = AsyncMock()
+    bot.edit_message_reply_markup.side_effect = slow_edit
+    edits = StatusEdits(quiet_sec=0.01)
+    meme = _meme()
+    meme.add_vote(1, "approve")
+    edits.schedule(bot, meme)
+    await started.wait()
+
+    meme.add_vote(2, "approve")
+    edits.schedule(bot, meme)
+    release.set()
+    await asyncio.sleep(0.05)
+
+    assert _edited_texts(bot)[-1] == "Голосование: (✅ 2 | ⚡ 0 | ❌ 0)"
+    assert edits.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_edit_is_retried_with_same_text():
+    bot = AsyncMock()
+    bot.edit_message_reply_markup.side_effect = [RuntimeError("flood"), None]
+    edits = StatusEdits(quiet_sec=0.01)
+    meme = _meme()
+    meme.add_vote(1, "approve")
+    edits.schedule(bot, meme)
+    await asyncio.sleep(0.03)
+    assert meme.user_status_text == "Голосование: (✅ 0 | ⚡ 0 | ❌ 0)"  # не показан
+
+    edits.schedule(bot, meme)
+    await asyncio.sleep(0.03)
+    assert _edited_texts(bot) == ["Голосование: (✅ 1 | ⚡ 0 | ❌ 0)"] * 2
+    assert meme.user_status_text == "Голосование: (✅ 1 | ⚡ 0 | ❌ 0)"
+
+
+@pytest.mark.asyncio
+async def test_crypto_callback_debounces_author_status():
+    scheduler = MagicMock()
+    scheduler.pending_memes = {}
+    state = AppState(bot=AsyncMock(), scheduler=scheduler, persist_window_sec=0)
+    state.status_edits = StatusEdits(quiet_sec=0.05)
+    meme = _meme()
+    scheduler.pending_memes[1] = meme
+
+    callbacks = []
+    dp = SimpleNamespace(
+        message=lambda *a, **kw: (lambda fn: fn),
+        callback_query=lambda *a, **kw: (lambda fn: callbacks.append(fn) or fn),
+    )
+    register_handlers(dp, state)
+    crypto_callback = callbacks[1]
+
+    for mod_id, vote in ((111, "approve"), (222, "urgent")):
+        cb = MagicMock()
+        cb.data = f"{vote}_1"
+        cb.from_user = SimpleNamespace(id=mod_id)
+        cb.message.chat = SimpleNamespace(id=mod_id)
+        cb.message.message_id = 5
+        cb.answer = AsyncMock()
+        # Единоличный режим финализирует первым голосом — здесь нужен коллегиальный.
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("kartoshka.config.CRYPTOSELECTARCHY", True)
+            mp.setattr("kartoshka.config.VOTES_TO_APPROVE", 5)
+            await crypto_callback(cb)
+
+    author_edits = lambda: [  # noqa: E731
+        c for c in state.bot.edit_message_reply_markup.await_args_list if c.kwargs["chat_id"] == 7
+    ]
+    assert author_edits() == []
+    await asyncio.sleep(0.1)
+    assert len(author_edits()) == 1
@@ -0,0 +1,112 @@
+"""UserStore + keyed-лог user_data.wal: сохраняются только изменённые пользователи."""
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from kartoshka import storage
+from kartoshka.state import AppState
+from kartoshka.storage import UserStore
+
+
+def _ud(rejections=0):
+    return {"last_submission": None, "rejections": rejections, "ban_until": None}
+
+
+def _log_records():
+    if not os.path.exists(storage.USER_DATA_LOG_FILE):
+        return []
+    with open(storage.USER_DATA_LOG_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_user_store_tracks_dirty_keys():
+    data = UserStore({"1": _ud()})
+    assert data.drain_dirty() == []  # загруженное — чистое
+
+    data.setdefault("1", _ud(5))  # ключ уже есть — не грязный
+    data.setdefault("2", _ud())
+    data["1"]["rejections"] = 1
+    data.mark_dirty("1")
+    assert sorted(data.drain_dirty()) == ["1", "2"]
+    assert data.drain_dirty() == []
+
+    del data["2"]
+    assert data.drain_dirty() == ["2"]
+
+
+def test_save_appends_only_dirty_records():
+    data = UserStore()
+    for uid in ("1", "2", "3"):
+        data[uid] = _ud()
+    storage.save_user_data(data)
+    data["2"]["rejections"] = 2
+    data.mark_dirty("2")
+    storage.save_user_data(data)
+
+    records = _log_records()
+    assert [r["id"] for r in records[-1:]] == ["2"]
+    assert len(records) == 4
+    assert not os.path.exists(storage.USER_DATA_FILE)
+
+    loaded = storage.load_user_data()
+    assert isinstance(loaded, UserStore)
+    assert loaded["2"]["rejections"] == 2
+    assert set(loaded) == {"1", "2", "3"}
+
+
+def test_failed_append_keeps_keys_dirty(monkeypatch):
+    data = UserStore()
+    data["1"] = _ud(1)
+
+    def boom(records):
+        raise OSError("диск полон")
+
+    with monkeypatch.context() as m:
+        m.setattr(storage._user_log(), "append_many", boom)
+        with pytest.raises(OSError):
+            storage.save_user_data(data)
+
+    storage.save_user_data(data)  # следующая попытка дописывает то же
+    assert [r["id"] for r in _log_records()] == ["1"]
+    assert data.drain_dirty() == []
+
+
+def test_deleted_user_replays_as_removal():
+    data = UserStore()
+    data["1"] = _ud()
+    data["2"] = _ud()
+    storage.save_user_data(data)
+    del data["1"]
+    storage.save_user_data(data)
+    assert set(storage.load_user_data()) == {"2"}
+
+
+def test_log_compacts_into_snapshot(monkeypatch):
+    monkeypatch.setattr("kartoshka.storage.USER_LOG_COMPACT_BYTES", 1)
+    now = datetime.now(timezone.utc)
+    data = UserStore()
+    data["1"] = {"last_submission": now, "rejections": 1, "ban_until": None}
+    storage.save_user_data(data)
+
+    assert _log_records() == []
+    with open(storage.USER_DATA_FILE, encoding="utf-8") as f:
+        assert json.load(f)["1"]["last_submission"] == now.isoformat()
+    assert storage.load_user_data()["1"]["last_submission"] == now
+
+
+def test_plain_dict_rewrites_snapshot_and_drops_log():
+    data = UserStore()
+    data["1"] = _ud()
+    storage.save_user_data(data)
+    storage.save_user_data({"9": _ud(1)})
+
+    assert _log_records() == []
+    assert set(storage.load_user_data()) == {"9"}
+
+
+def test_app_state_wraps_user_data():
+    state = AppState(bot=None, scheduler=None, user_data={"1": _ud()})
+    assert isinstance(state.user_data, UserStore)
+    assert state.user_data.drain_dirty() == []
@@ -0,0 +1,125 @@
+"""История голосов: append-only события (кто, как, когда) и запросы для аудита."""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from kartoshka.handlers import register_handlers
+from kartoshka.message_snapshot import MessageSnapshot
+from kartoshka.models import Meme
+from kartoshka.scheduler import Scheduler
+from kartoshka.sqlite_storage import SQLiteStorage
+from kartoshka.state import AppState
+from kartoshka.vote_history import RECORD, EventFilter, VoteEvent, VoteHistory
+
+T0 = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _meme(meme_id=1):
+    return Meme(meme_id, 7, "user", MessageSnapshot(content_type="text", text="x"))
+
+
+def test_scheduler_keeps_every_vote_change():
+    s = Scheduler(post_frequency_minutes=60)
+    meme = _meme()
+    s.add_pending(meme)
+    for crypto_id, vote in ((111, "approve"), (222, "reject"), (111, "urgent")):
+        meme.add_vote(crypto_id, vote)
+        s.record_vote(meme.meme_id, crypto_id, vote)
+
+    events = s.vote_events(EventFilter(meme_id=1))
+    assert [(e.editor_id, e.vote) for e in events] == [(111, "approve"), (222, "reject"), (111, "urgent")]
+    assert [e.vote for e in s.vote_events(EventFilter(editor_id=111))] == ["approve", "urgent"]
+    assert s.vote_events(EventFilter(meme_id=2)) == []
+    # Голос в меме — последний, история — вся.
+    assert meme.votes == {"111": "urgent", "222": "reject"}
+
+
+def test_failed_log_append_writes_history_once_on_retry(monkeypatch):
+    s = Scheduler(post_frequency_minutes=60)
+    records = [{"op": "vote", "id": 1, "by": "111", "v": "approve", "at": int(T0.timestamp())}]
+
+    def boom(batch):
+        raise OSError("диск полон")
+
+    with monkeypatch.context() as m:
+        m.setattr(s._moderation_log, "append_many", boom)
+        with pytest.raises(OSError):
+            s._write_moderation_records(records)
+    s._write_moderation_records(records)  # повтор group commit'а
+
+    assert [(e.editor_id, e.vote) for e in s.vote_events()] == [(111, "approve")]
+
+
+def test_torn_tail_is_skipped_and_cut_by_next_append(tmp_path):
+    path = tmp_path / "votes.bin"
+    history = VoteHistory(str(path))
+    history.append_many([VoteEvent(1, 111, "approve", T0)])
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")  # обрезок записи после kill -9
+
+    assert len(list(history.events())) == 1
+    history.append_many([VoteEvent(2, 222, "reject", T0 + timedelta(hours=1))])
+    assert path.stat().st_size == 2 * RECORD.size
+    assert [e.meme_id for e in history.events(EventFilter(since=T0 + timedelta(minutes=1)))] == [2]
+
+
+def test_sqlite_history_and_filter_parsing(tmp_path):
+    db = SQLiteStorage(str(tmp_path / "k.db"))
+    try:
+        db.append_vote_history([VoteEvent(1, 111, "approve", T0), VoteEvent(1, 222, "urgent", T0 + timedelta(days=1))])
+        flt = EventFilter.parse(["1", "since=2026-03-02"])
+        assert db.load_vote_history(flt) == [VoteEvent(1, 222, "urgent", T0 + timedelta(days=1))]
+        assert len(db.load_vote_history(EventFilter.parse(["by=111"]))) == 1
+    finally:
+        db.close()
+    with pytest.raises(ValueError):
+        EventFilter.parse(["colour=red"])
+
+
+@pytest.mark.asyncio
+async def test_pressing_the_same_button_again_is_not_logged():
+    scheduler = MagicMock()
+    scheduler.pending_memes = {1: _meme()}
+    state = AppState(bot=AsyncMock(), scheduler=scheduler, persist_window_sec=0)
+    callbacks = []
+    dp = SimpleNamespace(
+        message=lambda *a, **kw: (lambda fn: fn),
+        callback_query=lambda *a, **kw: (lambda fn: callbacks.append(fn) or fn),
+    )
+    register_handlers(dp, state)
+    crypto_callback = callbacks[1]
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("kartoshka.config.CRYPTOSELECTARCHY", True)
+        mp.setattr("kartoshka.config.VOTES_TO_APPROVE", 5)
+        mp.setattr("kartoshka.config.VOTES_TO_REJECT", 5)
+        for vote in ("approve", "approve", "reject"):
+            cb = MagicMock()
+            cb.data = f"{vote}_1"
+            cb.from_user = SimpleNamespace(id=111)
+            cb.answer = AsyncMock()
+            await crypto_callback(cb)
+
+    assert [c.args[2] for c in scheduler.record_vote.call_args_list] == ["approve", "reject"]
+
+
+@pytest.mark.asyncio
+async def test_votes_command_lists_history_for_editors():
+    from aiogram.filters import CommandObject
+
+    from kartoshka.handlers import admin
+
+    scheduler = MagicMock()
+    scheduler.vote_events.return_value = [VoteEvent(12, 111, "reject", T0)]
+    handlers = []
+    admin.register(SimpleNamespace(message=lambda *a, **kw: (lambda fn: handlers.append(fn) or fn)),
+                   SimpleNamespace(scheduler=scheduler))
+    votes = handlers[1]
+
+    message = SimpleNamespace(from_user=SimpleNamespace(id=111), answer=AsyncMock())
+    await votes(message, CommandObject(command="votes", args="12"))
+
+    scheduler.vote_events.assert_called_once_with(EventFilter(meme_id=12))
+    assert "#12 · 111: reject" in message.answer.await_args.args[0]
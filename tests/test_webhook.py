@@ -0,0 +1,107 @@
+"""Webhook-режим: POST записанного апдейта, секрет, backpressure, drain при остановке."""
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from kartoshka.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret"
+
+# Апдейт в том виде, в каком его присылает Telegram.
+RECORDED_UPDATE = {
+    "update_id": 100500,
+    "message": {
+        "message_id": 42,
+        "date": 1767225600,
+        "chat": {"id": 7, "type": "private", "first_name": "U"},
+        "from": {"id": 7, "is_bot": False, "first_name": "U", "username": "u"},
+        "text": "мем",
+    },
+}
+
+
+def _dispatcher(seen, delay=0.0):
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handler(message: Message):
+        await asyncio.sleep(delay)
+        seen.append(message.text)
+
+    return dp
+
+
+async def _client(server):
+    client = TestClient(TestServer(server.build_app()))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_recorded_update_reaches_handler():
+    seen = []
+    server = WebhookServer(_dispatcher(seen), Bot(token="123:dummy"), SECRET)
+    server.start()
+    client = await _client(server)
+    try:
+        resp = await client.post("/webhook", json=RECORDED_UPDATE, headers={SECRET_HEADER: SECRET})
+        assert resp.status == 200
+        await server.drain()
+    finally:
+        await client.close()
+    assert seen == ["мем"]
+
+
+@pytest.mark.asyncio
+async def test_wrong_secret_and_bad_body_are_rejected():
+    seen = []
+    server = WebhookServer(_dispatcher(seen), Bot(token="123:dummy"), SECRET)
+    server.start()
+    client = await _client(server)
+    try:
+        assert (await client.post("/webhook", json=RECORDED_UPDATE)).status == 401
+        assert (await client.post(
+            "/webhook", json=RECORDED_UPDATE, headers={SECRET_HEADER: "guess"}
+        )).status == 401
+        assert (await client.post(
+            "/webhook", data=b"not json", headers={SECRET_HEADER: SECRET}
+        )).status == 400
+        await server.drain()
+    finally:
+        await client.close()
+    assert seen == []
+
+
+@pytest.mark.asyncio
+async def test_full_queue_answers_503():
+    server = WebhookServer(_dispatcher([]), Bot(token="123:dummy"), SECRET, queue_size=1, workers=0)
+    server.start()
+    client = await _client(server)
+    try:
+        headers = {SECRET_HEADER: SECRET}
+        assert (await client.post("/webhook", json=RECORDED_UPDATE, headers=headers)).status == 200
+        assert (await client.post("/webhook", json=RECORDED_UPDATE, headers=headers)).status == 503
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_drain_finishes_in_flight_handlers_and_stops_accepting():
+    seen = []
+    server = WebhookServer(_dispatcher(seen, delay=0.05), Bot(token="123:dummy"), SECRET, workers=2)
+    server.start()
+    client = await _client(server)
+    headers = {SECRET_HEADER: SECRET}
+    try:
+        for i in range(3):
+            update = dict(RECORDED_UPDATE, update_id=i)
+            assert (await client.post("/webhook", json=update, headers=headers)).status == 200
+
+        await server.drain(timeout=1)
+        assert seen == ["мем"] * 3
+        assert (await client.post("/webhook", json=RECORDED_UPDATE, headers=headers)).status == 503
+    finally:
+        await client.close()